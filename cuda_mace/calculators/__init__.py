@@ -0,0 +1,3 @@
+from .calculator import MACECalculator
+
+__all__ = ['MACECalculator']
@@ -0,0 +1,184 @@
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Dict, Optional, Union
+
+import numpy as np
+import torch
+from ase.calculators.calculator import Calculator, PropertyNotImplementedError, all_changes
+from ase.stress import full_3x3_to_voigt_6_stress
+
+from cuda_mace.neighbours import VerletNeighbourList
+from cuda_mace.ops.workspace import Workspace
+
+
+class MACECalculator(Calculator):
+    """
+    ASE calculator around a converted OptimizedInvariantMACE, which stays resident for the
+    lifetime of the calculator.
+
+    The neighbour list is a VerletNeighbourList with the given skin: with skin=0 it is only
+    reused when the positions, cell and periodicity are unchanged, while a positive skin
+    also reuses it across MD steps until an atom has moved more than skin / 2. The input
+    tensors (positions, node_attrs, batch, ptr and cell) are allocated once and updated in
+    place while the atomic numbers are unchanged, so a call only copies the positions.
+
+    The stress, and its extra backward pass, is only computed when it is requested. With
+    workspace=True, the outputs and intermediates of the ops are drawn from a Workspace kept
+    across calls, rather than allocated at every step.
+
+    example:
+
+        atoms.calc = MACECalculator("optimized_model.model", device="cpu", skin=0.5)
+        atoms.get_potential_energy(), atoms.get_forces(), atoms.get_stress()
+
+        atoms.calc.statistics()  # calls, neighbour list builds and time spent in the model
+    """
+
+    implemented_properties = ["energy", "free_energy", "energies", "forces", "stress"]
+
+    def __init__(
+        self,
+        model: Union[str, torch.nn.Module],
+        device: Optional[Union[str, torch.device]] = None,
+        dtype: torch.dtype = torch.float64,
+        skin: float = 0.0,
+        workspace: bool = True,
+        **kwargs,
+    ):
+        """
+        model is an OptimizedInvariantMACE, or the path of a model artifact which is loaded
+        onto device. dtype is the dtype of the positions fed to the model, which casts them
+        to its own compute dtype.
+        """
+        Calculator.__init__(self, **kwargs)
+
+        if isinstance(model, str):
+            from cuda_mace.models import load_artifact
+
+            model = load_artifact(model, device=device if device is not None else "cpu")
+
+        self.model = model
+        self.device = torch.device(device) if device is not None else model.r_max.device
+        self.dtype = dtype
+        self.r_max = float(model.r_max)
+
+        # maps atomic numbers to the element index of node_attrs, -1 for unknown elements.
+        z_table = model.atomic_numbers.cpu().long()
+        self._element_index = np.full(int(z_table.max()) + 1, -1, dtype=np.int64)
+        self._element_index[z_table.numpy()] = np.arange(len(z_table))
+
+        self.neighbour_list = VerletNeighbourList(self.r_max, skin)
+        self.workspace = Workspace() if workspace else None
+
+        self._inputs: Optional[Dict[str, torch.Tensor]] = None
+        self._numbers: Optional[np.ndarray] = None
+
+        self.num_calls = 0
+        self.num_input_allocations = 0
+        self.model_time = 0.0
+        self.total_time = 0.0
+
+    def _allocate_inputs(self, numbers: np.ndarray):
+        if numbers.size > 0 and numbers.max() >= len(self._element_index):
+            raise ValueError("the model does not support atomic number %d" % numbers.max())
+
+        elements = self._element_index[numbers]
+        if (elements < 0).any():
+            raise ValueError(
+                "the model does not support atomic numbers %s"
+                % sorted(set(numbers[elements < 0].tolist()))
+            )
+
+        natoms = len(numbers)
+        nelements = len(self.model.atomic_numbers)
+
+        node_attrs = torch.zeros(natoms, nelements, dtype=self.dtype)
+        node_attrs[torch.arange(natoms), torch.from_numpy(elements)] = 1.0
+
+        self._inputs = {
+            "positions": torch.zeros(natoms, 3, dtype=self.dtype, device=self.device),
+            "node_attrs": node_attrs.to(self.device),
+            "cell": torch.zeros(3, 3, dtype=self.dtype, device=self.device),
+            "batch": torch.zeros(natoms, dtype=torch.long, device=self.device),
+            "ptr": torch.tensor([0, natoms], dtype=torch.long, device=self.device),
+        }
+        self._numbers = numbers.copy()
+
+        self.num_input_allocations += 1
+
+    def _inputs_for(self, atoms) -> Dict[str, torch.Tensor]:
+        numbers = atoms.get_atomic_numbers()
+
+        if self._numbers is None or not np.array_equal(numbers, self._numbers):
+            self._allocate_inputs(numbers)
+
+        inputs = self._inputs
+        inputs["positions"].copy_(torch.from_numpy(atoms.get_positions()))
+        inputs["cell"].copy_(torch.from_numpy(atoms.get_cell().array))
+
+        pbc = [bool(p) for p in atoms.pbc]
+        graph = self.neighbour_list.update(
+            inputs["positions"], inputs["cell"] if any(pbc) else None, pbc
+        )
+
+        data = dict(inputs)
+        data["edge_index"] = graph["edge_index"]
+        data["shifts"] = graph["shifts"]
+        data["unit_shifts"] = graph["unit_shifts"]
+        data["receiver_offsets"] = graph["receiver_offsets"]
+
+        return data
+
+    def calculate(self, atoms=None, properties=("energy",), system_changes=all_changes):
+        Calculator.calculate(self, atoms, properties, system_changes)
+
+        start = perf_counter()
+
+        compute_stress = "stress" in properties
+        if compute_stress and not self.atoms.pbc.all():
+            raise PropertyNotImplementedError("the stress requires a fully periodic cell")
+
+        data = self._inputs_for(self.atoms)
+
+        model_start = perf_counter()
+        with self.workspace if self.workspace is not None else nullcontext():
+            outputs = self.model(
+                data,
+                training=False,
+                compute_force=True,
+                compute_stress=compute_stress,
+            )
+        self.model_time += perf_counter() - model_start
+
+        energy = outputs["energy"].detach().sum().item()
+
+        self.results = {
+            "energy": energy,
+            "free_energy": energy,
+            "energies": outputs["node_energy"].detach().cpu().numpy(),
+            "forces": outputs["forces"].detach().cpu().numpy(),
+        }
+
+        if compute_stress:
+            stress = outputs["stress"].detach().cpu().numpy()[0]
+            self.results["stress"] = full_3x3_to_voigt_6_stress(stress)
+
+        self.num_calls += 1
+        self.total_time += perf_counter() - start
+
+    def statistics(self) -> Dict[str, float]:
+        """
+        Number of model evaluations, of input (re)allocations and of neighbour list builds,
+        the mean time per call spent in the model and outside of it, and the workspace
+        statistics, prefixed with "workspace_".
+        """
+        ncalls = max(self.num_calls, 1)
+        workspace = self.workspace.statistics() if self.workspace is not None else {}
+        return {
+            "num_calls": self.num_calls,
+            "num_input_allocations": self.num_input_allocations,
+            **self.neighbour_list.statistics(),
+            "mean_model_time": self.model_time / ncalls,
+            "mean_overhead": (self.total_time - self.model_time) / ncalls,
+            **{"workspace_" + k: v for k, v in workspace.items()},
+        }
@@ -0,0 +1,24 @@
+#ifndef CUBIC_SPLINE_CPU_HPP
+#define CUBIC_SPLINE_CPU_HPP
+
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch;
+
+std::vector<torch::Tensor> cpu_evaluate_spline(torch::Tensor r,
+                                               torch::Tensor r_knots,
+                                               torch::Tensor coeffs,
+                                               double r_width, double r_max);
+
+torch::Tensor cpu_backward_spline(torch::Tensor grad_output,
+                                  torch::Tensor R_deriv);
+
+std::vector<torch::Tensor> cpu_evaluate_multi_spline(torch::Tensor r,
+                                                     torch::Tensor r_knots,
+                                                     torch::Tensor coeffs,
+                                                     double r_width,
+                                                     double r_max);
+
+#endif // CUBIC_SPLINE_CPU_HPP
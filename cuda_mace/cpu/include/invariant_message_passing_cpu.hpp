@@ -0,0 +1,35 @@
+#ifndef INVARIANT_MESSAGE_PASSING_CPU_HPP
+#define INVARIANT_MESSAGE_PASSING_CPU_HPP
+
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch;
+
+torch::Tensor cpu_calculate_first_occurences(torch::Tensor receiver_list,
+                                             const int64_t nnodes);
+
+std::vector<torch::Tensor>
+cpu_calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes);
+
+// {edge_index [2, nedges] int32, receiver offsets [nnodes + 1] int32,
+//  permutation [nedges] int64, edge_data...} sorted by receiver.
+std::vector<torch::Tensor>
+cpu_sort_edges_by_receiver(torch::Tensor edge_index,
+                           std::vector<torch::Tensor> edge_data,
+                           const int64_t nnodes, const bool validate);
+
+std::vector<torch::Tensor>
+cpu_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
+            torch::Tensor sender_list, torch::Tensor receiver_list,
+            torch::Tensor first_occurences, const int64_t nnodes);
+
+std::vector<torch::Tensor>
+cpu_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
+             torch::Tensor grad_in, torch::Tensor sender_list,
+             torch::Tensor receiver_list, torch::Tensor first_occurences,
+             torch::Tensor sender_sort_idx,
+             torch::Tensor sender_first_occurences, const int64_t nnodes);
+
+#endif // INVARIANT_MESSAGE_PASSING_CPU_HPP
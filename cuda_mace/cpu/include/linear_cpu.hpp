@@ -0,0 +1,19 @@
+#ifndef LINEAR_CPU_HPP
+#define LINEAR_CPU_HPP
+
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch;
+
+torch::Tensor cpu_linear(torch::Tensor X, torch::Tensor W, double path_weight);
+
+std::vector<torch::Tensor> cpu_element_ordering(torch::Tensor one_hot_embedding);
+
+torch::Tensor cpu_elemental_linear(torch::Tensor X, torch::Tensor W,
+                                   torch::Tensor node_ordering,
+                                   torch::Tensor element_offsets,
+                                   double path_weight);
+
+#endif // LINEAR_CPU_HPP
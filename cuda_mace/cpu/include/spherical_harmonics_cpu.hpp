@@ -0,0 +1,16 @@
+#ifndef SPHERICAL_HARMONICS_CPU_HPP
+#define SPHERICAL_HARMONICS_CPU_HPP
+
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch;
+
+std::vector<torch::Tensor> cpu_spherical_harmonics(torch::Tensor xyz,
+                                                   bool requires_grad);
+
+torch::Tensor cpu_spherical_harmonics_backward(torch::Tensor sph_deriv,
+                                               torch::Tensor grad_output);
+
+#endif // SPHERICAL_HARMONICS_CPU_HPP
@@ -0,0 +1,146 @@
+#include "cubic_spline_cpu.hpp"
+#include "workspace.h"
+
+#include <ATen/Parallel.h>
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch::indexing;
+
+/*
+Evaluates ntables cubic splines sharing the same uniformly spaced knots. The
+interval lookup is done once per sample and reused by every table.
+
+coeffs: [ntables, nintervals, 4, noutputs]
+R_out, R_deriv: [ntables, nsamples, noutputs]
+
+Samples beyond r_max evaluate to zero, as on the GPU.
+*/
+template <typename scalar_t, bool evaluate_deriv>
+void evaluate_multi_spline_impl(const scalar_t *r, const scalar_t *r_knots,
+                                const scalar_t *coeffs, const int64_t nsamples,
+                                const int64_t nintervals,
+                                const int64_t ntables,
+                                const int64_t noutputs, const scalar_t r_width,
+                                const scalar_t r_max, scalar_t *R_out,
+                                scalar_t *R_deriv) {
+
+  at::parallel_for(0, nsamples, 256, [&](int64_t begin, int64_t end) {
+    for (int64_t i = begin; i < end; i++) {
+      const scalar_t r_i = r[i];
+
+      if (r_i > r_max) {
+        for (int64_t t = 0; t < ntables; t++) {
+          scalar_t *out = R_out + (t * nsamples + i) * noutputs;
+          for (int64_t j = 0; j < noutputs; j++) {
+            out[j] = 0.0;
+          }
+          if (evaluate_deriv) {
+            scalar_t *deriv = R_deriv + (t * nsamples + i) * noutputs;
+            for (int64_t j = 0; j < noutputs; j++) {
+              deriv[j] = 0.0;
+            }
+          }
+        }
+        continue;
+      }
+
+      int64_t idx = (int64_t)(r_i / r_width);
+      idx = std::min(std::max(idx, (int64_t)0), nintervals - 1);
+
+      const scalar_t x = r_i - r_knots[idx];
+      const scalar_t xx = x * x;
+      const scalar_t xxx = xx * x;
+
+      for (int64_t t = 0; t < ntables; t++) {
+        const scalar_t *c = coeffs + (t * nintervals + idx) * 4 * noutputs;
+        scalar_t *out = R_out + (t * nsamples + i) * noutputs;
+
+        for (int64_t j = 0; j < noutputs; j++) {
+          out[j] = c[j] + c[noutputs + j] * x + c[2 * noutputs + j] * xx +
+                   c[3 * noutputs + j] * xxx;
+        }
+
+        if (evaluate_deriv) {
+          scalar_t *deriv = R_deriv + (t * nsamples + i) * noutputs;
+          for (int64_t j = 0; j < noutputs; j++) {
+            deriv[j] = c[noutputs + j] + scalar_t(2.0) * c[2 * noutputs + j] * x +
+                       scalar_t(3.0) * c[3 * noutputs + j] * xx;
+          }
+        }
+      }
+    }
+  });
+}
+
+std::vector<torch::Tensor> cpu_evaluate_multi_spline(torch::Tensor r,
+                                                     torch::Tensor r_knots,
+                                                     torch::Tensor coeffs,
+                                                     double r_width,
+                                                     double r_max) {
+
+  TORCH_CHECK(coeffs.dim() == 4,
+              "coeffs must have shape [ntables, nintervals, 4, noutputs]");
+
+  r = r.contiguous();
+  coeffs = coeffs.contiguous();
+
+  const int64_t nsamples = r.size(0);
+  const int64_t ntables = coeffs.size(0);
+  const int64_t nintervals = coeffs.size(1);
+  const int64_t noutputs = coeffs.size(3);
+
+  torch::Tensor R_out = workspace_empty({ntables, nsamples, noutputs}, r.options());
+  torch::Tensor R_deriv = torch::empty({1, 1, 1}, r.options());
+
+  if (r.requires_grad()) {
+    R_deriv = workspace_empty({ntables, nsamples, noutputs}, r.options());
+  }
+
+  AT_DISPATCH_FLOATING_TYPES(r.scalar_type(), "cpu_evaluate_multi_spline", ([&] {
+                               if (r.requires_grad()) {
+                                 evaluate_multi_spline_impl<scalar_t, true>(
+                                     r.data_ptr<scalar_t>(),
+                                     r_knots.data_ptr<scalar_t>(),
+                                     coeffs.data_ptr<scalar_t>(), nsamples,
+                                     nintervals, ntables, noutputs, r_width,
+                                     r_max, R_out.data_ptr<scalar_t>(),
+                                     R_deriv.data_ptr<scalar_t>());
+                               } else {
+                                 evaluate_multi_spline_impl<scalar_t, false>(
+                                     r.data_ptr<scalar_t>(),
+                                     r_knots.data_ptr<scalar_t>(),
+                                     coeffs.data_ptr<scalar_t>(), nsamples,
+                                     nintervals, ntables, noutputs, r_width,
+                                     r_max, R_out.data_ptr<scalar_t>(),
+                                     nullptr);
+                               }
+                             }));
+
+  if (r.requires_grad()) {
+    return {R_out, R_deriv};
+  } else {
+    return {R_out};
+  }
+}
+
+std::vector<torch::Tensor> cpu_evaluate_spline(torch::Tensor r,
+                                               torch::Tensor r_knots,
+                                               torch::Tensor coeffs,
+                                               double r_width, double r_max) {
+  // a single table: [nintervals, 4, noutputs] -> [1, nintervals, 4, noutputs]
+  std::vector<torch::Tensor> result = cpu_evaluate_multi_spline(
+      r, r_knots, coeffs.unsqueeze(0), r_width, r_max);
+
+  for (auto &t : result) {
+    t = t.squeeze(0);
+  }
+
+  return result;
+}
+
+torch::Tensor cpu_backward_spline(torch::Tensor grad_output,
+                                  torch::Tensor R_deriv) {
+  return (grad_output * R_deriv).sum(-1);
+}
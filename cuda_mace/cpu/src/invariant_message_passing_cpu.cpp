@@ -0,0 +1,444 @@
+#include "invariant_message_passing_cpu.hpp"
+#include "workspace.h"
+
+#include <ATen/Parallel.h>
+#include <algorithm>
+#include <cstring>
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch::indexing;
+
+#define NSPHERICAL_HARM 16
+#define NL 4
+
+/*
+(l,m) index -> l, i.e the radial weight shared by each spherical harmonic.
+*/
+static const int LM_TO_L[NSPHERICAL_HARM] = {0, 1, 1, 1, 2, 2, 2, 2,
+                                             2, 3, 3, 3, 3, 3, 3, 3};
+
+/*
+Writes the [start, end) range of each node in a sorted edge list. Nodes which
+do not appear in the list are left with an empty [0, 0) range.
+*/
+static void fill_first_occurences(const int *sorted_nodes, const int nedges,
+                                  const int64_t nnodes, int *start, int *end) {
+  at::parallel_for(0, nedges, 4096, [&](int64_t begin, int64_t finish) {
+    for (int64_t e = begin; e < finish; e++) {
+      int node = sorted_nodes[e];
+      if (e == 0 || sorted_nodes[e - 1] != node) {
+        start[node] = e;
+      }
+      if (e == nedges - 1 || sorted_nodes[e + 1] != node) {
+        end[node] = e + 1;
+      }
+    }
+  });
+}
+
+torch::Tensor cpu_calculate_first_occurences(torch::Tensor receiver_list,
+                                             const int64_t nnodes) {
+  torch::Tensor first_occurences =
+      workspace_empty({2 * nnodes}, torch::TensorOptions().dtype(torch::kInt32))
+          .zero_();
+
+  int *_first_occurences = first_occurences.data_ptr<int>();
+
+  fill_first_occurences(receiver_list.data_ptr<int>(), receiver_list.size(0),
+                        nnodes, _first_occurences, _first_occurences + nnodes);
+
+  return first_occurences;
+}
+
+// row copy in 8 or 4 byte words, which compile to plain moves.
+static inline void copy_row(char *dst, const char *src, const int64_t nbytes) {
+  if (nbytes % 8 == 0) {
+    for (int64_t k = 0; k < nbytes; k += 8) {
+      std::memcpy(dst + k, src + k, 8);
+    }
+  } else if (nbytes % 4 == 0) {
+    for (int64_t k = 0; k < nbytes; k += 4) {
+      std::memcpy(dst + k, src + k, 4);
+    }
+  } else {
+    std::memcpy(dst, src, nbytes);
+  }
+}
+
+/*
+Stable counting sort of nedges keys in [0, nnodes), in two passes over nchunks
+contiguous chunks of the keys: each chunk counts its keys, then calls
+scatter(e, dst) for each of its edges e with its position dst in sorted order.
+Writes the CSR offsets [nnodes + 1] of each key. Keys outside [0, nnodes) raise
+an error before anything is scattered.
+*/
+template <typename index_t, typename scatter_t>
+static void counting_sort(const index_t *keys, const int64_t nedges,
+                          const int64_t nnodes, const char *name,
+                          int *offsets, scatter_t scatter) {
+  const int64_t nchunks = std::max<int64_t>(
+      std::min<int64_t>(at::get_num_threads(), nedges / 65536), 1);
+  const int64_t chunk_size = (nedges + nchunks - 1) / nchunks;
+
+  // counts[chunk * nnodes + node], then the next free position of that pair.
+  std::vector<int64_t> counts(nchunks * nnodes, 0);
+  std::vector<char> invalid(nchunks, 0);
+
+  at::parallel_for(0, nchunks, 1, [&](int64_t chunk_start, int64_t chunk_end) {
+    for (int64_t chunk = chunk_start; chunk < chunk_end; chunk++) {
+      int64_t *_counts = counts.data() + chunk * nnodes;
+      const int64_t end = std::min(nedges, (chunk + 1) * chunk_size);
+
+      for (int64_t e = chunk * chunk_size; e < end; e++) {
+        const int64_t node = keys[e];
+        if (node < 0 || node >= nnodes) {
+          invalid[chunk] = 1;
+          break;
+        }
+        _counts[node]++;
+      }
+    }
+  });
+
+  for (int64_t chunk = 0; chunk < nchunks; chunk++) {
+    TORCH_CHECK(!invalid[chunk], name, " contains nodes outside [0, ", nnodes,
+                ")");
+  }
+
+  int64_t offset = 0;
+  for (int64_t node = 0; node < nnodes; node++) {
+    offsets[node] = offset;
+    for (int64_t chunk = 0; chunk < nchunks; chunk++) {
+      int64_t count = counts[chunk * nnodes + node];
+      counts[chunk * nnodes + node] = offset;
+      offset += count;
+    }
+  }
+  offsets[nnodes] = offset;
+
+  at::parallel_for(0, nchunks, 1, [&](int64_t chunk_start, int64_t chunk_end) {
+    for (int64_t chunk = chunk_start; chunk < chunk_end; chunk++) {
+      int64_t *_next = counts.data() + chunk * nnodes;
+      const int64_t end = std::min(nedges, (chunk + 1) * chunk_size);
+
+      for (int64_t e = chunk * chunk_size; e < end; e++) {
+        scatter(e, _next[keys[e]]++);
+      }
+    }
+  });
+}
+
+/*
+Stable counting sort of the edges by sender. Returns the permutation along with
+the [start, end) range of each sender inside that permutation.
+*/
+std::vector<torch::Tensor>
+cpu_calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes) {
+  sender_list = sender_list.contiguous();
+
+  const int64_t nedges = sender_list.size(0);
+
+  torch::Tensor sender_sort_idx =
+      workspace_empty({nedges}, torch::TensorOptions().dtype(torch::kInt32));
+  torch::Tensor sender_first_occurences =
+      workspace_empty({2 * nnodes}, torch::TensorOptions().dtype(torch::kInt32));
+
+  int *_sort_idx = sender_sort_idx.data_ptr<int>();
+  int *_start = sender_first_occurences.data_ptr<int>();
+  int *_end = _start + nnodes;
+
+  std::vector<int> offsets(nnodes + 1);
+
+  counting_sort(sender_list.data_ptr<int>(), nedges, nnodes, "sender_list",
+                offsets.data(),
+                [&](int64_t e, int64_t dst) { _sort_idx[dst] = e; });
+
+  at::parallel_for(0, nnodes, 4096, [&](int64_t node_start, int64_t node_end) {
+    for (int64_t node = node_start; node < node_end; node++) {
+      _start[node] = offsets[node];
+      _end[node] = offsets[node + 1];
+    }
+  });
+
+  return {sender_sort_idx, sender_first_occurences};
+}
+
+/*
+Stable counting sort of the edges by receiver (edge_index[0]), writing the
+permutation, the senders and the rows of each tensor of edge_data in the
+scatter pass. The sorted receivers are then filled in from the offsets.
+*/
+template <typename index_t>
+static void sort_edges_by_receiver_impl(const index_t *edge_index,
+                                        const int64_t nedges,
+                                        const int64_t nnodes,
+                                        std::vector<torch::Tensor> &edge_data,
+                                        std::vector<torch::Tensor> &sorted_data,
+                                        int *sorted_edge_index, int *offsets,
+                                        int64_t *permutation) {
+  const index_t *receiver = edge_index;
+  const index_t *sender = edge_index + nedges;
+
+  std::vector<const char *> data_in;
+  std::vector<char *> data_out;
+  std::vector<int64_t> row_bytes;
+  for (size_t i = 0; i < edge_data.size(); i++) {
+    data_in.push_back(static_cast<const char *>(edge_data[i].data_ptr()));
+    data_out.push_back(static_cast<char *>(sorted_data[i].data_ptr()));
+    row_bytes.push_back(nedges > 0 ? edge_data[i].nbytes() / nedges : 0);
+  }
+
+  counting_sort(receiver, nedges, nnodes, "edge_index[0]", offsets,
+                [&](int64_t e, int64_t dst) {
+                  permutation[dst] = e;
+                  sorted_edge_index[nedges + dst] = sender[e];
+
+                  for (size_t i = 0; i < data_in.size(); i++) {
+                    copy_row(data_out[i] + dst * row_bytes[i],
+                             data_in[i] + e * row_bytes[i], row_bytes[i]);
+                  }
+                });
+
+  // the sorted receivers are runs of each node, written sequentially.
+  at::parallel_for(0, nnodes, 4096, [&](int64_t node_start, int64_t node_end) {
+    for (int64_t node = node_start; node < node_end; node++) {
+      std::fill(sorted_edge_index + offsets[node],
+                sorted_edge_index + offsets[node + 1], (int)node);
+    }
+  });
+}
+
+std::vector<torch::Tensor>
+cpu_sort_edges_by_receiver(torch::Tensor edge_index,
+                           std::vector<torch::Tensor> edge_data,
+                           const int64_t nnodes, const bool validate) {
+  TORCH_CHECK(edge_index.dim() == 2 && edge_index.size(0) == 2,
+              "edge_index must be [2, nedges]");
+
+  const int64_t nedges = edge_index.size(1);
+
+  TORCH_CHECK(nedges < INT32_MAX && nnodes < INT32_MAX,
+              "number of edges and nodes must fit in int32");
+
+  edge_index = edge_index.contiguous();
+
+  if (validate && nedges > 0) {
+    TORCH_CHECK(edge_index[1].min().item<int64_t>() >= 0 &&
+                    edge_index[1].max().item<int64_t>() < nnodes,
+                "edge_index[1] contains nodes outside [0, ", nnodes, ")");
+  }
+
+  std::vector<torch::Tensor> sorted_data;
+  for (torch::Tensor &data : edge_data) {
+    TORCH_CHECK(data.dim() >= 1 && data.size(0) == nedges,
+                "edge data must have nedges rows");
+    data = data.contiguous();
+    sorted_data.push_back(workspace_empty(data.sizes(), data.options()));
+  }
+
+  torch::Tensor sorted_edge_index =
+      workspace_empty({2, nedges}, torch::TensorOptions().dtype(torch::kInt32));
+  torch::Tensor offsets =
+      workspace_empty({nnodes + 1}, torch::TensorOptions().dtype(torch::kInt32));
+  torch::Tensor permutation =
+      workspace_empty({nedges}, torch::TensorOptions().dtype(torch::kInt64));
+
+  AT_DISPATCH_INDEX_TYPES(
+      edge_index.scalar_type(), "cpu_sort_edges_by_receiver", ([&] {
+        sort_edges_by_receiver_impl<index_t>(
+            edge_index.data_ptr<index_t>(), nedges, nnodes, edge_data,
+            sorted_data, sorted_edge_index.data_ptr<int>(),
+            offsets.data_ptr<int>(), permutation.data_ptr<int64_t>());
+      }));
+
+  std::vector<torch::Tensor> result = {sorted_edge_index, offsets, permutation};
+  result.insert(result.end(), sorted_data.begin(), sorted_data.end());
+
+  return result;
+}
+
+template <typename scalar_t>
+void forward_message_passing_impl(const scalar_t *X, const scalar_t *Y,
+                                  const scalar_t *radial,
+                                  const int *sender_list,
+                                  const int *first_occurences,
+                                  const int nedges, const int nchannels,
+                                  const int64_t nnodes, scalar_t *output) {
+
+  at::parallel_for(0, nnodes, 1, [&](int64_t node_start, int64_t node_end) {
+    // X[sender] * radial[edge, l] for each l, reused over the 2l+1 m's.
+    std::vector<scalar_t> xr(NL * nchannels);
+
+    for (int64_t node = node_start; node < node_end; node++) {
+      scalar_t *out = output + node * NSPHERICAL_HARM * nchannels;
+
+      for (int i = 0; i < NSPHERICAL_HARM * nchannels; i++) {
+        out[i] = 0.0;
+      }
+
+      const int edge_start = first_occurences[node];
+      const int edge_end = first_occurences[nnodes + node];
+
+      for (int64_t edge = edge_start; edge < edge_end; edge++) {
+        const scalar_t *x = X + sender_list[edge] * nchannels;
+        const scalar_t *r = radial + edge * NL * nchannels;
+
+        for (int L = 0; L < NL; L++) {
+          for (int c = 0; c < nchannels; c++) {
+            xr[L * nchannels + c] = x[c] * r[L * nchannels + c];
+          }
+        }
+
+        for (int m = 0; m < NSPHERICAL_HARM; m++) {
+          const scalar_t y = Y[m * nedges + edge];
+          const scalar_t *w = xr.data() + LM_TO_L[m] * nchannels;
+          scalar_t *o = out + m * nchannels;
+
+          for (int c = 0; c < nchannels; c++) {
+            o[c] += y * w[c];
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void backward_edge_message_passing_impl(
+    const scalar_t *X, const scalar_t *Y, const scalar_t *radial,
+    const scalar_t *grad_in, const int *sender_list, const int *receiver_list,
+    const int nedges, const int nchannels, scalar_t *gradY,
+    scalar_t *gradRadial) {
+
+  at::parallel_for(0, nedges, 64, [&](int64_t edge_start, int64_t edge_end) {
+    for (int64_t edge = edge_start; edge < edge_end; edge++) {
+      const scalar_t *x = X + sender_list[edge] * nchannels;
+      const scalar_t *r = radial + edge * NL * nchannels;
+      const scalar_t *g = grad_in + (int64_t)receiver_list[edge] * NSPHERICAL_HARM * nchannels;
+      scalar_t *grad_r = gradRadial + edge * NL * nchannels;
+
+      for (int i = 0; i < NL * nchannels; i++) {
+        grad_r[i] = 0.0;
+      }
+
+      for (int m = 0; m < NSPHERICAL_HARM; m++) {
+        const int L = LM_TO_L[m];
+        const scalar_t y = Y[m * nedges + edge];
+        const scalar_t *gm = g + m * nchannels;
+        const scalar_t *rl = r + L * nchannels;
+        scalar_t *grad_rl = grad_r + L * nchannels;
+
+        scalar_t dY = 0.0;
+        for (int c = 0; c < nchannels; c++) {
+          const scalar_t gx = gm[c] * x[c];
+          dY += gx * rl[c];
+          grad_rl[c] += gx * y;
+        }
+
+        gradY[m * nedges + edge] = dY;
+      }
+    }
+  });
+}
+
+template <typename scalar_t>
+void backward_node_message_passing_impl(
+    const scalar_t *Y, const scalar_t *radial, const scalar_t *grad_in,
+    const int *receiver_list, const int *sender_sort_idx,
+    const int *sender_first_occurences, const int nedges, const int nchannels,
+    const int64_t nnodes, scalar_t *gradX) {
+
+  at::parallel_for(0, nnodes, 1, [&](int64_t node_start, int64_t node_end) {
+    for (int64_t node = node_start; node < node_end; node++) {
+      scalar_t *gx = gradX + node * nchannels;
+
+      for (int c = 0; c < nchannels; c++) {
+        gx[c] = 0.0;
+      }
+
+      const int edge_start = sender_first_occurences[node];
+      const int edge_end = sender_first_occurences[nnodes + node];
+
+      for (int sorted = edge_start; sorted < edge_end; sorted++) {
+        const int64_t edge = sender_sort_idx[sorted];
+        const scalar_t *r = radial + edge * NL * nchannels;
+        const scalar_t *g =
+            grad_in + (int64_t)receiver_list[edge] * NSPHERICAL_HARM * nchannels;
+
+        for (int m = 0; m < NSPHERICAL_HARM; m++) {
+          const scalar_t y = Y[m * nedges + edge];
+          const scalar_t *gm = g + m * nchannels;
+          const scalar_t *rl = r + LM_TO_L[m] * nchannels;
+
+          for (int c = 0; c < nchannels; c++) {
+            gx[c] += gm[c] * rl[c] * y;
+          }
+        }
+      }
+    }
+  });
+}
+
+std::vector<torch::Tensor>
+cpu_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
+            torch::Tensor sender_list, torch::Tensor receiver_list,
+            torch::Tensor first_occurences, const int64_t nnodes) {
+
+  const int nedges = Y.size(1);
+  const int nspherical_harm = Y.size(0);
+  const int nfeatures = X.size(1);
+
+  TORCH_CHECK(nspherical_harm == NSPHERICAL_HARM,
+              "number of edge spherical harmonics must be 16");
+
+  torch::Tensor output =
+      workspace_empty({nnodes, nspherical_harm, nfeatures},
+                      torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+
+  AT_DISPATCH_FLOATING_TYPES(
+      X.scalar_type(), "forward_cpu", ([&] {
+        forward_message_passing_impl<scalar_t>(
+            X.data_ptr<scalar_t>(), Y.data_ptr<scalar_t>(),
+            radial.data_ptr<scalar_t>(), sender_list.data_ptr<int>(),
+            first_occurences.data_ptr<int>(), nedges, nfeatures, nnodes,
+            output.data_ptr<scalar_t>());
+      }));
+
+  return {output};
+}
+
+std::vector<torch::Tensor>
+cpu_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
+             torch::Tensor grad_in, torch::Tensor sender_list,
+             torch::Tensor receiver_list, torch::Tensor first_occurences,
+             torch::Tensor sender_sort_idx,
+             torch::Tensor sender_first_occurences, const int64_t nnodes) {
+
+  const int nedges = Y.size(1);
+  const int nchannels = X.size(1);
+
+  torch::Tensor gradRadial = workspace_empty(radial.sizes(), radial.options());
+  torch::Tensor gradX = workspace_empty(X.sizes(), X.options());
+  torch::Tensor gradY = workspace_empty(Y.sizes(), Y.options());
+
+  AT_DISPATCH_FLOATING_TYPES(
+      X.scalar_type(), "backward_cpu", ([&] {
+        backward_edge_message_passing_impl<scalar_t>(
+            X.data_ptr<scalar_t>(), Y.data_ptr<scalar_t>(),
+            radial.data_ptr<scalar_t>(), grad_in.data_ptr<scalar_t>(),
+            sender_list.data_ptr<int>(), receiver_list.data_ptr<int>(), nedges,
+            nchannels, gradY.data_ptr<scalar_t>(),
+            gradRadial.data_ptr<scalar_t>());
+
+        backward_node_message_passing_impl<scalar_t>(
+            Y.data_ptr<scalar_t>(), radial.data_ptr<scalar_t>(),
+            grad_in.data_ptr<scalar_t>(), receiver_list.data_ptr<int>(),
+            sender_sort_idx.data_ptr<int>(),
+            sender_first_occurences.data_ptr<int>(), nedges, nchannels, nnodes,
+            gradX.data_ptr<scalar_t>());
+      }));
+
+  return {gradX, gradY, gradRadial};
+}
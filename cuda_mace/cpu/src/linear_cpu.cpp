@@ -0,0 +1,124 @@
+#include "linear_cpu.hpp"
+#include "workspace.h"
+
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch::indexing;
+
+/*
+Multiplies the (2l + 1) rows of each l block of X: [nnodes, (lmax + 1)^2, K] by
+W[l]: [K, N], as one batched GEMM per l over strided views of X and the output,
+so no block is copied.
+
+out: [nnodes, (lmax + 1)^2, N], written in place.
+*/
+static void linear_blocks(torch::Tensor X, torch::Tensor W, torch::Tensor out,
+                          double path_weight) {
+  const int64_t nl = W.size(0);
+
+  for (int64_t l = 0; l < nl; l++) {
+    const int64_t start = l * l;
+    const int64_t nm = 2 * l + 1;
+
+    // [nm, nnodes, K] x [nm, K, N] -> [nm, nnodes, N]
+    torch::Tensor out_l = out.narrow(1, start, nm).transpose(0, 1);
+
+    at::baddbmm_out(out_l, out_l, X.narrow(1, start, nm).transpose(0, 1),
+                    W[l].expand({nm, -1, -1}), 0.0, path_weight);
+  }
+}
+
+torch::Tensor cpu_linear(torch::Tensor X, torch::Tensor W, double path_weight) {
+  TORCH_CHECK(X.dim() == 3, "X must be [nnodes, (lmax + 1)^2, nchannels]");
+  TORCH_CHECK(X.size(1) == W.size(0) * W.size(0),
+              "X has ", X.size(1), " components but W has ", W.size(0), " l blocks");
+
+  torch::Tensor output = workspace_empty({X.size(0), X.size(1), W.size(-1)},
+                                         X.options());
+
+  linear_blocks(X, W, output, path_weight);
+
+  return output;
+}
+
+/*
+Counting sort of the nodes by element.
+
+returns {node_ordering: [nnodes] int64, the nodes of element 0 first, in
+their original order, then element 1, ...; element_offsets: [nelements + 1]
+int64, start of each element in node_ordering}
+*/
+std::vector<torch::Tensor> cpu_element_ordering(torch::Tensor one_hot_embedding) {
+  const int64_t nnodes = one_hot_embedding.size(0);
+  const int64_t nelements = one_hot_embedding.size(1);
+
+  torch::Tensor element = one_hot_embedding.argmax(1).contiguous();
+  const int64_t *element_ptr = element.data_ptr<int64_t>();
+
+  torch::Tensor element_offsets = torch::zeros(
+      {nelements + 1}, torch::TensorOptions().dtype(torch::kInt64));
+  torch::Tensor node_ordering = torch::empty(
+      {nnodes}, torch::TensorOptions().dtype(torch::kInt64));
+
+  int64_t *offsets_ptr = element_offsets.data_ptr<int64_t>();
+  int64_t *ordering_ptr = node_ordering.data_ptr<int64_t>();
+
+  for (int64_t i = 0; i < nnodes; i++) {
+    offsets_ptr[element_ptr[i] + 1]++;
+  }
+
+  for (int64_t e = 0; e < nelements; e++) {
+    offsets_ptr[e + 1] += offsets_ptr[e];
+  }
+
+  std::vector<int64_t> next(offsets_ptr, offsets_ptr + nelements);
+
+  for (int64_t i = 0; i < nnodes; i++) {
+    ordering_ptr[next[element_ptr[i]]++] = i;
+  }
+
+  return {node_ordering, element_offsets};
+}
+
+/*
+Per-element linear: node i is multiplied by W[element(i)]: [(lmax + 1), K, N].
+The nodes are gathered in element order once, so that each element is a
+contiguous segment on which linear_blocks runs plain GEMMs, and the result is
+scattered back to the original order.
+*/
+torch::Tensor cpu_elemental_linear(torch::Tensor X, torch::Tensor W,
+                                   torch::Tensor node_ordering,
+                                   torch::Tensor element_offsets,
+                                   double path_weight) {
+  TORCH_CHECK(X.dim() == 3, "X must be [nnodes, (lmax + 1)^2, nchannels]");
+  TORCH_CHECK(X.size(1) == W.size(1) * W.size(1),
+              "X has ", X.size(1), " components but W has ", W.size(1), " l blocks");
+  TORCH_CHECK(node_ordering.size(0) == X.size(0),
+              "X has ", X.size(0), " nodes but the one-hot embedding has ", node_ordering.size(0));
+
+  const int64_t nelements = W.size(0);
+  const int64_t *offsets_ptr = element_offsets.data_ptr<int64_t>();
+
+  torch::Tensor X_sorted = X.index_select(0, node_ordering);
+  torch::Tensor out_sorted = workspace_empty({X.size(0), X.size(1), W.size(-1)},
+                                             X.options());
+
+  for (int64_t e = 0; e < nelements; e++) {
+    const int64_t start = offsets_ptr[e];
+    const int64_t nselected = offsets_ptr[e + 1] - start;
+
+    if (nselected == 0) {
+      continue;
+    }
+
+    linear_blocks(X_sorted.narrow(0, start, nselected), W[e],
+                  out_sorted.narrow(0, start, nselected), path_weight);
+  }
+
+  torch::Tensor output = workspace_empty(out_sorted.sizes(), out_sorted.options());
+  output.index_copy_(0, node_ordering, out_sorted);
+
+  return output;
+}
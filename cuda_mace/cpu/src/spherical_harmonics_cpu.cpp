@@ -0,0 +1,297 @@
+#include "spherical_harmonics_cpu.hpp"
+#include "workspace.h"
+
+#include <ATen/Parallel.h>
+#include <algorithm>
+#include <cmath>
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch::indexing;
+
+/*
+Real spherical harmonics up to l = 3 of the normalized edge vectors, with the
+same constants, (2, 0, 1) axis permutation and sqrt(4 pi) ("component")
+normalization as the GPU kernel, adapted from sphericart (Bigi et al., J. Chem.
+Phys. 159, 064802 (2023)).
+
+Edges are processed in blocks of BLOCK_SIZE in SoA layout: every loop runs over
+the edges of a block, so that it vectorizes, and each output row is written in
+contiguous runs.
+
+xyz: [nsamples, 3]
+sph: [16, nsamples]
+sph_deriv: [16, 3, nsamples], derivatives with respect to the permuted axes,
+  as on the GPU. Only written when compute_deriv.
+*/
+#define BLOCK_SIZE 64
+
+template <typename scalar_t, bool compute_deriv>
+void spherical_harmonics_block(const scalar_t *__restrict__ xyz,
+                               const int64_t start, const int64_t nblock,
+                               const int64_t nsamples,
+                               scalar_t *__restrict__ sph,
+                               scalar_t *__restrict__ sph_deriv) {
+
+  const scalar_t sqrt_4pi = 3.5449077018110318;
+
+  scalar_t x[BLOCK_SIZE], y[BLOCK_SIZE], z[BLOCK_SIZE], ir[BLOCK_SIZE];
+  scalar_t Y[16][BLOCK_SIZE];
+
+  for (int64_t b = 0; b < nblock; b++) {
+    // MACE ordering x[:, [2, 0, 1]]
+    const scalar_t xb = xyz[(start + b) * 3 + 2];
+    const scalar_t yb = xyz[(start + b) * 3 + 0];
+    const scalar_t zb = xyz[(start + b) * 3 + 1];
+
+    ir[b] = 1.0 / std::sqrt(xb * xb + yb * yb + zb * zb);
+    x[b] = xb * ir[b];
+    y[b] = yb * ir[b];
+    z[b] = zb * ir[b];
+  }
+
+  for (int64_t b = 0; b < nblock; b++) {
+    const scalar_t x2 = x[b] * x[b];
+    const scalar_t y2 = y[b] * y[b];
+    const scalar_t z2 = z[b] * z[b];
+
+    Y[0][b] = 0.282094791773878;
+
+    Y[1][b] = 0.48860251190292 * y[b];
+    Y[2][b] = 0.48860251190292 * z[b];
+    Y[3][b] = 0.48860251190292 * x[b];
+
+    Y[4][b] = 2.23606797749979 * x[b] * Y[1][b];
+    Y[5][b] = 2.23606797749979 * z[b] * Y[1][b];
+    Y[6][b] = -0.315391565252520 * (x2 + y2 - 2 * z2);
+    Y[7][b] = 2.23606797749979 * x[b] * Y[2][b];
+    Y[8][b] = 0.54627421529604 * (x2 - y2);
+
+    const scalar_t tmp = -0.457045799464466 * (x2 + y2 - 4 * z2);
+
+    Y[9][b] = -0.59004358992664 * y[b] * (y2 - 3 * x2);
+    Y[10][b] = 2.64575131106459 * z[b] * Y[4][b];
+    Y[11][b] = y[b] * tmp;
+    Y[12][b] = -1.49270533036046 * z[b] * (z2 - 2.37799637856361 * Y[6][b]);
+    Y[13][b] = x[b] * tmp;
+    Y[14][b] = 1.44530572132028 * z[b] * (x2 - y2);
+    Y[15][b] = 0.59004358992664 * x[b] * (x2 - 3 * y2);
+  }
+
+  for (int m = 0; m < 16; m++) {
+    scalar_t *__restrict__ out = sph + m * nsamples + start;
+
+    for (int64_t b = 0; b < nblock; b++) {
+      out[b] = sqrt_4pi * Y[m][b];
+    }
+  }
+
+  if constexpr (compute_deriv) {
+    scalar_t dx[16][BLOCK_SIZE], dy[16][BLOCK_SIZE], dz[16][BLOCK_SIZE];
+
+    for (int64_t b = 0; b < nblock; b++) {
+      const scalar_t y2 = y[b] * y[b];
+      const scalar_t z2 = z[b] * z[b];
+
+      // l = 0
+      dx[0][b] = 0.0;
+      dy[0][b] = 0.0;
+      dz[0][b] = 0.0;
+
+      // l = 1
+      dx[1][b] = 0.0;
+      dx[2][b] = 0.0;
+      dx[3][b] = 0.48860251190292;
+
+      dy[1][b] = 0.48860251190292;
+      dy[2][b] = 0.0;
+      dy[3][b] = 0.0;
+
+      dz[1][b] = 0.0;
+      dz[2][b] = 0.48860251190292;
+      dz[3][b] = 0.0;
+
+      // l = 2
+      dx[4][b] = 2.23606797749979 * Y[1][b];
+      dx[5][b] = 0.0;
+      dx[6][b] = -1.29099444873581 * Y[3][b];
+      dx[7][b] = 2.23606797749979 * Y[2][b];
+      dx[8][b] = 2.23606797749979 * Y[3][b];
+
+      dy[4][b] = -1.73205080756888 * dx[6][b];
+      dy[5][b] = dx[7][b];
+      dy[6][b] = -0.577350269189626 * dx[4][b];
+      dy[7][b] = 0.0;
+      dy[8][b] = -dx[4][b];
+
+      dz[4][b] = 0.0;
+      dz[5][b] = dx[4][b];
+      dz[6][b] = 1.15470053837925 * dx[7][b];
+      dz[7][b] = dy[4][b];
+      dz[8][b] = 0.0;
+
+      // l = 3
+      dx[9][b] = 3.24037034920393 * Y[4][b];
+      dx[10][b] = 2.64575131106459 * Y[5][b];
+      dx[11][b] = -0.83666002653408 * Y[4][b];
+      dx[12][b] = -2.04939015319192 * Y[7][b];
+      dx[13][b] = 0.91409159892893 * (y2 - z2 + 4.75599275712721 * Y[6][b]);
+      dx[14][b] = 2.64575131106459 * Y[7][b];
+      dx[15][b] = 3.24037034920393 * Y[8][b];
+
+      dy[9][b] = dx[15][b];
+      dy[10][b] = dx[14][b];
+      dy[11][b] = -0.91409159892893 * (y2 - z2 - 1.58533091904240 * Y[6][b]);
+      dy[12][b] = -2.04939015319192 * Y[5][b];
+      dy[13][b] = -0.83666002653408 * Y[4][b];
+      dy[14][b] = -dx[10][b];
+      dy[15][b] = -dx[9][b];
+
+      dz[9][b] = 0.0;
+      dz[10][b] = 2.64575131106459 * Y[4][b];
+      dz[11][b] = 3.34664010613630 * Y[5][b];
+      dz[12][b] = 3.54964786985977 * Y[6][b];
+      dz[13][b] = 3.34664010613630 * Y[7][b];
+      dz[14][b] = 2.64575131106459 * Y[8][b];
+      dz[15][b] = 0.0;
+    }
+
+    // corrects derivatives for normalization
+    for (int m = 0; m < 16; m++) {
+      scalar_t *__restrict__ out_x = sph_deriv + (m * 3 + 0) * nsamples + start;
+      scalar_t *__restrict__ out_y = sph_deriv + (m * 3 + 1) * nsamples + start;
+      scalar_t *__restrict__ out_z = sph_deriv + (m * 3 + 2) * nsamples + start;
+
+      for (int64_t b = 0; b < nblock; b++) {
+        const scalar_t n = dx[m][b] * x[b] + dy[m][b] * y[b] + dz[m][b] * z[b];
+
+        out_x[b] = sqrt_4pi * (dx[m][b] - x[b] * n) * ir[b];
+        out_y[b] = sqrt_4pi * (dy[m][b] - y[b] * n) * ir[b];
+        out_z[b] = sqrt_4pi * (dz[m][b] - z[b] * n) * ir[b];
+      }
+    }
+  }
+}
+
+template <typename scalar_t, bool compute_deriv>
+void spherical_harmonics_impl(const scalar_t *__restrict__ xyz,
+                              const int64_t nsamples,
+                              scalar_t *__restrict__ sph,
+                              scalar_t *__restrict__ sph_deriv) {
+
+  const int64_t nblocks = (nsamples + BLOCK_SIZE - 1) / BLOCK_SIZE;
+
+  at::parallel_for(0, nblocks, 16, [&](int64_t begin, int64_t end) {
+    for (int64_t block = begin; block < end; block++) {
+      const int64_t start = block * BLOCK_SIZE;
+
+      spherical_harmonics_block<scalar_t, compute_deriv>(
+          xyz, start, std::min<int64_t>(BLOCK_SIZE, nsamples - start),
+          nsamples, sph, sph_deriv);
+    }
+  });
+}
+
+/*
+returns {sph: [16, nsamples]} and, if requires_grad, sph_deriv: [16, 3, nsamples]
+computed in the same pass. The derivatives are not allocated otherwise.
+*/
+std::vector<torch::Tensor> cpu_spherical_harmonics(torch::Tensor xyz,
+                                                   bool requires_grad) {
+  TORCH_CHECK(xyz.dim() == 2 && xyz.size(1) == 3, "xyz must be [nsamples, 3]");
+
+  xyz = xyz.contiguous();
+
+  const int64_t nsamples = xyz.size(0);
+
+  torch::Tensor sph = workspace_empty({16, nsamples}, xyz.options());
+  torch::Tensor sph_deriv;
+
+  if (requires_grad) {
+    sph_deriv = workspace_empty({16, 3, nsamples}, xyz.options());
+  }
+
+  AT_DISPATCH_FLOATING_TYPES(xyz.scalar_type(), "cpu_spherical_harmonics", ([&] {
+    if (requires_grad) {
+      spherical_harmonics_impl<scalar_t, true>(
+          xyz.data_ptr<scalar_t>(), nsamples, sph.data_ptr<scalar_t>(),
+          sph_deriv.data_ptr<scalar_t>());
+    } else {
+      spherical_harmonics_impl<scalar_t, false>(
+          xyz.data_ptr<scalar_t>(), nsamples, sph.data_ptr<scalar_t>(),
+          nullptr);
+    }
+  }));
+
+  if (requires_grad) {
+    return {sph, sph_deriv};
+  }
+
+  return {sph};
+}
+
+/*
+xyz_grad[i, k] = sum_m grad_output[m, i] * sph_deriv[m, k', i], with k' the
+permuted axis of k.
+*/
+template <typename scalar_t>
+void spherical_harmonics_backward_impl(const scalar_t *__restrict__ sph_deriv,
+                                       const scalar_t *__restrict__ grad_output,
+                                       const int64_t nsamples,
+                                       scalar_t *__restrict__ xyz_grad) {
+
+  const int k_to_idx[3] = {2, 0, 1};
+  const int64_t nblocks = (nsamples + BLOCK_SIZE - 1) / BLOCK_SIZE;
+
+  at::parallel_for(0, nblocks, 16, [&](int64_t begin, int64_t end) {
+    scalar_t sum[3][BLOCK_SIZE];
+
+    for (int64_t block = begin; block < end; block++) {
+      const int64_t start = block * BLOCK_SIZE;
+      const int64_t nblock = std::min<int64_t>(BLOCK_SIZE, nsamples - start);
+
+      for (int k = 0; k < 3; k++) {
+        for (int64_t b = 0; b < nblock; b++) {
+          sum[k][b] = 0.0;
+        }
+      }
+
+      for (int m = 0; m < 16; m++) {
+        const scalar_t *__restrict__ g = grad_output + m * nsamples + start;
+
+        for (int k = 0; k < 3; k++) {
+          const scalar_t *__restrict__ d = sph_deriv + (m * 3 + k) * nsamples + start;
+
+          for (int64_t b = 0; b < nblock; b++) {
+            sum[k][b] += g[b] * d[b];
+          }
+        }
+      }
+
+      for (int64_t b = 0; b < nblock; b++) {
+        for (int k = 0; k < 3; k++) {
+          xyz_grad[(start + b) * 3 + k_to_idx[k]] = sum[k][b];
+        }
+      }
+    }
+  });
+}
+
+torch::Tensor cpu_spherical_harmonics_backward(torch::Tensor sph_deriv,
+                                               torch::Tensor grad_output) {
+  const int64_t nsamples = sph_deriv.size(2);
+
+  grad_output = grad_output.contiguous();
+
+  torch::Tensor xyz_grad = workspace_empty({nsamples, 3}, sph_deriv.options());
+
+  AT_DISPATCH_FLOATING_TYPES(
+      sph_deriv.scalar_type(), "cpu_spherical_harmonics_backward", ([&] {
+        spherical_harmonics_backward_impl<scalar_t>(
+            sph_deriv.data_ptr<scalar_t>(), grad_output.data_ptr<scalar_t>(),
+            nsamples, xyz_grad.data_ptr<scalar_t>());
+      }));
+
+  return xyz_grad;
+}
@@ -0,0 +1,210 @@
+#include "symmetric_contraction_cpu.hpp"
+#include "workspace.h"
+
+#include <ATen/Parallel.h>
+#include <torch/script.h>
+#include <vector>
+
+using namespace std;
+using namespace torch::indexing;
+
+#define NL 16
+
+/*
+Computes, for each atom and channel, the L=0 output of the correlation-3
+symmetric contraction:
+
+  out = sum_i X_i (uw1_i + sum_j X_j (uw2_ij + sum_k U3_ijk W3_ldx1 X_kdx))
+
+reading the same packed sparse tables as the CUDA kernel, i.e each entry of
+U3_indices holds four 8-bit indices (ldx2 << 24 | ldx3 << 16 | kdx << 8 | ldx1).
+When requires_grad is set, dout/dX is stored in grad so that the backward pass
+reduces to a scaling by the incoming gradient.
+*/
+template <typename scalar_t, bool requires_grad>
+void symmetric_contraction_impl(
+    const scalar_t *X, const int *atom_types, const short *U3_num_nonzero,
+    const int *U3_indices, const float *U3_values, const short *U2_num_nonzero,
+    const short *U2_indices, const float *U2_values,
+    const short *U1_num_nonzero, const short *U1_indices, const scalar_t *W3,
+    const scalar_t *W2, const scalar_t *W1, const int64_t w3_stride,
+    const int64_t w2_stride, const int64_t w1_stride, const int64_t nnodes,
+    const int nchannels, scalar_t *out, scalar_t *grad) {
+
+  at::parallel_for(0, nnodes, 1, [&](int64_t node_start, int64_t node_end) {
+    std::vector<scalar_t> output_2(nchannels);
+    std::vector<scalar_t> output_3(nchannels);
+    std::vector<scalar_t> deriv_1(nchannels);
+    std::vector<scalar_t> deriv_1_j(nchannels);
+
+    for (int64_t node = node_start; node < node_end; node++) {
+      const int element = atom_types[node];
+
+      const scalar_t *x = X + node * NL * nchannels;
+      const scalar_t *w3 = W3 + element * w3_stride * nchannels;
+      const scalar_t *w2 = W2 + element * w2_stride * nchannels;
+      const scalar_t *w1 = W1 + element * w1_stride * nchannels;
+
+      scalar_t *o = out + node * nchannels;
+
+      for (int c = 0; c < nchannels; c++) {
+        o[c] = 0.0;
+      }
+
+      for (int i = 0; i < NL; i++) {
+        const scalar_t *xi = x + i * nchannels;
+        const scalar_t *uw1 =
+            U1_num_nonzero[i] > 0 ? w1 + U1_indices[i] * nchannels : nullptr;
+
+        for (int c = 0; c < nchannels; c++) {
+          output_2[c] = 0.0;
+          if (requires_grad)
+            deriv_1[c] = uw1 ? uw1[c] : 0.0;
+        }
+
+        for (int j = 0; j < NL; j++) {
+          const scalar_t *xj = x + j * nchannels;
+
+          const bool has_u2 = U2_num_nonzero[i * NL + j] > 0;
+          const scalar_t u2 = U2_values[i * NL + j];
+          const scalar_t *w2_j = w2 + U2_indices[i * NL + j] * nchannels;
+
+          for (int c = 0; c < nchannels; c++) {
+            output_3[c] = 0.0;
+            if (requires_grad)
+              deriv_1_j[c] = 0.0;
+          }
+
+          for (int k = 0; k < U3_num_nonzero[i * NL + j]; k++) {
+            const int compressed_indices = U3_indices[k * NL * NL + i * NL + j];
+            const scalar_t u3 = U3_values[k * NL * NL + i * NL + j];
+
+            const scalar_t *w3_1 = w3 + (compressed_indices & 0xFF) * nchannels;
+            const scalar_t *xk =
+                x + ((compressed_indices >> 8) & 0xFF) * nchannels;
+
+            for (int c = 0; c < nchannels; c++) {
+              output_3[c] += u3 * w3_1[c] * xk[c];
+            }
+
+            if (requires_grad) {
+              const scalar_t *w3_2 =
+                  w3 + ((compressed_indices >> 24) & 0xFF) * nchannels;
+              const scalar_t *w3_3 =
+                  w3 + ((compressed_indices >> 16) & 0xFF) * nchannels;
+
+              for (int c = 0; c < nchannels; c++) {
+                deriv_1_j[c] += u3 * (w3_1[c] + w3_2[c] + w3_3[c]) * xk[c];
+              }
+            }
+          }
+
+          for (int c = 0; c < nchannels; c++) {
+            const scalar_t uw2 = has_u2 ? u2 * w2_j[c] : 0.0;
+            output_2[c] += (output_3[c] + uw2) * xj[c];
+            if (requires_grad)
+              deriv_1[c] += (2.0 * uw2 + deriv_1_j[c]) * xj[c];
+          }
+        }
+
+        for (int c = 0; c < nchannels; c++) {
+          o[c] += (output_2[c] + (uw1 ? uw1[c] : 0.0)) * xi[c];
+        }
+
+        if (requires_grad) {
+          scalar_t *g = grad + node * NL * nchannels + i * nchannels;
+          for (int c = 0; c < nchannels; c++) {
+            g[c] = deriv_1[c];
+          }
+        }
+      }
+    }
+  });
+}
+
+std::vector<torch::Tensor> cpu_symmetric_contraction_forward(
+    torch::Tensor X, torch::Tensor atom_types, const int u3_n_nonsparse,
+    torch::Tensor U3_num_nonzero, torch::Tensor U3_indices,
+    torch::Tensor U3_values, torch::Tensor U2_num_nonzero,
+    torch::Tensor U2_indices, torch::Tensor U2_values,
+    torch::Tensor U1_num_nonzero, torch::Tensor U1_indices, torch::Tensor W3,
+    torch::Tensor W2, torch::Tensor W1, const int W3_size, const int W2_size,
+    const int W1_size) {
+
+  TORCH_CHECK(X.size(1) == NL, "l dimension of X ([1]) must be 16");
+
+  const int64_t nnodes = X.size(0);
+  const int nchannels = X.size(2);
+
+  torch::Tensor output =
+      workspace_empty({nnodes, 1, nchannels},
+                      torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+  torch::Tensor grad;
+
+  if (X.requires_grad()) {
+    grad = workspace_empty(
+        {nnodes, 1, NL, nchannels},
+        torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+  } else {
+    grad = torch::empty(
+        {1, 1, 1, 1},
+        torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+  }
+
+  AT_DISPATCH_FLOATING_TYPES(
+      X.scalar_type(), "symmetric_contraction_forward_cpu", ([&] {
+        auto launch = [&](auto requires_grad) {
+          symmetric_contraction_impl<scalar_t, decltype(requires_grad)::value>(
+              X.data_ptr<scalar_t>(), atom_types.data_ptr<int>(),
+              U3_num_nonzero.data_ptr<short>(), U3_indices.data_ptr<int>(),
+              U3_values.data_ptr<float>(), U2_num_nonzero.data_ptr<short>(),
+              U2_indices.data_ptr<short>(), U2_values.data_ptr<float>(),
+              U1_num_nonzero.data_ptr<short>(), U1_indices.data_ptr<short>(),
+              W3.data_ptr<scalar_t>(), W2.data_ptr<scalar_t>(),
+              W1.data_ptr<scalar_t>(), W3.size(2), W2.size(2), W1.size(2),
+              nnodes, nchannels, output.data_ptr<scalar_t>(),
+              grad.data_ptr<scalar_t>());
+        };
+
+        if (X.requires_grad()) {
+          launch(std::true_type{});
+        } else {
+          launch(std::false_type{});
+        }
+      }));
+
+  return {output, grad};
+}
+
+torch::Tensor cpu_symmetric_contraction_backward(torch::Tensor gradX,
+                                                 torch::Tensor grad_input) {
+
+  const int64_t nnodes = gradX.size(0);
+  const int nchannels = gradX.size(3);
+
+  torch::Tensor output = workspace_empty(
+      {nnodes, NL, nchannels},
+      torch::TensorOptions().dtype(gradX.dtype()).device(gradX.device()));
+
+  AT_DISPATCH_FLOATING_TYPES(
+      gradX.scalar_type(), "symmetric_contraction_backward_cpu", ([&] {
+        const scalar_t *_gradX = gradX.data_ptr<scalar_t>();
+        const scalar_t *_grad_input = grad_input.data_ptr<scalar_t>();
+        scalar_t *_output = output.data_ptr<scalar_t>();
+
+        at::parallel_for(0, nnodes, 64, [&](int64_t start, int64_t end) {
+          for (int64_t node = start; node < end; node++) {
+            const scalar_t *g = _grad_input + node * nchannels;
+
+            for (int sph = 0; sph < NL; sph++) {
+              const int64_t offset = (node * NL + sph) * nchannels;
+              for (int c = 0; c < nchannels; c++) {
+                _output[offset + c] = g[c] * _gradX[offset + c];
+              }
+            }
+          }
+        });
+      }));
+
+  return output;
+}
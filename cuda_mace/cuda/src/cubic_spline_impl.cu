@@ -65,6 +65,79 @@ __global__ void evaluate_spline_kernel_ptr(scalar_t *r, scalar_t *r_knots,
   }
 }
 
+/*
+Evaluates ntables splines sharing the same knots in a single pass over the
+samples: the interval lookup is done once per sample, and the coefficients of
+each table are read in turn.
+
+coeff: [ntables, nintervals, 4, noutputs]
+R_out, R_deriv: [ntables, nsamples, noutputs]
+*/
+template <typename scalar_t, bool evaluate_deriv>
+__global__ void evaluate_multi_spline_kernel_ptr(
+    scalar_t *r, scalar_t *r_knots, scalar_t *coeff, const int nsamples,
+    const int nintervals, const int ntables, const int noutputs,
+    const float r_width, const float r_max, scalar_t *R_out,
+    scalar_t *R_deriv) {
+
+  const int i = blockIdx.x * NWARPS_PER_BLOCK + threadIdx.y;
+
+  if (i >= nsamples) {
+    return;
+  }
+
+  const scalar_t r_i = r[i];
+
+  if (r_i > r_max) {
+    for (int t = 0; t < ntables; t++) {
+      for (int j = threadIdx.x; j < noutputs; j += blockDim.x) {
+
+        R_out[(t * nsamples + i) * noutputs + j] = 0.0;
+
+        if (evaluate_deriv) {
+          R_deriv[(t * nsamples + i) * noutputs + j] = 0.0;
+        }
+      }
+    }
+    return;
+  }
+
+  int idx = (int)(r_i / r_width);
+
+  if (idx < 0) {
+    idx = 0;
+  } else if (idx >= nintervals) {
+    idx = nintervals - 1;
+  }
+
+  const scalar_t x = r_i - r_knots[idx];
+  const scalar_t xx = x * x;
+  const scalar_t xxx = xx * x;
+
+  for (int t = 0; t < ntables; t++) {
+
+    const scalar_t *c = coeff + (t * nintervals + idx) * 4 * noutputs;
+
+    for (int j = threadIdx.x; j < noutputs; j += blockDim.x) {
+
+      scalar_t coeffs[4] = {0.0};
+
+      for (int l = 0; l < 4; l++) {
+        coeffs[l] = c[l * noutputs + j];
+      }
+
+      R_out[(t * nsamples + i) * noutputs + j] =
+          coeffs[0] + coeffs[1] * x + coeffs[2] * xx + coeffs[3] * xxx;
+
+      if (evaluate_deriv) {
+        R_deriv[(t * nsamples + i) * noutputs + j] =
+            coeffs[1] + scalar_t(2.0) * coeffs[2] * x +
+            scalar_t(3.0) * coeffs[3] * xx;
+      }
+    }
+  }
+}
+
 template <typename scalar_t>
 __global__ void backward_spline_kernel_ptr(scalar_t *grad_output,
                                            scalar_t *R_deriv, scalar_t *r_grad,
@@ -66,8 +66,15 @@ __global__ void calculate_first_occurences_kernel_ptr(
   // deal with 0th and last element specifically, so we dont need to use
   // torch::zeros
   if (blockIdx.x == 0 && threadIdx.x == 0) {
-    first_occurences_start[receiver_list[0]] = 0;
-    first_occurences_end[receiver_list[nelements_input - 1]] = nelements_input;
+    if (use_sort) {
+      first_occurences_start[receiver_list[sort_idx[0]]] = 0;
+      first_occurences_end[receiver_list[sort_idx[nelements_input - 1]]] =
+          nelements_input;
+    } else {
+      first_occurences_start[receiver_list[0]] = 0;
+      first_occurences_end[receiver_list[nelements_input - 1]] =
+          nelements_input;
+    }
   }
 }
 
@@ -76,9 +83,8 @@ __global__ void inv_tp_kernel_ptr(
     const scalar_t *__restrict__ X, const scalar_t *__restrict__ Y,
     const scalar_t *__restrict__ radial, const int *__restrict__ sender_list,
     const int *__restrict__ receiver_list,
-    const int *__restrict__ first_occurences, int *__restrict__ node_edge_index,
-    const int nedges, const int nchannels, const int nnodes,
-    scalar_t *__restrict__ output) {
+    const int *__restrict__ first_occurences, const int nedges,
+    const int nchannels, const int nnodes, scalar_t *__restrict__ output) {
 
   extern __shared__ char buffer[];
 
@@ -109,12 +115,6 @@ __global__ void inv_tp_kernel_ptr(
 
   __syncthreads();
 
-  for (int edge = edge_start + threadIdx.x; edge < edge_end;
-       edge += blockDim.x) {
-    int sender = buffer_sender[edge - edge_start];
-    node_edge_index[sender * nnodes + node_index] = edge;
-  }
-
   for (int feature = threadCol; feature < nchannels;
        feature += WARP_SIZE * TN) {
     for (int m = threadRow; m < 16; m += NWARPS_PER_BLOCK * TM) {
@@ -293,13 +293,19 @@ __global__ void backward_edge_inv_tp_kernel_ptr(
   }
 }
 
+/*
+Computes gradX by looping over the edges for which each node is the *sender*.
+The edges are visited through sender_sort_idx, a stable permutation of the
+edge list sorted by sender, with sender_first_occurences holding the [start,
+end) offsets of each node in that permutation. Both are O(nedges) in memory.
+*/
 template <typename scalar_t, const int TM, const int TN>
 __global__ void backward_node_inv_tp_kernel_ptr(
     const scalar_t *__restrict__ Y, const scalar_t *__restrict__ radial,
     const scalar_t *__restrict__ grad_in, const int *__restrict__ sender_list,
     const int *__restrict__ receiver_list,
-    const int *__restrict__ first_occurences,
-    const int *__restrict__ node_edge_index, const int nedges,
+    const int *__restrict__ sender_sort_idx,
+    const int *__restrict__ sender_first_occurences, const int nedges,
     const int nchannels, const int nnodes, scalar_t *__restrict__ gradX) {
 
   extern __shared__ char buffer[];
@@ -314,28 +320,13 @@ __global__ void backward_node_inv_tp_kernel_ptr(
 
   scalar_t *buffer_out =
       shared_array<scalar_t>(NWARPS_PER_BLOCK * WARP_SIZE, sptr, &space);
-  int *buffer_sorted_sender_idx = shared_array<int>(512, sptr, &space);
-  int *buffer_receiver_list = shared_array<int>(512, sptr, &space);
 
   const int threadCol = threadIdx.x % WARP_SIZE;
   const int threadRow = threadIdx.x / WARP_SIZE;
 
-  const int edge_start = first_occurences[blockIdx.x];
-  const int node_index = receiver_list[edge_start];
-  const int edge_end = first_occurences[nnodes + blockIdx.x];
-
-  if (edge_end - edge_start == 0) {
-    return;
-  }
-
-  for (int tid = threadIdx.x; tid < edge_end - edge_start; tid += blockDim.x) {
-    int sender = sender_list[edge_start + tid];
-    int sorted_id = node_edge_index[node_index * nnodes + sender];
-    buffer_sorted_sender_idx[tid] = sorted_id;
-    buffer_receiver_list[tid] = receiver_list[sorted_id];
-  }
-
-  __syncthreads();
+  const int node_index = blockIdx.x;
+  const int edge_start = sender_first_occurences[node_index];
+  const int edge_end = sender_first_occurences[nnodes + node_index];
 
   for (int feature = threadCol; feature < nchannels;
        feature += WARP_SIZE * TN) {
@@ -348,8 +339,8 @@ __global__ void backward_node_inv_tp_kernel_ptr(
 
     for (int edge = edge_start; edge < edge_end; edge++) {
 
-      int sorted_id = buffer_sorted_sender_idx[edge - edge_start];
-      int receiver_id = buffer_receiver_list[edge - edge_start];
+      int sorted_id = sender_sort_idx[edge];
+      int receiver_id = receiver_list[sorted_id];
 
       for (int m = threadRow; m < 16; m += NWARPS_PER_BLOCK * TM) {
         for (int j = 0; j < TM; j++) {
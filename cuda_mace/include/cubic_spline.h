@@ -17,6 +17,17 @@ public:
                                 variable_list grad_outputs);
 };
 
+// evaluates several splines sharing the same knots, coeffs: [ntables, nintervals, 4, noutputs]
+class MultiCubicSplineAutograd : public Function<MultiCubicSplineAutograd> {
+public:
+  static torch::Tensor forward(AutogradContext *ctx, torch::Tensor r,
+                               torch::Tensor r_knots, torch::Tensor coeffs,
+                               double r_width, double r_max);
+
+  static variable_list backward(AutogradContext *ctx,
+                                variable_list grad_outputs);
+};
+
 class CubicSpline : public torch::CustomClassHolder {
 
 public:
@@ -30,4 +41,17 @@ public:
   void __setstate__(const std::vector<torch::Tensor> &state) { return; }
 };
 
+class MultiCubicSpline : public torch::CustomClassHolder {
+
+public:
+  MultiCubicSpline() {}
+
+  torch::Tensor forward(torch::Tensor r, torch::Tensor r_knots,
+                        torch::Tensor coeffs, double r_width, double r_max);
+
+  std::vector<torch::Tensor> __getstate__() { return {}; }
+
+  void __setstate__(const std::vector<torch::Tensor> &state) { return; }
+};
+
 #endif
\ No newline at end of file
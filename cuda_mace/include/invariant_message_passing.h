@@ -17,11 +17,25 @@ public:
         torch::Tensor radial,
         torch::Tensor sender_list,
         torch::Tensor receiver_list,
+        torch::Tensor first_occurences,
+        torch::Tensor sender_sort_idx,
+        torch::Tensor sender_first_occurences,
         const int64_t nnodes);
 
     static variable_list backward(AutogradContext *ctx, variable_list grad_outputs);
 };
 
+// receiver CSR offsets as [2 * nnodes] (start, end) pairs, for receiver_list sorted.
+torch::Tensor calculate_first_occurences(torch::Tensor receiver_list, const int64_t nnodes);
+
+// permutation of the edges into sender order, and the matching offsets.
+std::vector<torch::Tensor> calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes);
+
+// stable sort of the edges by receiver (edge_index[0]): {edge_index [2, nedges] int32,
+// receiver offsets [nnodes + 1] int32, permutation [nedges] int64, edge_data...}, each
+// tensor of edge_data having nedges rows. validate also bounds-checks the senders.
+std::vector<torch::Tensor> sort_edges_by_receiver(torch::Tensor edge_index, std::vector<torch::Tensor> edge_data, const int64_t nnodes, const bool validate);
+
 class InvariantMessagePassingTP : public torch::CustomClassHolder
 {
 public:
@@ -33,6 +47,25 @@ public:
         torch::Tensor receiver_list,
         const int64_t nnodes);
 
+    // as forward, but with the offsets computed once per graph with calculate_first_occurences
+    // and calculate_sender_ordering. Empty tensors are computed on the fly.
+    torch::Tensor forward_precomputed(
+        torch::Tensor X,
+        torch::Tensor Y,
+        torch::Tensor radial,
+        torch::Tensor sender_list,
+        torch::Tensor receiver_list,
+        torch::Tensor first_occurences,
+        torch::Tensor sender_sort_idx,
+        torch::Tensor sender_first_occurences,
+        const int64_t nnodes);
+
+    torch::Tensor calculate_first_occurences(torch::Tensor receiver_list, const int64_t nnodes);
+
+    std::vector<torch::Tensor> calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes);
+
+    std::vector<torch::Tensor> sort_edges_by_receiver(torch::Tensor edge_index, std::vector<torch::Tensor> edge_data, const int64_t nnodes, const bool validate);
+
     std::vector<torch::Tensor> __getstate__()
     {
         return {};
@@ -45,7 +45,9 @@ public:
         torch::Tensor X,
         torch::Tensor W,
         torch::Tensor W_transposed,
-        torch::Tensor one_hot_embedding);
+        torch::Tensor one_hot_embedding,
+        torch::Tensor node_ordering,
+        torch::Tensor element_offsets);
 
     static variable_list backward(AutogradContext *ctx, variable_list grad_outputs);
 };
@@ -59,6 +61,14 @@ public:
         torch::Tensor W_transposed,
         torch::Tensor one_hot_embedding);
 
+    // CPU only: the element ordering of the last one-hot embedding, reused while the same
+    // tensor is passed in unmodified.
+    std::vector<torch::Tensor> element_ordering(torch::Tensor one_hot_embedding);
+
+    torch::Tensor cached_one_hot_embedding;
+    int64_t cached_version = -1;
+    std::vector<torch::Tensor> cached_ordering;
+
     std::vector<torch::Tensor> __getstate__()
     {
         return {};
@@ -0,0 +1,56 @@
+#ifndef WORKSPACE_H
+#define WORKSPACE_H
+#include <torch/script.h>
+
+#include <map>
+#include <mutex>
+#include <tuple>
+#include <vector>
+
+using namespace std;
+
+/*
+Pool of output and intermediate buffers of the ops, reused across calls. Requests are
+rounded up to a bucket (buckets_per_octave buckets between consecutive powers of two), so
+that slightly different atom and edge counts, as between MD steps, map to the same buffer.
+
+A buffer is only handed out again once no tensor other than the pool references its
+storage, so outputs still held by the caller or saved for backward are never overwritten.
+*/
+class Workspace : public torch::CustomClassHolder
+{
+public:
+    Workspace(const int64_t buckets_per_octave = 4);
+
+    torch::Tensor empty(at::IntArrayRef sizes, const torch::TensorOptions &options);
+
+    // makes this workspace the one workspace_empty draws from, until deactivate().
+    void activate();
+
+    void deactivate();
+
+    // releases all buffers which are not in use.
+    void clear();
+
+    c10::Dict<std::string, int64_t> statistics();
+
+    int64_t bucket_size(const int64_t numel) const;
+
+private:
+    using Key = std::tuple<int, int, int, int64_t>; // device type and index, dtype, capacity
+
+    int64_t buckets_per_octave;
+
+    std::mutex mutex;
+    std::map<Key, std::vector<torch::Tensor>> buffers;
+    c10::intrusive_ptr<Workspace> previous;
+
+    int64_t num_allocations = 0;
+    int64_t num_reuses = 0;
+    int64_t reserved_bytes = 0;
+};
+
+// torch::empty, drawn from the active workspace if there is one.
+torch::Tensor workspace_empty(at::IntArrayRef sizes, const torch::TensorOptions &options);
+
+#endif
@@ -11,4 +11,9 @@ std::vector<torch::Tensor> jit_evaluate_spline(torch::Tensor r,
 
 torch::Tensor jit_backward_spline(torch::Tensor grad_output, torch::Tensor R_deriv);
 
+std::vector<torch::Tensor> jit_evaluate_multi_spline(torch::Tensor r,
+                                                 torch::Tensor r_knots,
+                                                 torch::Tensor coeffs,
+                                                 double r_width, double r_max);
+
 #endif
\ No newline at end of file
@@ -14,6 +14,17 @@
 #include <cxxabi.h>
 #include <iostream>
 #include <filesystem>
+#include <algorithm>
+#include <chrono>
+#include <cstdint>
+#include <cstdlib>
+#include <iomanip>
+#include <sstream>
+#include <system_error>
+#include <atomic>
+#include <cstring>
+#include <cerrno>
+#include <unistd.h>
 
 #include "dynamic_cuda.hpp"
 
@@ -120,6 +131,366 @@ std::string inline load_cuda_source(const std::string& filename) {
     return ss.str();
 }
 
+/*
+Interface for turning CUDA source into PTX. The default implementation uses NVRTC, but a stub can
+be installed on the KernelFactory (see KernelFactory::setCompiler) so that the caching logic can be
+exercised on machines without a GPU.
+*/
+class KernelCompiler {
+  public:
+    virtual ~KernelCompiler() = default;
+
+    /*
+    Compiles "kernel_name" from "kernel_code" for the compute capability "arch" (e.g 80), returning
+    the PTX and writing the lowered (mangled) kernel name into "lowered_name".
+    */
+    virtual std::string compile(
+        const std::string& kernel_name,
+        const std::string& kernel_code,
+        const std::string& source_name,
+        const std::vector<std::string>& options,
+        int arch,
+        std::string& lowered_name
+    ) = 0;
+
+    /*
+    Identifies the compiler toolchain. Forms part of the on-disk cache key so that upgrading the
+    compiler invalidates previously cached kernels.
+    */
+    virtual std::string version() = 0;
+};
+
+class NVRTCCompiler : public KernelCompiler {
+  public:
+    std::string compile(
+        const std::string& kernel_name,
+        const std::string& kernel_code,
+        const std::string& source_name,
+        const std::vector<std::string>& options,
+        int arch,
+        std::string& lowered_name
+    ) override {
+
+        nvrtcProgram prog;
+
+        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcCreateProgram(
+            &prog, kernel_code.c_str(), source_name.c_str(), 0, nullptr, nullptr
+        ));
+
+        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcAddNameExpression(prog, kernel_name.c_str()));
+
+        std::string cuda_include_path = "--include-path=" + findCudaIncludePath();
+
+        std::vector<const char*> c_options;
+        c_options.reserve(options.size());
+        for (const auto& option : options) {
+            c_options.push_back(option.c_str());
+        }
+        c_options.push_back(cuda_include_path.c_str());
+
+        std::string smbuf = "--gpu-architecture=compute_" + std::to_string(arch);
+
+        c_options.push_back(smbuf.c_str());
+
+        nvrtcResult compileResult =
+            NVRTC_INSTANCE.nvrtcCompileProgram(prog, c_options.size(), c_options.data());
+        if (compileResult != NVRTC_SUCCESS) {
+            size_t logSize;
+            NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetProgramLogSize(prog, &logSize));
+            std::string log(logSize, '\0');
+            NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetProgramLog(prog, &log[0]));
+            throw std::runtime_error(
+                "KernelFactory::compileAndCacheKernel: Failed to compile CUDA program:\n" + log
+            );
+        }
+
+        // Get PTX code
+        size_t ptxSize;
+        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetPTXSize(prog, &ptxSize));
+        std::string ptxCode(ptxSize, '\0');
+        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetPTX(prog, &ptxCode[0]));
+
+        // ptxSize includes the null terminator, which std::string already provides.
+        ptxCode.resize(std::strlen(ptxCode.c_str()));
+
+        const char* lowered;
+        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetLoweredName(prog, kernel_name.c_str(), &lowered));
+        lowered_name = lowered;
+
+        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcDestroyProgram(&prog));
+
+        return ptxCode;
+    }
+
+    std::string version() override {
+        int major = 0;
+        int minor = 0;
+        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcVersion(&major, &minor));
+        return "nvrtc-" + std::to_string(major) + "." + std::to_string(minor);
+    }
+};
+
+/*
+Persistent, size-bounded cache of compiled PTX, shared between processes. Each entry is a single
+file "<key>.ptx" whose first line is the lowered kernel name, followed by the PTX. Entries are
+written to a temporary file and renamed into place, so concurrent readers never observe a partial
+file. When the total size exceeds "max_bytes", the least recently used entries are evicted; the
+modification time of an entry is refreshed on every hit.
+
+Configured through the environment:
+    CUDA_MACE_KERNEL_CACHE_DIR      cache location (default: $XDG_CACHE_HOME/cuda_mace/kernels, or
+                                    ~/.cache/cuda_mace/kernels)
+    CUDA_MACE_KERNEL_CACHE_SIZE     maximum size in bytes (default: 256 MB)
+    CUDA_MACE_DISABLE_KERNEL_CACHE  set to 1 to always compile
+*/
+class KernelDiskCache {
+
+  public:
+    static constexpr std::uintmax_t DEFAULT_MAX_BYTES = 256ull * 1024ull * 1024ull;
+
+    KernelDiskCache() = default;
+
+    KernelDiskCache(std::filesystem::path directory, std::uintmax_t max_bytes)
+        : directory(std::move(directory)), max_bytes(max_bytes) {}
+
+    static KernelDiskCache fromEnvironment() {
+        const char* disabled = std::getenv("CUDA_MACE_DISABLE_KERNEL_CACHE");
+        if (disabled && std::string(disabled) == "1") {
+            return KernelDiskCache();
+        }
+
+        std::filesystem::path directory;
+
+        if (const char* dir = std::getenv("CUDA_MACE_KERNEL_CACHE_DIR")) {
+            directory = dir;
+        } else if (const char* xdg = std::getenv("XDG_CACHE_HOME")) {
+            directory = std::filesystem::path(xdg) / "cuda_mace" / "kernels";
+        } else if (const char* home = std::getenv("HOME")) {
+            directory = std::filesystem::path(home) / ".cache" / "cuda_mace" / "kernels";
+        } else {
+            return KernelDiskCache();
+        }
+
+        std::uintmax_t max_bytes = DEFAULT_MAX_BYTES;
+
+        if (const char* size = std::getenv("CUDA_MACE_KERNEL_CACHE_SIZE")) {
+            max_bytes = parseSize(size);
+        }
+
+        return KernelDiskCache(directory, max_bytes);
+    }
+
+    /*
+    Parses CUDA_MACE_KERNEL_CACHE_SIZE. A value which is not a non-negative integer number of bytes
+    is ignored with a warning, rather than silently disabling the cache. "0" disables it.
+    */
+    static std::uintmax_t parseSize(const char* size) {
+        char* end = nullptr;
+        errno = 0;
+        unsigned long long value = std::strtoull(size, &end, 10);
+
+        if (end == size || *end != '\0' || errno == ERANGE || std::strchr(size, '-') != nullptr) {
+            std::cerr << "cuda_mace: ignoring invalid CUDA_MACE_KERNEL_CACHE_SIZE=\"" << size
+                      << "\", using the default of " << DEFAULT_MAX_BYTES << " bytes" << std::endl;
+            return DEFAULT_MAX_BYTES;
+        }
+
+        return value;
+    }
+
+    bool enabled() const { return !directory.empty() && max_bytes > 0; }
+
+    const std::filesystem::path& path() const { return directory; }
+
+    std::uintmax_t maxBytes() const { return max_bytes; }
+
+    /*
+    Builds the cache key from everything which affects the generated code.
+    */
+    static std::string key(
+        const std::string& kernel_name,
+        const std::string& kernel_code,
+        const std::vector<std::string>& options,
+        int arch,
+        const std::string& compiler_version
+    ) {
+        uint64_t hash = 14695981039346656037ull; // FNV-1a offset basis
+
+        auto update = [&hash](const std::string& field) {
+            for (unsigned char c : field) {
+                hash ^= c;
+                hash *= 1099511628211ull;
+            }
+            // field separator, so that ("ab", "c") and ("a", "bc") differ.
+            hash ^= 0xFF;
+            hash *= 1099511628211ull;
+        };
+
+        update(kernel_name);
+        update(kernel_code);
+        for (const auto& option : options) {
+            update(option);
+        }
+        update(std::to_string(arch));
+        update(compiler_version);
+
+        std::ostringstream ss;
+        ss << std::hex << std::setw(16) << std::setfill('0') << hash;
+        return ss.str();
+    }
+
+    bool load(const std::string& key, std::string& ptx, std::string& lowered_name) const {
+        if (!enabled()) {
+            return false;
+        }
+
+        std::filesystem::path entry = entryPath(key);
+
+        std::ifstream file(entry, std::ios::binary);
+        if (!file.is_open() || !std::getline(file, lowered_name) || lowered_name.empty()) {
+            return false;
+        }
+
+        std::ostringstream ss;
+        ss << file.rdbuf();
+        ptx = ss.str();
+
+        if (ptx.empty()) {
+            return false;
+        }
+
+        // mark as recently used.
+        std::error_code ec;
+        std::filesystem::last_write_time(
+            entry, std::filesystem::file_time_type::clock::now(), ec
+        );
+
+        return true;
+    }
+
+    void store(const std::string& key, const std::string& ptx, const std::string& lowered_name) {
+        if (!enabled()) {
+            return;
+        }
+
+        std::error_code ec;
+        std::filesystem::create_directories(directory, ec);
+        if (ec) {
+            return;
+        }
+
+        static std::atomic<unsigned long> counter{0};
+
+        std::filesystem::path tmp = directory / (key + ".tmp." + std::to_string(getpid()) + "." +
+                                                 std::to_string(counter++));
+        {
+            std::ofstream file(tmp, std::ios::binary | std::ios::trunc);
+            if (!file.is_open()) {
+                return;
+            }
+            file << lowered_name << '\n' << ptx;
+            if (!file.good()) {
+                file.close();
+                std::filesystem::remove(tmp, ec);
+                return;
+            }
+        }
+
+        std::filesystem::rename(tmp, entryPath(key), ec);
+        if (ec) {
+            std::filesystem::remove(tmp, ec);
+            return;
+        }
+
+        this->evict();
+    }
+
+    /*
+    Removes the least recently used entries until the cache fits in max_bytes.
+    */
+    void evict() const {
+        std::error_code ec;
+        std::vector<std::pair<std::filesystem::file_time_type, std::filesystem::path>> entries;
+        std::uintmax_t total = 0;
+
+        for (auto it = std::filesystem::directory_iterator(directory, ec);
+             !ec && it != std::filesystem::directory_iterator();
+             it.increment(ec)) {
+            if (it->path().extension() != ".ptx") {
+                continue;
+            }
+            std::error_code entry_ec;
+            std::uintmax_t size = it->file_size(entry_ec);
+            auto time = it->last_write_time(entry_ec);
+            if (entry_ec) {
+                continue;
+            }
+            total += size;
+            entries.emplace_back(time, it->path());
+        }
+
+        if (total <= max_bytes) {
+            return;
+        }
+
+        std::sort(entries.begin(), entries.end());
+
+        for (const auto& entry : entries) {
+            if (total <= max_bytes) {
+                break;
+            }
+            std::error_code entry_ec;
+            std::uintmax_t size = std::filesystem::file_size(entry.second, entry_ec);
+            if (!entry_ec && std::filesystem::remove(entry.second, entry_ec)) {
+                total -= size;
+            }
+        }
+    }
+
+  private:
+    std::filesystem::path entryPath(const std::string& key) const {
+        return directory / (key + ".ptx");
+    }
+
+    std::filesystem::path directory;
+    std::uintmax_t max_bytes = 0;
+};
+
+/*
+Returns the PTX for "kernel_name", reading it from "disk_cache" when present and otherwise
+compiling it with "compiler" and storing the result. Does not require a GPU.
+*/
+std::string inline compileWithCache(
+    KernelCompiler& compiler,
+    KernelDiskCache& disk_cache,
+    const std::string& kernel_name,
+    const std::string& kernel_code,
+    const std::string& source_name,
+    const std::vector<std::string>& options,
+    int arch,
+    std::string& lowered_name
+) {
+    std::string key;
+
+    if (disk_cache.enabled()) {
+        key = KernelDiskCache::key(kernel_name, kernel_code, options, arch, compiler.version());
+
+        std::string ptx;
+        if (disk_cache.load(key, ptx, lowered_name)) {
+            return ptx;
+        }
+    }
+
+    std::string ptx =
+        compiler.compile(kernel_name, kernel_code, source_name, options, arch, lowered_name);
+
+    if (disk_cache.enabled()) {
+        disk_cache.store(key, ptx, lowered_name);
+    }
+
+    return ptx;
+}
+
 /*
 Container class for the cached kernels. Provides functionality for launching compiled kernels as
 well as automatically resizing dynamic shared memory allocations, when needed. Kernels are compiled
@@ -132,12 +503,16 @@ class CachedKernel {
         std::string kernel_name,
         std::string kernel_code,
         std::string source_name,
-        std::vector<std::string> options
+        std::vector<std::string> options,
+        KernelCompiler* compiler,
+        KernelDiskCache* disk_cache
     ) {
         this->kernel_name = kernel_name;
         this->kernel_code = kernel_code;
         this->source_name = source_name;
         this->options = options;
+        this->compiler = compiler;
+        this->disk_cache = disk_cache;
     }
 
     CachedKernel() = default;
@@ -300,23 +675,6 @@ class CachedKernel {
         CUdevice cuDevice;
         CUDADRIVER_SAFE_CALL(CUDA_DRIVER_INSTANCE.cuCtxGetDevice(&cuDevice));
 
-        nvrtcProgram prog;
-
-        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcCreateProgram(
-            &prog, this->kernel_code.c_str(), this->source_name.c_str(), 0, nullptr, nullptr
-        ));
-
-        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcAddNameExpression(prog, this->kernel_name.c_str()));
-
-        std::string cuda_include_path = "--include-path=" + findCudaIncludePath();
-
-        std::vector<const char*> c_options;
-        c_options.reserve(this->options.size());
-        for (const auto& option : this->options) {
-            c_options.push_back(option.c_str());
-        }
-        c_options.push_back(cuda_include_path.c_str());
-
         int major = 0;
         int minor = 0;
         CUDADRIVER_SAFE_CALL(CUDA_DRIVER_INSTANCE.cuDeviceGetAttribute(
@@ -326,27 +684,19 @@ class CachedKernel {
             &minor, CU_DEVICE_ATTRIBUTE_COMPUTE_CAPABILITY_MINOR, cuDevice
         ));
         int arch = major * 10 + minor;
-        std::string smbuf = "--gpu-architecture=compute_" + std::to_string(arch);
-
-        c_options.push_back(smbuf.c_str());
-
-        nvrtcResult compileResult =
-            NVRTC_INSTANCE.nvrtcCompileProgram(prog, c_options.size(), c_options.data());
-        if (compileResult != NVRTC_SUCCESS) {
-            size_t logSize;
-            NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetProgramLogSize(prog, &logSize));
-            std::string log(logSize, '\0');
-            NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetProgramLog(prog, &log[0]));
-            throw std::runtime_error(
-                "KernelFactory::compileAndCacheKernel: Failed to compile CUDA program:\n" + log
-            );
-        }
 
-        // Get PTX code
-        size_t ptxSize;
-        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetPTXSize(prog, &ptxSize));
-        std::vector<char> ptxCode(ptxSize);
-        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcGetPTX(prog, ptxCode.data()));
+        std::string lowered_name;
+
+        std::string ptxCode = compileWithCache(
+            *this->compiler,
+            *this->disk_cache,
+            this->kernel_name,
+            this->kernel_code,
+            this->source_name,
+            this->options,
+            arch,
+            lowered_name
+        );
 
         CUmodule module;
         
@@ -362,21 +712,15 @@ class CachedKernel {
             );
         }
 
-        const char* lowered_name;
-        NVRTC_SAFE_CALL(
-            NVRTC_INSTANCE.nvrtcGetLoweredName(prog, this->kernel_name.c_str(), &lowered_name)
-        );
-
         CUfunction kernel;
-        CUDADRIVER_SAFE_CALL(CUDA_DRIVER_INSTANCE.cuModuleGetFunction(&kernel, module, lowered_name)
+        CUDADRIVER_SAFE_CALL(
+            CUDA_DRIVER_INSTANCE.cuModuleGetFunction(&kernel, module, lowered_name.c_str())
         );
 
         this->module = module;
         this->function = kernel;
         this->context = currentContext;
         this->compiled = true;
-
-        NVRTC_SAFE_CALL(NVRTC_INSTANCE.nvrtcDestroyProgram(&prog));
     }
 
     void initCudaDriver() {
@@ -407,6 +751,9 @@ class CachedKernel {
     std::string kernel_code;
     std::string source_name;
     std::vector<std::string> options;
+
+    KernelCompiler* compiler = nullptr;
+    KernelDiskCache* disk_cache = nullptr;
 };
 
 /*
@@ -427,10 +774,26 @@ class KernelFactory {
         const std::string& source_name,
         const std::vector<std::string>& options
     ) {
-        kernel_cache[kernel_name] =
-            std::make_unique<CachedKernel>(kernel_name, source_path, source_name, options);
+        kernel_cache[kernel_name] = std::make_unique<CachedKernel>(
+            kernel_name, source_path, source_name, options, compiler.get(), &disk_cache
+        );
+    }
+
+    /*
+    Replaces the compiler, e.g with a stub for testing the on-disk cache without a GPU. Kernels
+    created with the previous compiler are discarded and will be recreated on next use.
+    */
+    void setCompiler(std::unique_ptr<KernelCompiler> new_compiler) {
+        kernel_cache.clear();
+        compiler = std::move(new_compiler);
     }
 
+    KernelCompiler& getCompiler() { return *compiler; }
+
+    void setDiskCache(const KernelDiskCache& cache) { disk_cache = cache; }
+
+    KernelDiskCache& getDiskCache() { return disk_cache; }
+
     bool hasKernel(const std::string& kernel_name) const {
         return kernel_cache.find(kernel_name) != kernel_cache.end();
     }
@@ -476,8 +839,13 @@ class KernelFactory {
     }
 
   private:
-    KernelFactory() {}
+    KernelFactory()
+        : compiler(std::make_unique<NVRTCCompiler>()),
+          disk_cache(KernelDiskCache::fromEnvironment()) {}
+
     std::unordered_map<std::string, std::unique_ptr<CachedKernel>> kernel_cache;
+    std::unique_ptr<KernelCompiler> compiler;
+    KernelDiskCache disk_cache;
 
     KernelFactory(const KernelFactory&) = delete;
     KernelFactory& operator=(const KernelFactory&) = delete;
@@ -282,6 +282,7 @@ class NVRTC {
     using nvrtcGetLoweredName_t = nvrtcResult (*)(nvrtcProgram, const char*, const char**);
     using nvrtcDestroyProgram_t = nvrtcResult (*)(nvrtcProgram*);
     using nvrtcGetErrorString_t = const char* (*)(nvrtcResult);
+    using nvrtcVersion_t = nvrtcResult (*)(int*, int*);
 
     nvrtcCreateProgram_t nvrtcCreateProgram;
     nvrtcCompileProgram_t nvrtcCompileProgram;
@@ -293,6 +294,7 @@ class NVRTC {
     nvrtcAddNameExpression_t nvrtcAddNameExpression;
     nvrtcDestroyProgram_t nvrtcDestroyProgram;
     nvrtcGetErrorString_t nvrtcGetErrorString;
+    nvrtcVersion_t nvrtcVersion;
 
     NVRTC() {
 #ifdef __linux__
@@ -315,6 +317,7 @@ class NVRTC {
                 load<nvrtcAddNameExpression_t>(nvrtcHandle, "nvrtcAddNameExpression");
             nvrtcDestroyProgram = load<nvrtcDestroyProgram_t>(nvrtcHandle, "nvrtcDestroyProgram");
             nvrtcGetErrorString = load<nvrtcGetErrorString_t>(nvrtcHandle, "nvrtcGetErrorString");
+            nvrtcVersion = load<nvrtcVersion_t>(nvrtcHandle, "nvrtcVersion");
         }else {
             throw std::runtime_error("failed to load libnvrtc.so. Make sure it's in your LD_LIBRARY_PATH.");
         }
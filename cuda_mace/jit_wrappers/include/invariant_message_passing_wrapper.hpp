@@ -9,6 +9,15 @@ using namespace torch;
 
 torch::Tensor jit_calculate_first_occurences(torch::Tensor receiver_list,
                                              const int64_t nnodes);
+
+std::vector<torch::Tensor>
+jit_calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes);
+
+std::vector<torch::Tensor>
+jit_sort_edges_by_receiver(torch::Tensor edge_index,
+                           std::vector<torch::Tensor> edge_data,
+                           const int64_t nnodes, const bool validate);
+
 std::vector<torch::Tensor>
 jit_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
             torch::Tensor sender_list, torch::Tensor receiver_list,
@@ -18,6 +27,7 @@ std::vector<torch::Tensor>
 jit_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
              torch::Tensor grad_in, torch::Tensor sender_list,
              torch::Tensor receiver_list, torch::Tensor first_occurences,
-             torch::Tensor node_edge_index, const int64_t nnodes);
+             torch::Tensor sender_sort_idx,
+             torch::Tensor sender_first_occurences, const int64_t nnodes);
 
 #endif // INVARIANT_MESSAGE_PASSING_WRAPPER_HPP
\ No newline at end of file
@@ -1,5 +1,6 @@
 #include "cubic_spline_wrapper.hpp"
 #include "cuda_cache.hpp"
+#include "workspace.h"
 
 using namespace c10;
 using namespace std;
@@ -23,14 +24,14 @@ std::vector<torch::Tensor> jit_evaluate_spline(torch::Tensor r,
   int nknots = r_knots.size(0);
   int noutputs = coeffs.size(2);
   torch::Tensor R_out =
-      torch::empty({nsamples, noutputs},
-                   torch::TensorOptions().dtype(r.dtype()).device(r.device()));
+      workspace_empty({nsamples, noutputs},
+                      torch::TensorOptions().dtype(r.dtype()).device(r.device()));
 
   torch::Tensor R_deriv = torch::empty(
       {1, 1}, torch::TensorOptions().dtype(r.dtype()).device(r.device()));
 
   if (r.requires_grad()) {
-    R_deriv = torch::empty(
+    R_deriv = workspace_empty(
         {nsamples, noutputs},
         torch::TensorOptions().dtype(r.dtype()).device(r.device()));
   }
@@ -112,7 +113,7 @@ torch::Tensor jit_backward_spline(torch::Tensor grad_output,
 
   int nsamples = R_deriv.size(0);
   int noutputs = R_deriv.size(1);
-  torch::Tensor r_grad = torch::empty(
+  torch::Tensor r_grad = workspace_empty(
       {nsamples},
       torch::TensorOptions().dtype(R_deriv.dtype()).device(R_deriv.device()));
 
@@ -150,4 +151,91 @@ torch::Tensor jit_backward_spline(torch::Tensor grad_output,
       }));
 
   return r_grad;
-}
\ No newline at end of file
+}
+
+std::vector<torch::Tensor> jit_evaluate_multi_spline(torch::Tensor r,
+                                                 torch::Tensor r_knots,
+                                                 torch::Tensor coeffs,
+                                                 double r_width, double r_max) {
+  static const char* CUDA_CODE =
+#include "generated/wrapped_cubic_spline_impl.cu"
+        ;
+
+  TORCH_CHECK(coeffs.dim() == 4,
+              "coeffs must have shape [ntables, nintervals, 4, noutputs]");
+
+  int nsamples = r.size(0);
+  int ntables = coeffs.size(0);
+  int nintervals = coeffs.size(1);
+  int noutputs = coeffs.size(3);
+
+  torch::Tensor R_out =
+      workspace_empty({ntables, nsamples, noutputs},
+                      torch::TensorOptions().dtype(r.dtype()).device(r.device()));
+
+  torch::Tensor R_deriv = torch::empty(
+      {1, 1, 1}, torch::TensorOptions().dtype(r.dtype()).device(r.device()));
+
+  if (r.requires_grad()) {
+    R_deriv = workspace_empty(
+        {ntables, nsamples, noutputs},
+        torch::TensorOptions().dtype(r.dtype()).device(r.device()));
+  }
+
+  auto find_integer_divisor = [](int x, int y) -> int {
+        if (y == 0) {
+            throw std::invalid_argument("Divisor cannot be zero.");
+        }
+        return (x + y - 1) / y;
+    };
+
+  dim3 gdim(find_integer_divisor(nsamples, NWARPS_PER_BLOCK));
+
+  dim3 bdim(32, NWARPS_PER_BLOCK, 1);
+
+  AT_DISPATCH_FLOATING_TYPES(
+      r.scalar_type(), "evaluate_multi_spline", ([&] {
+        scalar_t * _r  = r.data_ptr<scalar_t> ();
+        scalar_t * _r_knots  = r_knots.data_ptr<scalar_t> ();
+        scalar_t * _coeff  = coeffs.data_ptr<scalar_t> ();
+        scalar_t * _R_out  = R_out.data_ptr<scalar_t> ();
+        scalar_t * _R_out_deriv  = R_deriv.data_ptr<scalar_t>();
+        float _r_width = r_width;
+        float _r_max = r_max;
+
+        std::vector<void*> args = {
+        &_r,
+        &_r_knots,
+        &_coeff,
+        &nsamples,
+        &nintervals,
+        &ntables,
+        &noutputs,
+        &_r_width,
+        &_r_max,
+        &_R_out,
+        &_R_out_deriv
+        };
+
+        std::string kernel_name;
+        if (r.requires_grad()) {
+          kernel_name= getKernelName<scalar_t, std::integral_constant<bool, true>>("evaluate_multi_spline_kernel_ptr");
+        } else {
+          kernel_name =  getKernelName<scalar_t, std::integral_constant<bool, false>>("evaluate_multi_spline_kernel_ptr");
+        }
+
+        auto& kernel_factory = KernelFactory::instance();
+
+        CachedKernel* kernel = kernel_factory.create(
+            kernel_name, std::string(CUDA_CODE), "wrapped_cubic_spline_impl.cu", {"--std=c++17", "-lineinfo"}
+        );
+
+        kernel->launch(gdim, bdim, 0, 0, args);
+      }));
+
+  if (r.requires_grad()) {
+    return {R_out, R_deriv};
+  } else {
+    return {R_out};
+  }
+}
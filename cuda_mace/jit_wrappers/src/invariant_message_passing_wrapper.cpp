@@ -1,6 +1,7 @@
 #include "invariant_message_passing_wrapper.hpp"
 #include "cuda_utils.hpp"
 #include "cuda_cache.hpp"
+#include "workspace.h"
 
 #include <iostream>
 #include <torch/script.h>
@@ -16,18 +17,15 @@ using namespace torch::autograd;
 #define NEIGHBOUR_NEDGES_PER_BLOCK 512
 #define NELEMENTS_PER_BLOCK 512
 
-torch::Tensor jit_calculate_first_occurences(torch::Tensor receiver_list,
-                                             const int64_t nnodes) {
+static void launch_first_occurences(torch::Tensor receiver_list,
+                                    torch::Tensor sort_idx, bool use_sort,
+                                    torch::Tensor first_occurences,
+                                    const int64_t nnodes) {
 
     static const char* CUDA_CODE =
 #include "generated/wrapped_invariant_message_passing_impl.cu"
         ;
 
-    torch::Tensor first_occurences =
-        torch::empty(2 * nnodes, torch::TensorOptions()
-                                .dtype(receiver_list.dtype())
-                                .device(receiver_list.device()));
-
     int nbx =
         find_integer_divisor(receiver_list.size(0), NELEMENTS_PER_BLOCK);
 
@@ -41,8 +39,8 @@ torch::Tensor jit_calculate_first_occurences(torch::Tensor receiver_list,
     int * _receiver_list  = receiver_list.data_ptr<int> ();
     int _nedges = receiver_list.size(0);
     int _nnodes = nnodes;
-    int * _sort_idx  = nullptr;
-    bool _use_sort = false;
+    int * _sort_idx  = use_sort ? sort_idx.data_ptr<int>() : nullptr;
+    bool _use_sort = use_sort;
     int * _first_occurences  = first_occurences.data_ptr<int>();
     int * _first_occurences_shift = _first_occurences + nnodes;
     
@@ -65,10 +63,87 @@ torch::Tensor jit_calculate_first_occurences(torch::Tensor receiver_list,
     );
 
     kernel->launch(gdim, bdim, space, 0, args);
+}
+
+torch::Tensor jit_calculate_first_occurences(torch::Tensor receiver_list,
+                                             const int64_t nnodes) {
+
+    torch::Tensor first_occurences =
+        workspace_empty({2 * nnodes}, torch::TensorOptions()
+                                .dtype(receiver_list.dtype())
+                                .device(receiver_list.device()));
+
+    launch_first_occurences(receiver_list, torch::Tensor(), false,
+                            first_occurences, nnodes);
 
   return first_occurences;
 }
 
+std::vector<torch::Tensor>
+jit_calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes) {
+
+    // stable sort so that edges sharing a sender keep their receiver ordering.
+    torch::Tensor sender_sort_idx =
+        torch::argsort(sender_list, /*stable=*/true).to(torch::kInt32);
+
+    // nodes which never appear as a sender must describe an empty range.
+    torch::Tensor sender_first_occurences =
+        workspace_empty({2 * nnodes}, torch::TensorOptions()
+                                .dtype(sender_list.dtype())
+                                .device(sender_list.device())).zero_();
+
+    if (sender_list.size(0) > 0) {
+      launch_first_occurences(sender_list, sender_sort_idx, true,
+                              sender_first_occurences, nnodes);
+    }
+
+  return {sender_sort_idx, sender_first_occurences};
+}
+
+std::vector<torch::Tensor>
+jit_sort_edges_by_receiver(torch::Tensor edge_index,
+                           std::vector<torch::Tensor> edge_data,
+                           const int64_t nnodes, const bool validate) {
+
+    TORCH_CHECK(edge_index.dim() == 2 && edge_index.size(0) == 2,
+                "edge_index must be [2, nedges]");
+
+    const int64_t nedges = edge_index.size(1);
+
+    TORCH_CHECK(nedges < INT32_MAX && nnodes < INT32_MAX,
+                "number of edges and nodes must fit in int32");
+
+    torch::Tensor receiver = edge_index[0];
+
+    if (validate && nedges > 0) {
+      TORCH_CHECK(edge_index.min().item<int64_t>() >= 0 &&
+                      edge_index.max().item<int64_t>() < nnodes,
+                  "edge_index contains nodes outside [0, ", nnodes, ")");
+    }
+
+    torch::Tensor permutation = torch::argsort(receiver, /*stable=*/true);
+
+    torch::Tensor offsets = workspace_empty(
+        {nnodes + 1}, torch::TensorOptions()
+                          .dtype(torch::kInt32)
+                          .device(edge_index.device()));
+    offsets.narrow(0, 0, 1).zero_();
+    offsets.narrow(0, 1, nnodes)
+        .copy_(torch::cumsum(torch::bincount(receiver, {}, nnodes), 0));
+
+    std::vector<torch::Tensor> result = {
+        edge_index.index_select(1, permutation).to(torch::kInt32), offsets,
+        permutation};
+
+    for (torch::Tensor &data : edge_data) {
+      TORCH_CHECK(data.dim() >= 1 && data.size(0) == nedges,
+                  "edge data must have nedges rows");
+      result.push_back(data.index_select(0, permutation));
+    }
+
+  return result;
+}
+
 std::vector<torch::Tensor>
 jit_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
             torch::Tensor sender_list, torch::Tensor receiver_list,
@@ -88,13 +163,9 @@ jit_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radi
               "number of edge spherical harmonics must be 16");
   TORCH_CHECK(nfeatures <= 128, "feature dimension cannot be greater than 128");
 
-  torch::Tensor node_edge_index = torch::empty(
-      {nnodes, nnodes},
-      torch::TensorOptions().dtype(torch::kInt32).device(X.device()));
-
   torch::Tensor output =
-      torch::empty({nnodes, nspherical_harm, nfeatures},
-                   torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+      workspace_empty({nnodes, nspherical_harm, nfeatures},
+                      torch::TensorOptions().dtype(X.dtype()).device(X.device()));
 
   dim3 gdim(nnodes);
   dim3 bdim(NWARPS_PER_BLOCK * WARP_SIZE, 1, 1);
@@ -112,7 +183,6 @@ jit_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radi
         int * _sender_list  = sender_list.data_ptr<int> ();
         int * _receiver_list  = receiver_list.data_ptr<int>();
         int * _first_occurences  = first_occurences.data_ptr<int>();
-        int * _node_edge_index  = node_edge_index.data_ptr<int>();
         scalar_t * _output  = output.data_ptr<scalar_t>();
 
         int _nedges = Y.size(1);
@@ -126,7 +196,6 @@ jit_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radi
         &_sender_list,
         &_receiver_list,
         &_first_occurences,
-        &_node_edge_index,
         &_nedges,
         &_nchannels,
         &_nnodes,
@@ -151,14 +220,15 @@ jit_forward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radi
 
         }));
 
-  return {output, node_edge_index};
+  return {output};
 }
 
 std::vector<torch::Tensor>
 jit_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor radial,
              torch::Tensor grad_in, torch::Tensor sender_list,
              torch::Tensor receiver_list, torch::Tensor first_occurences,
-             torch::Tensor node_edge_index, const int64_t nnodes) {
+             torch::Tensor sender_sort_idx,
+             torch::Tensor sender_first_occurences, const int64_t nnodes) {
 
     static const char* CUDA_CODE =
         #include "generated/wrapped_invariant_message_passing_impl.cu"
@@ -176,15 +246,15 @@ jit_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor rad
               "radial must require grad for invariant message passing "
               "backwards_kernel to be called.");
 
-  torch::Tensor gradRadial = torch::empty_like(
-      radial,
+  torch::Tensor gradRadial = workspace_empty(
+      radial.sizes(),
       torch::TensorOptions().dtype(radial.dtype()).device(radial.device()));
 
-  torch::Tensor gradX = torch::empty_like(
-      X, torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+  torch::Tensor gradX = workspace_empty(
+      X.sizes(), torch::TensorOptions().dtype(X.dtype()).device(X.device()));
 
-  torch::Tensor gradY = torch::empty_like(
-      Y, torch::TensorOptions().dtype(Y.dtype()).device(Y.device()));
+  torch::Tensor gradY = workspace_empty(
+      Y.sizes(), torch::TensorOptions().dtype(Y.dtype()).device(Y.device()));
 
   AT_DISPATCH_FLOATING_TYPES(
       X.scalar_type(), "backward_gpu", ([&] {
@@ -203,7 +273,6 @@ jit_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor rad
 
         shared_array<scalar_t>(NWARPS_PER_BLOCK * WARP_SIZE, sptr_node,
                                &space_node);
-        shared_array<int>(512 * 2, sptr_node, &space_node);
 
         scalar_t * _X  = X.data_ptr<scalar_t> ();
         scalar_t * _Y  = Y.data_ptr<scalar_t> ();
@@ -211,7 +280,8 @@ jit_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor rad
         int * _sender_list  = sender_list.data_ptr<int> ();
         int * _receiver_list  = receiver_list.data_ptr<int>();
         int * _first_occurences  = first_occurences.data_ptr<int>();
-        int * _node_edge_index  = node_edge_index.data_ptr<int>();
+        int * _sender_sort_idx  = sender_sort_idx.data_ptr<int>();
+        int * _sender_first_occurences  = sender_first_occurences.data_ptr<int>();
         scalar_t * _grad_in  = grad_in.data_ptr<scalar_t>();
         scalar_t * _gradY  = gradY.data_ptr<scalar_t>();
         scalar_t * _gradX  = gradX.data_ptr<scalar_t>();
@@ -240,8 +310,8 @@ jit_backward_message_passing(torch::Tensor X, torch::Tensor Y, torch::Tensor rad
         &_grad_in,
         &_sender_list,
         &_receiver_list,
-        &_first_occurences,
-        &_node_edge_index,
+        &_sender_sort_idx,
+        &_sender_first_occurences,
         &_nedges,
         &_nchannels,
         &_nnodes,
@@ -1,6 +1,7 @@
 #include "linear_wrapper.hpp"
 #include "cuda_cache.hpp"
 #include "cuda_utils.hpp"
+#include "workspace.h"
 #include <iostream>
 
 using namespace c10;
@@ -31,7 +32,7 @@ torch::Tensor jit_linear(torch::Tensor X, torch::Tensor W) {
     int K = W.size(1);
 
     torch::Tensor output =
-    torch::empty({NNODES, M, N}, torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+    workspace_empty({NNODES, M, N}, torch::TensorOptions().dtype(X.dtype()).device(X.device()));
 
     auto kernel_name = [&]() -> std::string {
         if (N >= 128) return getKernelName<std::integral_constant<int, 8>>("linear_kernel_ptr");
@@ -107,7 +108,7 @@ torch::Tensor jit_elemental_linear(torch::Tensor X, torch::Tensor W,
     int K = W.size(2);
 
     torch::Tensor output =
-    torch::empty({NNODES, M, N}, torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+    workspace_empty({NNODES, M, N}, torch::TensorOptions().dtype(X.dtype()).device(X.device()));
 
     auto kernel_name = [&]() -> std::string {
         if (N >= 128) return getKernelName<std::integral_constant<int, 8>>("elemental_linear_kernel_ptr");
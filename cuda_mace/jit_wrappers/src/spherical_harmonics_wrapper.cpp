@@ -1,6 +1,7 @@
 #include "spherical_harmonics_wrapper.hpp"
 #include "cuda_cache.hpp"
 #include "cuda_utils.hpp"
+#include "workspace.h"
 
 using namespace c10;
 using namespace std;
@@ -20,12 +21,12 @@ std::vector<torch::Tensor> jit_spherical_harmonics(torch::Tensor xyz) {
 
  int _nsamples = xyz.size(0);
 
-  torch::Tensor sph_harmonics = torch::empty(
+  torch::Tensor sph_harmonics = workspace_empty(
       {16, _nsamples},
       torch::TensorOptions().dtype(xyz.dtype()).device(xyz.device()));
 
 
-  torch::Tensor sph_harmonics_deriv = torch::empty(
+  torch::Tensor sph_harmonics_deriv = workspace_empty(
       {16, 3, _nsamples},
       torch::TensorOptions().dtype(xyz.dtype()).device(xyz.device()));
 
@@ -92,7 +93,7 @@ torch::Tensor jit_spherical_harmonics_backward(torch::Tensor sph_deriv,
     int _nsamples = sph_deriv.size(2);
 
     torch::Tensor xyz_grad =
-      torch::empty({_nsamples, 3}, torch::TensorOptions()
+      workspace_empty({_nsamples, 3}, torch::TensorOptions()
                                       .dtype(sph_deriv.dtype())
                                       .device(sph_deriv.device()));
 
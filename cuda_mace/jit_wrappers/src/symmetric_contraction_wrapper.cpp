@@ -1,6 +1,7 @@
 #include "symmetric_contraction_wrapper.hpp"
 #include "cuda_cache.hpp"
 #include "cuda_utils.hpp"
+#include "workspace.h"
 #include <iostream>
 
 using namespace c10;
@@ -37,12 +38,12 @@ std::vector<torch::Tensor> jit_symmetric_contraction_forward(
         ;
   
   torch::Tensor output =
-      torch::empty({X.size(0), 1, X.size(2)},
-                   torch::TensorOptions().dtype(X.dtype()).device(X.device()));
+      workspace_empty({X.size(0), 1, X.size(2)},
+                      torch::TensorOptions().dtype(X.dtype()).device(X.device()));
   torch::Tensor grad;
 
   if (X.requires_grad()) {
-    grad = torch::empty(
+    grad = workspace_empty(
         {X.size(0), 1, X.size(1), X.size(2)},
         torch::TensorOptions().dtype(X.dtype()).device(X.device()));
   } else {
@@ -165,7 +166,7 @@ torch::Tensor jit_symmetric_contraction_backward(torch::Tensor gradX,
   int nnodes = gradX.size(0);
   int nchannels = gradX.size(3);
 
-  torch::Tensor output = torch::empty(
+  torch::Tensor output = workspace_empty(
       {nnodes, 16, nchannels},
       torch::TensorOptions().dtype(gradX.dtype()).device(gradX.device()));
 
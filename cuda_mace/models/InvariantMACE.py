@@ -1,69 +1,70 @@
-from typing import Any, Callable, Dict, List, Optional, Type, Union, Tuple
+from typing import Any, Dict, List, Optional, Union, Tuple
 from copy import deepcopy
-import ase
-import numpy as np
 import torch
-from mace.tools import torch_geometric
-from mace import data, tools
-from e3nn import o3, nn
-from mace import modules
-from time import time
-import inspect
 from math import sqrt
 
-from mace.tools.scatter import scatter_sum
+from cuda_mace.ops.invariant_message_passing import InvariantMessagePassingTP
+from cuda_mace.ops.linear import Linear, ElementalLinear
+from cuda_mace.ops.cubic_spline import MultiCubicSpline
+from cuda_mace.ops.spherical_harmonics import SphericalHarmonics
+from cuda_mace.ops.symmetric_contraction import SymmetricContraction as CUDAContraction
 
-from mace.modules.utils import (
+from .blocks import Readout, ScaleShift, SkipTensorProduct, linear_matmul
+from .graph_context import GraphContext, GraphContextBuilder
+from .precision import PrecisionPolicy
+from .utils import (
     get_edge_vectors_and_lengths,
     get_outputs,
     get_symmetric_displacement,
+    scatter_sum,
 )
 
-from mace.modules.blocks import NonLinearReadoutBlock
-
-from cuda_mace.ops.invariant_message_passing import InvariantMessagePassingTP
-from cuda_mace.ops.linear import Linear, ElementalLinear
-from cuda_mace.ops.cubic_spline import CubicSpline
-from cuda_mace.ops.symmetric_contraction import SymmetricContraction as CUDAContraction
+# e3nn and mace are only imported by the conversion functions, so converted models can be
+# loaded and run with torch alone, see cuda_mace.runtime.
 
 
-class SymmetricContractionWrapper(torch.nn.Module):
-    def __init__(self, symmetric_contractions):
+class InvariantProduct(torch.nn.Module):
+    def __init__(self, symmetric_contractions, linear, use_sc=True):
         super().__init__()
         self.symmetric_contractions = symmetric_contractions
+        self.linear = linear
+        self.use_sc = use_sc
 
-    def forward(self, x, y):
-        y = y.argmax(dim=-1).int()
-        out = self.symmetric_contractions(x, y).squeeze()
-        return out
+    def forward(self, node_feats, sc: Optional[torch.Tensor], graph: GraphContext):
+        node_feats = self.symmetric_contractions(
+            node_feats, graph.element_index).squeeze(1)
 
+        if self.use_sc and sc is not None:
+            return self.linear(node_feats) + sc
 
-class linear_matmul(torch.nn.Module):
-    def __init__(self, linear_e3nn):
-        super().__init__()
-        num_channels_in = linear_e3nn.__dict__["irreps_in"].num_irreps
-        num_channels_out = linear_e3nn.__dict__["irreps_out"].num_irreps
-        self.weights = (
+        return self.linear(node_feats)
+
+
+def linear_to_matmul(linear_e3nn, dtype=torch.float32):
+    num_channels_in = linear_e3nn.__dict__["irreps_in"].num_irreps
+    num_channels_out = linear_e3nn.__dict__["irreps_out"].num_irreps
+    return linear_matmul(
+        (
             linear_e3nn.weight.data.reshape(num_channels_in, num_channels_out)
             / num_channels_in**0.5
-        )
-
-    def forward(self, x):
-        self.weights = self.weights.to(x.device)
-        return torch.matmul(x, self.weights)
+        ).to(dtype)
+    )
 
 
-def linear_to_cuda(linear):
+def linear_to_cuda(linear, dtype=torch.float32):
     return Linear(
         linear.__dict__["irreps_in"],
         linear.__dict__["irreps_out"],
         linear.instructions,
         linear.weight,
+        dtype=dtype,
+        device=linear.weight.device,
     )
 
 
-def element_linear_to_cuda(skip_tp):
-    # print("elementlinear", skip_tp)
+def element_linear_to_cuda(skip_tp, dtype=torch.float32):
+    from e3nn import o3
+
     num_elements = skip_tp.__dict__["irreps_in2"].dim
     n_channels = skip_tp.__dict__["irreps_in1"][0].dim
     lmax = skip_tp.__dict__["irreps_in1"].lmax
@@ -80,33 +81,125 @@ def element_linear_to_cuda(skip_tp):
         linear_instructions.instructions,
         ws,
         num_elements,
+        dtype=dtype,
+        device=skip_tp.weight.device,
+    )
+
+
+def skip_tp_to_matmul(skip_tp, dtype=torch.float32):
+    num_channels = skip_tp.__dict__["irreps_in1"].dim
+    num_elements = skip_tp.__dict__["irreps_in2"].dim
+    assert skip_tp.__dict__["irreps_in1"].lmax == 0, "skip_tp must act on scalar features."
+
+    # the tensor product is bilinear, so its weights are the outputs on all pairs of
+    # basis vectors, ordered as (channel, element).
+    x = torch.eye(num_channels, dtype=skip_tp.weight.dtype, device=skip_tp.weight.device)
+    y = torch.eye(num_elements, dtype=skip_tp.weight.dtype, device=skip_tp.weight.device)
+    with torch.no_grad():
+        weights = skip_tp(
+            x.repeat_interleave(num_elements, dim=0), y.repeat(num_channels, 1)
+        )
+
+    return SkipTensorProduct(weights.to(dtype), num_elements)
+
+
+def readout_to_matmul(readout, dtype=torch.float32):
+    if not hasattr(readout, "linear_2"):
+        return Readout(linear_to_matmul(readout.linear, dtype).weights)
+
+    assert type(readout).__name__ == "NonLinearReadoutBlock", (
+        "unsupported readout %s" % type(readout).__name__)
+
+    # e3nn wraps the gate in normalize2mom, which rescales it unless the scale is ~1.
+    act = readout.non_linearity.acts[0]
+    gate = getattr(act, "f", act)
+    scale = act.cst if not getattr(act, "_is_id", True) else 1.0
+
+    return Readout(
+        linear_to_matmul(readout.linear_1, dtype).weights,
+        linear_to_matmul(readout.linear_2, dtype).weights,
+        activation=gate.__name__,
+        activation_scale=scale,
+        num_heads=getattr(readout, "num_heads", 1),
+    )
+
+
+def interaction_to_cuda(interaction, dtype=torch.float32):
+    linear_up = linear_to_matmul(deepcopy(interaction.linear_up).to(dtype), dtype)
+    linear = linear_to_cuda(deepcopy(interaction.linear).to(dtype), dtype)
+
+    if "Residual" in type(interaction).__name__:
+        return InvariantResidualInteraction(
+            linear_up,
+            linear,
+            skip_tp_to_matmul(interaction.skip_tp, dtype),
+            interaction.avg_num_neighbors,
+        )
+
+    return InvariantInteraction(
+        linear_up,
+        linear,
+        element_linear_to_cuda(deepcopy(interaction.skip_tp).to(dtype), dtype),
+        interaction.avg_num_neighbors,
+    )
+
+
+def product_to_cuda(product, dtype=torch.float32):
+    from e3nn import o3
+
+    symm_contract = product.symmetric_contractions
+    all_weights = {}
+    for j in range(len(symm_contract.contractions)):
+        all_weights[str(j)] = {}
+        all_weights[str(j)][3] = (
+            symm_contract.contractions[j].weights_max.detach(
+            ).clone().type(dtype)
+        )
+        all_weights[str(j)][2] = (
+            symm_contract.contractions[j].weights[0].detach(
+            ).clone().type(dtype)
+        )
+        all_weights[str(j)][1] = (
+            symm_contract.contractions[j].weights[1].detach(
+            ).clone().type(dtype)
+        )
+
+    irreps_in = o3.Irreps(symm_contract.irreps_in)
+    coupling_irreps = o3.Irreps([irrep.ir for irrep in irreps_in])
+    irreps_out = o3.Irreps(symm_contract.irreps_out)
+
+    symmetric_contractions = CUDAContraction(
+        coupling_irreps,
+        irreps_out,
+        all_weights,
+        device=symm_contract.contractions[0].weights_max.device,
+        dtype=dtype,
+    )
+
+    return InvariantProduct(
+        symmetric_contractions,
+        linear_to_matmul(deepcopy(product.linear).to(dtype), dtype),
+        product.use_sc,
     )
 
 
 class InvariantInteraction(torch.nn.Module):
 
-    def __init__(self, mace_model):
+    def __init__(self, linear_up, linear, skip_tp, avg_num_neighbors: float):
         super().__init__()
-        self.linear_up = linear_matmul(
-            mace_model.interactions[0].linear_up.float())
-        self.linear = linear_to_cuda(mace_model.interactions[0].linear.float())
+        self.linear_up = linear_up
+        self.linear = linear
         self.tp = InvariantMessagePassingTP()
-        self.skip_tp = element_linear_to_cuda(
-            mace_model.interactions[0].skip_tp.float())
-        self.avg_num_neighbors = mace_model.interactions[0].avg_num_neighbors
+        self.skip_tp = skip_tp
+        self.avg_num_neighbors = float(avg_num_neighbors)
 
     def forward(
         self,
-        node_attrs: torch.Tensor,
         node_feats: torch.Tensor,
         edge_attrs: torch.Tensor,
         edge_feats: torch.Tensor,
-        edge_index: torch.Tensor,
-    ) -> Tuple[torch.Tensor, None]:
-
-        sender = edge_index[1]
-        receiver = edge_index[0]
-        num_nodes = torch.tensor(node_feats.shape[0])
+        graph: GraphContext,
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
 
         node_feats = self.linear_up(node_feats)
 
@@ -114,14 +207,16 @@ class InvariantInteraction(torch.nn.Module):
             node_feats,
             edge_attrs,
             edge_feats.view(edge_feats.shape[0], -1, node_feats.shape[-1]),
-            sender.int(),
-            receiver.int(),
-            num_nodes,
+            graph.sender,
+            graph.receiver,
+            graph.num_nodes,
+            graph.first_occurences,
+            graph.sender_ordering,
         )
 
         message = self.linear(message) / self.avg_num_neighbors
 
-        message = self.skip_tp(message, node_attrs)
+        message = self.skip_tp(message, graph.node_attrs)
 
         return (
             message,
@@ -131,38 +226,33 @@ class InvariantInteraction(torch.nn.Module):
 
 class InvariantResidualInteraction(torch.nn.Module):
 
-    def __init__(self, mace_model):
+    def __init__(self, linear_up, linear, skip_tp, avg_num_neighbors: float):
         super().__init__()
-
-        self.linear_up = linear_matmul(
-            mace_model.interactions[1].linear_up.float())
-        self.linear = linear_to_cuda(mace_model.interactions[1].linear.float())
+        self.linear_up = linear_up
+        self.linear = linear
         self.tp = InvariantMessagePassingTP()
-        self.skip_tp = mace_model.interactions[1].skip_tp.float()
-        self.avg_num_neighbors = mace_model.interactions[1].avg_num_neighbors
+        self.skip_tp = skip_tp
+        self.avg_num_neighbors = float(avg_num_neighbors)
 
     def forward(
         self,
-        node_attrs: torch.Tensor,
         node_feats: torch.Tensor,
         edge_attrs: torch.Tensor,
         edge_feats: torch.Tensor,
-        edge_index: torch.Tensor,
-    ) -> Tuple[torch.Tensor, torch.Tensor]:
-
-        sender = edge_index[1]
-        receiver = edge_index[0]
-        num_nodes = torch.tensor(node_feats.shape[0])
+        graph: GraphContext,
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
 
-        sc = self.skip_tp(node_feats, node_attrs)
+        sc = self.skip_tp(node_feats, graph.node_attrs)
         node_feats = self.linear_up(node_feats)
         message = self.tp.forward(
             node_feats,
             edge_attrs,
             edge_feats.view(edge_feats.shape[0], -1, node_feats.shape[-1]),
-            sender.int(),
-            receiver.int(),
-            num_nodes,
+            graph.sender,
+            graph.receiver,
+            graph.num_nodes,
+            graph.first_occurences,
+            graph.sender_ordering,
         )
 
         message = self.linear(message) / self.avg_num_neighbors
@@ -173,181 +263,297 @@ class InvariantResidualInteraction(torch.nn.Module):
         )
 
 
+def _prefixed(tensors: Dict[str, torch.Tensor], prefix: str) -> Dict[str, torch.Tensor]:
+    return {
+        name[len(prefix) + 1:]: tensor
+        for name, tensor in tensors.items()
+        if name.startswith(prefix + ".")
+    }
+
+
 class OptimizedInvariantMACE(torch.nn.Module):
     def __init__(
         self,
-        mace_model: torch.nn.Module
+        mace_model: torch.nn.Module,
+        precision: Union[str, PrecisionPolicy] = "mixed",
+        spline_tolerance: float = 1e-6,
     ):
+        """
+        precision selects the PrecisionPolicy ("fp32", "mixed" or "fp64", see
+        cuda_mace.models.precision). All parameters are converted to it here, so that the
+        forward pass only casts its inputs.
+
+        spline_tolerance is the maximum error of the tabulated radial weights, relative to
+        their largest value, which sets the number of spline knots.
+
+        Only the tensors consumed by the kernels are kept, the original model is not
+        referenced after conversion.
+        """
         super().__init__()
-        self.register_buffer(
-            "atomic_numbers", deepcopy(mace_model.atomic_numbers)
-        )
-        self.register_buffer(
-            "r_max", deepcopy(mace_model.r_max)
-        )
-        self.register_buffer(
-            "num_interactions", deepcopy(mace_model.num_interactions)
-        )
 
-        self.node_embedding = deepcopy(mace_model.node_embedding)
-        self.radial_embedding = deepcopy(mace_model.radial_embedding)
+        precision = PrecisionPolicy.from_name(precision)
+        dtype = precision.compute_dtype
 
-        self.spherical_harmonics = torch.classes.spherical_harmonics.SphericalHarmonics()
+        # the radial basis and MLPs are only needed to tabulate the splines.
+        radial_embedding = deepcopy(mace_model.radial_embedding)
+        conv_tp_weights = [interaction.conv_tp_weights for interaction in mace_model.interactions]
 
-        # Interactions and readout
-        self.atomic_energies_fn = deepcopy(mace_model.atomic_energies_fn)
-
-        self.interactions = torch.nn.ModuleList([InvariantInteraction(
-            mace_model), InvariantResidualInteraction(mace_model)])
-        self.products = deepcopy(mace_model.products)
-
-        self.readouts = mace_model.readouts.to(torch.float64)
-
-        for i in range(mace_model.num_interactions):
-            symm_contract = mace_model.products[i].symmetric_contractions
-            all_weights = {}
-            for j in range(len(symm_contract.contractions)):
-                all_weights[str(j)] = {}
-                all_weights[str(j)][3] = (
-                    symm_contract.contractions[j].weights_max.detach(
-                    ).clone().type(torch.float32)
-                )
-                all_weights[str(j)][2] = (
-                    symm_contract.contractions[j].weights[0].detach(
-                    ).clone().type(torch.float32)
-                )
-                all_weights[str(j)][1] = (
-                    symm_contract.contractions[j].weights[1].detach(
-                    ).clone().type(torch.float32)
-                )
-
-            irreps_in = o3.Irreps(
-                mace_model.products[i].symmetric_contractions.irreps_in)
-            coupling_irreps = o3.Irreps([irrep.ir for irrep in irreps_in])
-            irreps_out = o3.Irreps(
-                mace_model.products[i].symmetric_contractions.irreps_out)
-
-            symmetric_contractions = CUDAContraction(
-                coupling_irreps,
-                irreps_out,
-                all_weights,
-                dtype=torch.float32,
-            )
-            self.products[i].symmetric_contractions = SymmetricContractionWrapper(
-                symmetric_contractions
-            )
-            self.products[i].linear = linear_matmul(
-                deepcopy(mace_model.products[i].linear.float()))
+        def radial_weights(r):
+            bessel_j = radial_embedding(r.unsqueeze(-1), None, None, None)
 
-        r, h = np.linspace(1e-12, self.r_max.item() + 1.0, 256, retstep=True)
-        r = torch.tensor(r, dtype=torch.float64).to("cuda")
-        bessel_j = self.radial_embedding(r.unsqueeze(-1), None, None, None)
+            # newer versions of mace return the cutoff separately, applied to the tp weights.
+            cutoff = None
+            if isinstance(bessel_j, tuple):
+                bessel_j, cutoff = bessel_j
 
-        edge_splines = []
-        for i, interaction in enumerate(mace_model.interactions):
-            R = interaction.conv_tp_weights(bessel_j)
-            spline = CubicSpline(
-                r.cuda().float(), R.cuda().float(), h, self.r_max.item())
-            edge_splines.append(spline)
+            R = torch.stack([weights(bessel_j) for weights in conv_tp_weights])
+            if cutoff is not None:
+                R = R * cutoff
 
-        self.edge_splines = torch.nn.ModuleList(edge_splines)
+            return R.detach()  # [num_interactions, nknots, noutputs]
 
-        self.scale_shift = deepcopy(mace_model.scale_shift.double())
+        # the radial weights of all interactions are tabulated on the same knots, whose number
+        # is chosen to reach spline_tolerance.
+        radial_spline = MultiCubicSpline.fit(
+            radial_weights,
+            mace_model.r_max.item(),
+            tolerance=spline_tolerance,
+            dtype=dtype,
+            device=mace_model.r_max.device,
+        )
 
-        self.orig_model = mace_model
+        atomic_energies = torch.atleast_2d(
+            mace_model.atomic_energies_fn.atomic_energies.detach()).T  # [nelements, nheads]
+
+        self._setup(
+            precision,
+            atomic_numbers=deepcopy(mace_model.atomic_numbers),
+            r_max=deepcopy(mace_model.r_max),
+            node_embedding=linear_to_matmul(mace_model.node_embedding.linear, dtype),
+            atomic_energies_fn=linear_matmul(
+                atomic_energies.to(precision.energy_dtype).contiguous()),
+            interactions=[
+                interaction_to_cuda(interaction, dtype)
+                for interaction in mace_model.interactions
+            ],
+            products=[product_to_cuda(product, dtype) for product in mace_model.products],
+            readouts=[readout_to_matmul(readout, dtype) for readout in mace_model.readouts],
+            radial_spline=radial_spline,
+            scale_shift=ScaleShift(
+                mace_model.scale_shift.scale.detach().to(precision.energy_dtype),
+                mace_model.scale_shift.shift.detach().to(precision.energy_dtype),
+            ),
+        )
 
-    def forward(
+    def _setup(
         self,
-        data: Dict[str, torch.Tensor],
-        training: bool = False,
-        compute_force: bool = True,
-        compute_virials: bool = False,
-        compute_stress: bool = False,
-        compute_displacement: bool = False,
-    ) -> Dict[str, Optional[torch.Tensor]]:
-        # Setup
-        data["positions"].requires_grad_(True)
-        data["node_attrs"].requires_grad_(True)
+        precision: PrecisionPolicy,
+        atomic_numbers: torch.Tensor,
+        r_max: torch.Tensor,
+        node_embedding: torch.nn.Module,
+        atomic_energies_fn: torch.nn.Module,
+        interactions: List[torch.nn.Module],
+        products: List[torch.nn.Module],
+        readouts: List[torch.nn.Module],
+        radial_spline: MultiCubicSpline,
+        scale_shift: torch.nn.Module,
+    ):
+        self.precision = precision
+        self.compute_dtype = precision.compute_dtype
+        self.energy_dtype = precision.energy_dtype
 
-        node_heads = (
-            data["head"][data["batch"]]
-            if "head" in data
-            else torch.zeros_like(data["batch"])
+        self.register_buffer("atomic_numbers", atomic_numbers)
+        self.register_buffer("r_max", r_max)
+        self.register_buffer(
+            "num_interactions", torch.tensor(len(interactions), device=r_max.device)
         )
 
-        num_atoms_arange = torch.arange(data["positions"].shape[0])
-        num_graphs = data["ptr"].numel() - 1
+        self.node_embedding = node_embedding
 
-        displacement = torch.zeros(
-            (num_graphs, 3, 3),
-            dtype=data["positions"].dtype,
-            device=data["positions"].device,
+        self.graph = GraphContextBuilder(self.compute_dtype)
+        self.spherical_harmonics = SphericalHarmonics()
+
+        # Interactions and readout
+        self.atomic_energies_fn = atomic_energies_fn
+        self.interactions = torch.nn.ModuleList(interactions)
+        self.products = torch.nn.ModuleList(products)
+        self.readouts = torch.nn.ModuleList(readouts)
+
+        self.radial_spline = radial_spline
+        self.scale_shift = scale_shift
+
+    def metadata(self) -> Dict[str, Any]:
+        """
+        Everything besides the state dict needed to rebuild the model with from_tensors, as
+        plain python types.
+        """
+        return {
+            "precision": {
+                "name": self.precision.name,
+                "compute_dtype": str(self.compute_dtype).split(".")[-1],
+                "energy_dtype": str(self.energy_dtype).split(".")[-1],
+            },
+            "interactions": [
+                {
+                    "type": type(interaction).__name__,
+                    "avg_num_neighbors": interaction.avg_num_neighbors,
+                }
+                for interaction in self.interactions
+            ],
+            "products": [{"use_sc": bool(product.use_sc)} for product in self.products],
+            "readouts": [
+                {
+                    "activation": readout.activation,
+                    "activation_scale": readout.activation_scale,
+                    "num_heads": readout.num_heads,
+                }
+                for readout in self.readouts
+            ],
+            "radial_spline": {
+                "h": self.radial_spline.h,
+                "rmax": self.radial_spline.rmax,
+                "max_error": self.radial_spline.max_error,
+            },
+        }
+
+    @classmethod
+    def from_tensors(
+        cls, metadata: Dict[str, Any], tensors: Dict[str, torch.Tensor]
+    ) -> "OptimizedInvariantMACE":
+        """
+        Rebuilds a converted model from its metadata() and state dict, without the original
+        MACE model. The tensors are used as given, so they should already be on the target
+        device.
+        """
+        model = cls.__new__(cls)
+        torch.nn.Module.__init__(model)
+
+        precision = PrecisionPolicy(
+            getattr(torch, metadata["precision"]["compute_dtype"]),
+            getattr(torch, metadata["precision"]["energy_dtype"]),
+            name=metadata["precision"]["name"],
         )
-        if compute_virials or compute_stress or compute_displacement:
-            (
-                data["positions"],
-                data["shifts"],
-                displacement,
-            ) = get_symmetric_displacement(
-                positions=data["positions"],
-                unit_shifts=data["unit_shifts"],
-                cell=data["cell"],
-                edge_index=data["edge_index"],
-                num_graphs=num_graphs,
-                batch=data["batch"],
+
+        num_elements = tensors["atomic_numbers"].shape[0]
+
+        interactions = []
+        for i, config in enumerate(metadata["interactions"]):
+            prefix = "interactions.%d" % i
+            if config["type"] == "InvariantResidualInteraction":
+                skip_tp = SkipTensorProduct(tensors[prefix + ".skip_tp.weights"], num_elements)
+                interaction_cls = InvariantResidualInteraction
+            else:
+                skip_tp = ElementalLinear.from_weights(tensors[prefix + ".skip_tp.weights"])
+                interaction_cls = InvariantInteraction
+
+            interactions.append(interaction_cls(
+                linear_matmul(tensors[prefix + ".linear_up.weights"]),
+                Linear.from_weights(tensors[prefix + ".linear.weights"]),
+                skip_tp,
+                config["avg_num_neighbors"],
+            ))
+
+        products = [
+            InvariantProduct(
+                CUDAContraction.from_buffers(
+                    _prefixed(tensors, "products.%d.symmetric_contractions" % i)),
+                linear_matmul(tensors["products.%d.linear.weights" % i]),
+                config["use_sc"],
             )
+            for i, config in enumerate(metadata["products"])
+        ]
+
+        readouts = [
+            Readout(
+                tensors["readouts.%d.weights_1" % i],
+                tensors.get("readouts.%d.weights_2" % i),
+                activation=config["activation"],
+                activation_scale=config["activation_scale"],
+                num_heads=config["num_heads"],
+            )
+            for i, config in enumerate(metadata["readouts"])
+        ]
 
-        node_e0 = self.atomic_energies_fn(data["node_attrs"].double())[
+        model._setup(
+            precision,
+            atomic_numbers=tensors["atomic_numbers"],
+            r_max=tensors["r_max"],
+            node_embedding=linear_matmul(tensors["node_embedding.weights"]),
+            atomic_energies_fn=linear_matmul(tensors["atomic_energies_fn.weights"]),
+            interactions=interactions,
+            products=products,
+            readouts=readouts,
+            radial_spline=MultiCubicSpline.from_coefficients(
+                tensors["radial_spline.r_knots"],
+                tensors["radial_spline.coefficients"],
+                **metadata["radial_spline"],
+            ),
+            scale_shift=ScaleShift(tensors["scale_shift.scale"], tensors["scale_shift.shift"]),
+        )
+
+        return model
+
+    def _energies(
+        self,
+        data: Dict[str, torch.Tensor],
+        positions: torch.Tensor,
+        shifts: torch.Tensor,
+        node_heads: torch.Tensor,
+        num_graphs: int,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        num_atoms_arange = torch.arange(positions.shape[0], device=positions.device)
+
+        node_e0 = self.atomic_energies_fn(data["node_attrs"].to(self.energy_dtype))[
             num_atoms_arange, node_heads
         ]
 
         e0 = scatter_sum(
-            src=node_e0, index=data["batch"], dim=0, dim_size=num_graphs
+            src=node_e0, index=data["batch"], dim_size=num_graphs
         )  # [n_graphs, num_heads]
 
-        node_feats = self.node_embedding(data["node_attrs"].double())
+        # int32 edges, CSR offsets, element indices and node_attrs in the compute dtype,
+        # shared by all interactions. The blocks then stay in the compute dtype.
+        graph = self.graph(data)
+
+        node_feats = self.node_embedding(graph.node_attrs)
 
         vectors, lengths = get_edge_vectors_and_lengths(
-            positions=data["positions"],
+            positions=positions,
             edge_index=data["edge_index"],
-            shifts=data["shifts"],
+            shifts=shifts,
         )
 
-        if (vectors.dtype == torch.float64):
-            vectors = vectors.float()
+        vectors = vectors.to(self.compute_dtype)
+        lengths = lengths.squeeze(-1).to(self.compute_dtype)
 
-        edge_attrs = self.spherical_harmonics.forward(vectors)
+        edge_attrs = self.spherical_harmonics(vectors)
 
         node_es_list = []
         node_feats_list = []
-        for j, (interaction, product, readout, edge_spline) in enumerate(zip(
-            self.interactions, self.products, self.readouts, self.edge_splines)
-        ):
-
-            if (len(lengths.shape) == 2):
-                lengths = lengths.squeeze(-1)
+        # [num_interactions, nedges, noutputs], evaluated for all interactions in one pass
+        edge_feats_all = self.radial_spline(lengths)
 
-            if (lengths.dtype!= torch.float64):
-                lengths = lengths.double()
+        for j, (interaction, product, readout) in enumerate(zip(
+            self.interactions, self.products, self.readouts)
+        ):
 
-            edge_feats = edge_spline.forward(lengths.float())
+            edge_feats = edge_feats_all[j]
 
             node_feats, sc = interaction(
-                node_attrs=data["node_attrs"].float(),
-                node_feats=node_feats.float(),
-                edge_attrs=edge_attrs.float(),
+                node_feats=node_feats,
+                edge_attrs=edge_attrs,
                 edge_feats=edge_feats,
-                edge_index=data["edge_index"],
+                graph=graph,
             )
 
-            node_feats = product(node_feats=node_feats, sc=sc, node_attrs=data["node_attrs"].float()
-                                 ).double()
+            node_feats = product(node_feats=node_feats, sc=sc, graph=graph)
 
 
             node_feats_list.append(node_feats)
             # node_energies = readout(node_feats).squeeze(-1)  # [n_nodes, ]
             node_es_list.append(
-                readout(node_feats, node_heads)[num_atoms_arange, node_heads]
+                readout(node_feats, node_heads)[
+                    num_atoms_arange, node_heads].to(self.energy_dtype)
             )
 
             # node_es_list.append(node_energies)
@@ -357,7 +563,7 @@ class OptimizedInvariantMACE(torch.nn.Module):
             node_es_list, dim=0), dim=0)  # [n_nodes, ]
         node_inter_es = self.scale_shift(node_inter_es, node_heads)
         inter_e = scatter_sum(
-            src=node_inter_es.double(), index=data["batch"], dim=-1, dim_size=num_graphs
+            src=node_inter_es, index=data["batch"], dim_size=num_graphs
         )  # [n_graphs,]
 
         # Outputs
@@ -365,17 +571,100 @@ class OptimizedInvariantMACE(torch.nn.Module):
 
         node_energy = node_e0 + node_inter_es
 
-        forces, virials, stress, hessian = get_outputs(
+        return total_energy, node_energy, inter_e, node_feats_out
+
+    def script(self) -> torch.jit.ScriptModule:
+        """
+        Returns a TorchScript version of the model, which can be frozen, saved with
+        torch.jit.save and loaded from C++ without Python.
+        """
+        return torch.jit.script(self)
+
+    def energy(
+        self,
+        data: Dict[str, torch.Tensor],
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Energy-only fast path for screening. Runs under torch.inference_mode without marking
+        any input as requiring grad, so the spline and spherical harmonics kernels skip their
+        derivatives, the ops save nothing for backward and autograd records no graph.
+        """
+        with torch.inference_mode():
+            node_heads = (
+                data["head"][data["batch"]]
+                if "head" in data
+                else torch.zeros_like(data["batch"])
+            )
+            num_graphs = data["ptr"].numel() - 1
+
+            total_energy, node_energy, inter_e, node_feats = self._energies(
+                data, data["positions"], data["shifts"], node_heads, num_graphs)
+
+        return {
+            "energy": total_energy,
+            "node_energy": node_energy,
+            "interaction_energy": inter_e,
+            "node_feats": node_feats,
+        }
+
+    def forward(
+        self,
+        data: Dict[str, torch.Tensor],
+        training: bool = False,
+        compute_force: bool = True,
+        compute_virials: bool = False,
+        compute_stress: bool = False,
+        compute_displacement: bool = False,
+    ) -> Dict[str, Optional[torch.Tensor]]:
+        # The input dict is never written to: the positions are differentiated through a
+        # local alias, and the displaced positions and shifts stay local.
+        positions = data["positions"]
+        shifts = data["shifts"]
+
+        if not positions.requires_grad:
+            positions = positions.detach().requires_grad_(True)
+
+        node_heads = (
+            data["head"][data["batch"]]
+            if "head" in data
+            else torch.zeros_like(data["batch"])
+        )
+
+        num_graphs = data["ptr"].numel() - 1
+
+        displacement = torch.zeros(
+            (num_graphs, 3, 3),
+            dtype=positions.dtype,
+            device=positions.device,
+        )
+        if compute_virials or compute_stress or compute_displacement:
+            (
+                positions,
+                shifts,
+                displacement,
+            ) = get_symmetric_displacement(
+                positions=positions,
+                unit_shifts=data["unit_shifts"],
+                cell=data["cell"],
+                edge_index=data["edge_index"],
+                num_graphs=num_graphs,
+                batch=data["batch"],
+            )
+
+        total_energy, node_energy, inter_e, node_feats_out = self._energies(
+            data, positions, shifts, node_heads, num_graphs)
+
+        forces, virials, stress = get_outputs(
             energy=inter_e,
-            positions=data["positions"],
+            positions=positions,
             displacement=displacement,
             cell=data["cell"],
             training=training,
             compute_force=compute_force,
             compute_virials=compute_virials,
             compute_stress=compute_stress,
-            compute_hessian=False,
         )
+        hessian: Optional[torch.Tensor] = None
 
         output = {
             "energy": total_energy,
@@ -1,3 +1,5 @@
 from .InvariantMACE import OptimizedInvariantMACE
+from .precision import PrecisionPolicy
+from .artifact import load_artifact, save_artifact
 
-__all__ = ['OptimizedInvariantMACE']
\ No newline at end of file
+__all__ = ['OptimizedInvariantMACE', 'PrecisionPolicy', 'load_artifact', 'save_artifact']
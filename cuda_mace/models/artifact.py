@@ -0,0 +1,67 @@
+from typing import Any, Dict, Union
+
+import os
+import torch
+
+from .InvariantMACE import OptimizedInvariantMACE
+
+ARTIFACT_FORMAT = "cuda_mace.OptimizedInvariantMACE"
+ARTIFACT_VERSION = 1
+
+
+def save_artifact(model: OptimizedInvariantMACE, path: Union[str, os.PathLike]):
+    """
+    Saves a converted model as a versioned artifact: a small metadata header and the
+    tensors consumed by the kernels (the state dict, without derived buffers such as the
+    transposed linear weights), all on the CPU.
+
+    The file is written with torch.save, so it can be loaded with weights_only=True and
+    memory mapped, see load_artifact. The original MACE model is not needed to load it.
+    """
+    torch.save(
+        {
+            "format": ARTIFACT_FORMAT,
+            "version": ARTIFACT_VERSION,
+            "metadata": model.metadata(),
+            "tensors": {
+                name: tensor.detach().cpu().contiguous()
+                for name, tensor in model.state_dict().items()
+            },
+        },
+        path,
+    )
+
+
+def read_artifact(path: Union[str, os.PathLike], mmap: bool = True) -> Dict[str, Any]:
+    """
+    Reads the header and tensors of an artifact without building the model. With mmap, the
+    tensors are views of the memory-mapped file and are only paged in when used.
+    """
+    artifact = torch.load(path, map_location="cpu", weights_only=True, mmap=mmap)
+
+    if not isinstance(artifact, dict) or artifact.get("format") != ARTIFACT_FORMAT:
+        raise ValueError("%s is not a cuda_mace model artifact" % path)
+
+    if artifact["version"] > ARTIFACT_VERSION:
+        raise ValueError(
+            "%s has artifact version %d, but this version of cuda_mace only reads versions <= %d"
+            % (path, artifact["version"], ARTIFACT_VERSION)
+        )
+
+    return artifact
+
+
+def load_artifact(
+    path: Union[str, os.PathLike],
+    device: Union[str, torch.device] = "cuda",
+    mmap: bool = True,
+) -> OptimizedInvariantMACE:
+    """
+    Rebuilds an OptimizedInvariantMACE from an artifact written by save_artifact. On the
+    CPU with mmap, the model buffers share memory with the mapped file.
+    """
+    artifact = read_artifact(path, mmap=mmap)
+
+    tensors = {name: tensor.to(device) for name, tensor in artifact["tensors"].items()}
+
+    return OptimizedInvariantMACE.from_tensors(artifact["metadata"], tensors)
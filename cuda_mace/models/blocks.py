@@ -0,0 +1,108 @@
+from typing import Optional
+
+import torch
+
+
+class linear_matmul(torch.nn.Module):
+    """
+    Linear map between scalar (0e) irreps as a single matmul, with the e3nn path
+    normalisation folded into the weights [in, out].
+    """
+
+    def __init__(self, weights: torch.Tensor):
+        super().__init__()
+        self.register_buffer("weights", weights)
+
+    def forward(self, x):
+        return torch.matmul(x, self.weights)
+
+
+class SkipTensorProduct(torch.nn.Module):
+    """
+    Fully connected tensor product between scalar node features [nnodes, nin] and node
+    attributes [nnodes, nelements], as the self-connection of the residual interaction.
+    The bilinear weights are stored as [nin * nelements, nout].
+    """
+
+    def __init__(self, weights: torch.Tensor, num_elements: int):
+        super().__init__()
+        self.num_elements = num_elements
+        self.register_buffer("weights", weights)
+
+    def forward(self, node_feats: torch.Tensor, node_attrs: torch.Tensor) -> torch.Tensor:
+        outer = node_feats.unsqueeze(-1) * node_attrs.unsqueeze(-2)
+        return torch.matmul(outer.flatten(1), self.weights)
+
+
+class Readout(torch.nn.Module):
+    """
+    Linear, or two-layer MLP, readout of the per-atom energies of each head.
+
+    weights_1: [nin, nhidden], or [nin, nheads] for a linear readout.
+    weights_2: [nhidden, nheads], None for a linear readout.
+    activation: name of the elementwise nonlinearity, scaled by activation_scale as in
+        e3nn's normalize2mom.
+    """
+
+    def __init__(
+        self,
+        weights_1: torch.Tensor,
+        weights_2: Optional[torch.Tensor] = None,
+        activation: str = "silu",
+        activation_scale: float = 1.0,
+        num_heads: int = 1,
+    ):
+        super().__init__()
+
+        if activation not in ("silu", "tanh", "sigmoid", "relu"):
+            raise ValueError("unsupported readout activation '%s'" % activation)
+
+        self.register_buffer("weights_1", weights_1)
+        self.register_buffer("weights_2", weights_2)
+        self.activation = activation
+        self.activation_scale = activation_scale
+        self.num_heads = num_heads
+
+    def _activation(self, x: torch.Tensor) -> torch.Tensor:
+        if self.activation == "silu":
+            x = torch.nn.functional.silu(x)
+        elif self.activation == "tanh":
+            x = torch.tanh(x)
+        elif self.activation == "sigmoid":
+            x = torch.sigmoid(x)
+        else:
+            x = torch.relu(x)
+
+        return x * self.activation_scale
+
+    def forward(self, x: torch.Tensor, heads: Optional[torch.Tensor] = None) -> torch.Tensor:
+        x = torch.matmul(x, self.weights_1)
+
+        weights_2 = self.weights_2
+        if weights_2 is None:
+            return x  # [nnodes, nheads]
+
+        x = self._activation(x)
+
+        if self.num_heads > 1 and heads is not None:
+            # each head only reads its own block of hidden channels.
+            channel_head = torch.arange(x.shape[1], device=x.device) // (
+                x.shape[1] // self.num_heads
+            )
+            x = x * (channel_head[None, :] == heads[:, None]).to(x.dtype)
+
+        return torch.matmul(x, weights_2)  # [nnodes, nheads]
+
+
+class ScaleShift(torch.nn.Module):
+    """
+    Per-head scale and shift of the per-atom interaction energies.
+    """
+
+    def __init__(self, scale: torch.Tensor, shift: torch.Tensor):
+        super().__init__()
+        self.register_buffer("scale", torch.atleast_1d(scale))
+        self.register_buffer("shift", torch.atleast_1d(shift))
+
+    def forward(self, x: torch.Tensor, head: torch.Tensor) -> torch.Tensor:
+        return self.scale[head] * x + self.shift[head]
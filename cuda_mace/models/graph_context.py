@@ -0,0 +1,65 @@
+from typing import Dict, List, NamedTuple
+
+import torch
+
+from cuda_mace.ops.invariant_message_passing import InvariantMessagePassingTP
+
+
+class GraphContext(NamedTuple):
+    """
+    Quantities which only depend on the graph and the atom types, computed once per forward
+    and shared by all interactions and products.
+    """
+
+    sender: torch.Tensor  # [nedges] int32
+    receiver: torch.Tensor  # [nedges] int32, sorted
+    first_occurences: torch.Tensor  # [2 * nnodes] int32, receiver offsets
+    # [nedges] permutation into sender order and [2 * nnodes] sender offsets, for the backward
+    # pass. Empty when gradients are not required.
+    sender_ordering: List[torch.Tensor]
+    node_attrs: torch.Tensor  # [nnodes, nelements] one-hot, in the compute dtype
+    element_index: torch.Tensor  # [nnodes] int32
+    num_nodes: int
+
+
+class GraphContextBuilder(torch.nn.Module):
+    """
+    Builds the GraphContext of a batch. If the batch contains "receiver_offsets" ([nnodes + 1]
+    CSR offsets, as returned by cuda_mace.neighbours.neighbour_list), they are used directly.
+    """
+
+    def __init__(self, dtype: torch.dtype = torch.float32):
+        super().__init__()
+        self.dtype = dtype
+        self.tp = InvariantMessagePassingTP()
+
+    def forward(self, data: Dict[str, torch.Tensor]) -> GraphContext:
+        edge_index = data["edge_index"]
+        num_nodes = data["node_attrs"].shape[0]
+
+        sender = edge_index[1].int()
+        receiver = edge_index[0].int()
+
+        if "receiver_offsets" in data:
+            offsets = data["receiver_offsets"].int()
+            first_occurences = torch.cat([offsets[:-1], offsets[1:]])
+        else:
+            first_occurences = self.tp.first_occurences(receiver, num_nodes)
+
+        if torch.is_grad_enabled():
+            sender_ordering = self.tp.sender_ordering(sender, num_nodes)
+        else:
+            empty = torch.empty(0, dtype=torch.int32, device=sender.device)
+            sender_ordering = [empty, empty]
+
+        node_attrs = data["node_attrs"].to(self.dtype)
+
+        return GraphContext(
+            sender=sender,
+            receiver=receiver,
+            first_occurences=first_occurences,
+            sender_ordering=sender_ordering,
+            node_attrs=node_attrs,
+            element_index=node_attrs.argmax(dim=-1).int(),
+            num_nodes=num_nodes,
+        )
@@ -0,0 +1,130 @@
+from copy import deepcopy
+from typing import Dict, List, Optional, Union
+
+import torch
+
+
+class PrecisionPolicy:
+    """
+    Floating point precision of an OptimizedInvariantMACE, fixed at conversion:
+
+        compute_dtype: embeddings, edge features, interactions, products and readouts.
+        energy_dtype: atomic energies, scale/shift and the accumulation of the per-atom
+            energies into the total energy.
+
+    Inputs are cast to these dtypes once per forward, so there are no round-trips between
+    the blocks. The Linear and ElementalLinear CUDA kernels only support float32, so float64
+    compute is only available where the other backends support it.
+    """
+
+    def __init__(
+        self,
+        compute_dtype: torch.dtype = torch.float32,
+        energy_dtype: torch.dtype = torch.float64,
+        name: Optional[str] = None,
+    ):
+        self.compute_dtype = compute_dtype
+        self.energy_dtype = energy_dtype
+        self.name = name if name is not None else "%s/%s" % (
+            str(compute_dtype).split(".")[-1],
+            str(energy_dtype).split(".")[-1],
+        )
+
+    @classmethod
+    def from_name(cls, name: Union[str, "PrecisionPolicy"]) -> "PrecisionPolicy":
+        if isinstance(name, PrecisionPolicy):
+            return name
+
+        if name not in PRECISION_POLICIES:
+            raise ValueError(
+                "unknown precision policy '%s', expected one of %s"
+                % (name, list(PRECISION_POLICIES.keys()))
+            )
+
+        return PRECISION_POLICIES[name]
+
+    def __repr__(self):
+        return "PrecisionPolicy(name=%s, compute_dtype=%s, energy_dtype=%s)" % (
+            self.name,
+            self.compute_dtype,
+            self.energy_dtype,
+        )
+
+
+PRECISION_POLICIES = {
+    # everything in float32.
+    "fp32": PrecisionPolicy(torch.float32, torch.float32, name="fp32"),
+    # float32 compute, per-atom energies accumulated in float64.
+    "mixed": PrecisionPolicy(torch.float32, torch.float64, name="mixed"),
+    # float64 throughout, as a reference for the other policies.
+    "fp64": PrecisionPolicy(torch.float64, torch.float64, name="fp64"),
+}
+
+
+def precision_report(
+    mace_model: torch.nn.Module,
+    data: Dict[str, torch.Tensor],
+    policies: List[Union[str, PrecisionPolicy]] = ("fp32", "mixed", "fp64"),
+) -> Dict[str, Dict[str, float]]:
+    """
+    Converts mace_model with each precision policy and returns, for each, the maximum
+    absolute energy error and the mean and maximum absolute force error against the float64
+    original model, evaluated on the same batch.
+
+    Policies which cannot be evaluated on the device of data (e.g fp64 with the float32-only
+    CUDA linear kernels) are reported with an "error" entry instead.
+    """
+    from .InvariantMACE import OptimizedInvariantMACE
+
+    reference_model = deepcopy(mace_model).to(torch.float64)
+
+    reference_data = {
+        k: v.detach().clone().to(torch.float64) if torch.is_floating_point(v) else v
+        for k, v in data.items()
+    }
+    reference = reference_model(reference_data, training=False, compute_force=True)
+
+    report = {}
+
+    for policy in policies:
+        policy = PrecisionPolicy.from_name(policy)
+
+        try:
+            model = OptimizedInvariantMACE(deepcopy(reference_model), precision=policy)
+            output = model(
+                {k: v.detach().clone() for k, v in reference_data.items()},
+                training=False,
+                compute_force=True,
+            )
+        except RuntimeError as e:
+            report[policy.name] = {"error": str(e).split("\n")[0]}
+            continue
+
+        energy_error = (output["energy"].double() - reference["energy"]).abs()
+        force_error = (output["forces"].double() - reference["forces"]).abs()
+
+        report[policy.name] = {
+            "energy_max_abs_error": energy_error.max().item(),
+            "forces_mean_abs_error": force_error.mean().item(),
+            "forces_max_abs_error": force_error.max().item(),
+        }
+
+    return report
+
+
+def print_precision_report(report: Dict[str, Dict[str, float]]):
+    print("%-10s %16s %16s %16s" % ("policy", "energy max", "forces mean", "forces max"))
+    for name, errors in report.items():
+        if "error" in errors:
+            print("%-10s unavailable: %s" % (name, errors["error"]))
+            continue
+
+        print(
+            "%-10s %16.3e %16.3e %16.3e"
+            % (
+                name,
+                errors["energy_max_abs_error"],
+                errors["forces_mean_abs_error"],
+                errors["forces_max_abs_error"],
+            )
+        )
@@ -0,0 +1,115 @@
+"""
+Torch-only versions of the mace.modules.utils and mace.tools.scatter helpers used in the
+forward pass, so that converted models run without mace installed.
+"""
+from typing import List, Optional, Tuple
+
+import torch
+
+
+def scatter_sum(src: torch.Tensor, index: torch.Tensor, dim_size: int) -> torch.Tensor:
+    """
+    Sums the rows of src [n, ...] into dim_size rows, row i going to index[i].
+    """
+    size = list(src.shape)
+    size[0] = dim_size
+    out = torch.zeros(size, dtype=src.dtype, device=src.device)
+    return out.index_add_(0, index, src)
+
+
+def get_edge_vectors_and_lengths(
+    positions: torch.Tensor,  # [n_nodes, 3]
+    edge_index: torch.Tensor,  # [2, n_edges]
+    shifts: torch.Tensor,  # [n_edges, 3]
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    sender = edge_index[0]
+    receiver = edge_index[1]
+    vectors = positions[receiver] - positions[sender] + shifts  # [n_edges, 3]
+    lengths = torch.linalg.norm(vectors, dim=-1, keepdim=True)  # [n_edges, 1]
+    return vectors, lengths
+
+
+def get_symmetric_displacement(
+    positions: torch.Tensor,
+    unit_shifts: torch.Tensor,
+    cell: torch.Tensor,
+    edge_index: torch.Tensor,
+    num_graphs: int,
+    batch: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Applies a symmetric strain, zero-valued but differentiable, to the positions and cells,
+    so that the virials are the gradients of the energy with respect to it.
+    """
+    sender = edge_index[0]
+    displacement = torch.zeros(
+        (num_graphs, 3, 3),
+        dtype=positions.dtype,
+        device=positions.device,
+    )
+    displacement = displacement + positions.sum() * 0.0
+    symmetric_displacement = 0.5 * (displacement + displacement.transpose(-1, -2))
+    positions = positions + torch.einsum(
+        "be,bec->bc", positions, symmetric_displacement[batch]
+    )
+    cell = cell.view(-1, 3, 3)
+    cell = cell + torch.matmul(cell, symmetric_displacement)
+    shifts = torch.einsum("be,bec->bc", unit_shifts, cell[batch[sender]])
+    return positions, shifts, displacement
+
+
+def get_outputs(
+    energy: torch.Tensor,
+    positions: torch.Tensor,
+    displacement: torch.Tensor,
+    cell: torch.Tensor,
+    training: bool = False,
+    compute_force: bool = True,
+    compute_virials: bool = False,
+    compute_stress: bool = False,
+) -> Tuple[Optional[torch.Tensor], Optional[torch.Tensor], Optional[torch.Tensor]]:
+    """
+    Forces, virials and stress as gradients of the energy, as in mace. Outputs which are
+    not requested are None.
+    """
+    grad_outputs: List[Optional[torch.Tensor]] = [torch.ones_like(energy)]
+
+    if compute_virials or compute_stress:
+        forces, virials = torch.autograd.grad(
+            outputs=[energy],
+            inputs=[positions, displacement],
+            grad_outputs=grad_outputs,
+            retain_graph=training,
+            create_graph=training,
+            allow_unused=True,
+        )
+
+        if forces is None:
+            forces = torch.zeros_like(positions)
+        if virials is None:
+            virials = torch.zeros_like(displacement)
+
+        stress = torch.zeros_like(displacement)
+        if compute_stress:
+            volume = torch.linalg.det(cell.view(-1, 3, 3)).abs().view(-1, 1, 1)
+            stress = virials / volume
+            stress = torch.where(torch.abs(stress) < 1e10, stress, torch.zeros_like(stress))
+
+        return -1 * forces, -1 * virials, stress
+
+    if compute_force:
+        forces = torch.autograd.grad(
+            outputs=[energy],
+            inputs=[positions],
+            grad_outputs=grad_outputs,
+            retain_graph=training,
+            create_graph=training,
+            allow_unused=True,
+        )[0]
+
+        if forces is None:
+            forces = torch.zeros_like(positions)
+
+        return -1 * forces, None, None
+
+    return None, None, None
@@ -0,0 +1,5 @@
+from .cell_list import neighbour_list
+from .verlet import VerletNeighbourList
+from .sort import EdgeSorter, sort_edges
+
+__all__ = ['neighbour_list', 'VerletNeighbourList', 'EdgeSorter', 'sort_edges']
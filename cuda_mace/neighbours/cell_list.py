@@ -0,0 +1,220 @@
+import itertools
+import math
+from typing import Dict, Optional, Sequence
+
+import torch
+
+
+def _complete_cell(cell: torch.Tensor, pbc: Sequence[bool]) -> torch.Tensor:
+    """
+    Returns a copy of cell whose non-periodic vectors are replaced by unit vectors
+    orthogonal to the periodic ones, so that the binning is well defined for molecules,
+    slabs and wires regardless of what the caller stored in those rows.
+    """
+    cell = cell.clone()
+    periodic = [d for d in range(3) if pbc[d]]
+    open_dims = [d for d in range(3) if not pbc[d]]
+
+    if len(periodic) == 0:
+        return torch.eye(3, dtype=cell.dtype, device=cell.device)
+
+    if len(periodic) == 1:
+        a = cell[periodic[0]]
+        e = torch.zeros_like(a)
+        e[torch.argmin(a.abs())] = 1.0
+        u = e - (e @ a) / (a @ a) * a
+        u = u / u.norm()
+        v = torch.linalg.cross(a, u)
+        cell[open_dims[0]] = u
+        cell[open_dims[1]] = v / v.norm()
+    elif len(periodic) == 2:
+        n = torch.linalg.cross(cell[periodic[0]], cell[periodic[1]])
+        cell[open_dims[0]] = n / n.norm()
+
+    if abs(torch.linalg.det(cell).item()) < 1e-12:
+        raise ValueError("periodic cell vectors must be linearly independent")
+
+    return cell
+
+
+def neighbour_list(
+    positions: torch.Tensor,
+    cutoff: float,
+    cell: Optional[torch.Tensor] = None,
+    pbc: Optional[Sequence[bool]] = None,
+    self_interaction: bool = False,
+    max_candidates: int = 1 << 22,
+) -> Dict[str, torch.Tensor]:
+    """
+    Cell-list neighbour search, linear in the number of atoms.
+
+    Returns a dict containing:
+
+        edge_index [2, nedges] (int32): (receiver, sender) pairs, i.e positions[edge_index[1]]
+            - positions[edge_index[0]] + shifts is the edge vector. Edges are emitted sorted by
+            edge_index[0] so they can be passed to the ops without sorting or casting.
+        shifts [nedges, 3]: cartesian periodic shifts, unit_shifts @ cell.
+        unit_shifts [nedges, 3]: integer image offsets, in the dtype of positions.
+        receiver_offsets [natoms + 1] (int32): CSR row offsets of each receiver in edge_index.
+
+    The edge set matches matscipy/ASE neighbour lists (as used by mace.data), including small
+    periodic cells where an atom interacts with several images of the same neighbour. Self
+    edges which do not cross a periodic boundary are removed unless self_interaction is set.
+
+    max_candidates bounds the number of candidate pairs held in memory at once.
+    """
+    device = positions.device
+    dtype = positions.dtype
+    natoms = positions.shape[0]
+
+    pbc = [bool(p) for p in pbc] if pbc is not None else [False, False, False]
+
+    if cell is None:
+        cell = torch.zeros(3, 3, dtype=dtype, device=device)
+
+    cell = torch.as_tensor(cell, dtype=dtype, device=device).view(3, 3)
+    full_cell = _complete_cell(cell, pbc)
+
+    periodic = torch.tensor(pbc, device=device)
+
+    # fractional coordinates, wrapped into [0, 1) along periodic directions.
+    frac = positions @ torch.linalg.inv(full_cell)
+    wrap = torch.where(periodic, torch.floor(frac), torch.zeros_like(frac))
+    frac = frac - wrap
+    wrapped_positions = frac @ full_cell
+
+    volume = abs(torch.linalg.det(full_cell).item())
+    face_distance = [
+        volume / torch.linalg.cross(full_cell[(d + 1) % 3], full_cell[(d + 2) % 3]).norm().item()
+        for d in range(3)
+    ]
+
+    if natoms > 0:
+        fmin = frac.min(dim=0).values.tolist()
+        fmax = frac.max(dim=0).values.tolist()
+    else:
+        fmin, fmax = [0.0] * 3, [0.0] * 3
+
+    origin = [0.0 if pbc[d] else fmin[d] for d in range(3)]
+    extent = [1.0 if pbc[d] else max(fmax[d] - fmin[d], 1e-12) for d in range(3)]
+
+    # bins at least cutoff wide, capped so sparse open systems do not allocate a huge grid.
+    nbins = [max(1, int(extent[d] * face_distance[d] / cutoff)) for d in range(3)]
+    max_bins = max(8 * natoms, 1)
+    while math.prod(nbins) > max_bins:
+        nbins = [max(1, n // 2) for n in nbins]
+
+    # number of neighbouring bins which need to be visited in each direction. For periodic
+    # cells thinner than the cutoff this spans several images.
+    reach = []
+    for d in range(3):
+        width = extent[d] * face_distance[d] / nbins[d]
+        if not pbc[d] and nbins[d] == 1:
+            reach.append(0)
+        else:
+            reach.append(int(math.ceil(cutoff / width)))
+
+    stencil = torch.tensor(
+        list(itertools.product(*[range(-r, r + 1) for r in reach])),
+        dtype=torch.long,
+        device=device,
+    )
+    nstencil = stencil.shape[0]
+
+    nbins_t = torch.tensor(nbins, dtype=torch.long, device=device)
+    origin_t = torch.tensor(origin, dtype=dtype, device=device)
+    extent_t = torch.tensor(extent, dtype=dtype, device=device)
+
+    atom_bins = torch.floor((frac - origin_t) / extent_t * nbins_t).long()
+    atom_bins = torch.minimum(torch.clamp(atom_bins, min=0), nbins_t - 1)
+
+    def linear_bin(b):
+        return (b[..., 0] * nbins[1] + b[..., 1]) * nbins[2] + b[..., 2]
+
+    atom_bin_ids = linear_bin(atom_bins)
+    bin_order = torch.argsort(atom_bin_ids, stable=True)
+    bin_counts = torch.bincount(atom_bin_ids, minlength=math.prod(nbins))
+    bin_starts = torch.cumsum(bin_counts, dim=0) - bin_counts
+
+    # positions in bin order, so the atoms of each bin are contiguous.
+    sorted_positions = wrapped_positions[bin_order]
+
+    # atoms per receiver chunk, such that the expected number of candidates fits the budget.
+    candidates_per_atom = nstencil * max(natoms, 1) / math.prod(nbins)
+    chunk_size = max(1, int(max_candidates / max(candidates_per_atom, 1.0)))
+
+    cutoff_sq = cutoff * cutoff
+
+    receivers, senders, images = [], [], []
+
+    for start in range(0, natoms, chunk_size):
+        atoms = torch.arange(start, min(start + chunk_size, natoms), device=device)
+
+        # (atom, stencil) pairs: the neighbouring bin and the periodic image it lies in.
+        nbr_bins = atom_bins[atoms][:, None, :] + stencil[None, :, :]
+        image = torch.div(nbr_bins, nbins_t, rounding_mode="floor")
+        image = torch.where(periodic, image, torch.zeros_like(image))
+        nbr_bins = nbr_bins - image * nbins_t
+        valid = ((nbr_bins >= 0) & (nbr_bins < nbins_t)).all(dim=-1)
+
+        nbr_bins = torch.where(valid[..., None], nbr_bins, torch.zeros_like(nbr_bins))
+        nbr_ids = linear_bin(nbr_bins).flatten()
+        counts = torch.where(valid.flatten(), bin_counts[nbr_ids], torch.zeros_like(nbr_ids))
+        image = image.view(-1, 3)
+
+        # receiver position relative to each image, so candidates only need one more gather.
+        image_shift = (image.to(dtype) @ full_cell).view(-1, nstencil, 3)
+        origin_pos = (wrapped_positions[atoms][:, None, :] - image_shift).view(-1, 3)
+
+        # expand (atom, stencil) pairs into candidates, ordered by atom, then stencil entry,
+        # candidate k of pair p is the sorted atom bin_starts[p] + k.
+        pair = torch.repeat_interleave(torch.arange(counts.shape[0], device=device), counts)
+        candidate = (bin_starts[nbr_ids] - (torch.cumsum(counts, 0) - counts))[pair]
+        candidate += torch.arange(pair.shape[0], device=device)
+
+        vectors = sorted_positions[candidate] - origin_pos[pair]
+        keep = (vectors * vectors).sum(dim=-1) < cutoff_sq
+
+        pair = pair[keep]
+        i = atoms[pair // nstencil]
+        j = bin_order[candidate[keep]]
+        s = image[pair]
+
+        if not self_interaction:
+            keep = (i != j) | (s != 0).any(dim=-1)
+            i, j, s = i[keep], j[keep], s[keep]
+
+        receivers.append(i.int())
+        senders.append(j.int())
+        images.append(s.short())
+
+    if sum(r.shape[0] for r in receivers) >= 2**31:
+        raise ValueError("number of edges exceeds the int32 range of edge_index")
+
+    if natoms > 0:
+        receiver = torch.cat(receivers)
+        sender = torch.cat(senders)
+        image = torch.cat(images)
+    else:
+        receiver = torch.zeros(0, dtype=torch.int32, device=device)
+        sender = torch.zeros(0, dtype=torch.int32, device=device)
+        image = torch.zeros(0, 3, dtype=torch.int16, device=device)
+
+    # image offsets relative to the unwrapped input positions.
+    if any(pbc):
+        unit_shifts = image.to(dtype)
+        unit_shifts -= wrap[sender]
+        unit_shifts += wrap[receiver]
+    else:
+        unit_shifts = torch.zeros(image.shape, dtype=dtype, device=device)
+    shifts = unit_shifts @ cell
+
+    receiver_offsets = torch.zeros(natoms + 1, dtype=torch.int32, device=device)
+    receiver_offsets[1:] = torch.cumsum(torch.bincount(receiver, minlength=natoms), 0)
+
+    return {
+        "edge_index": torch.stack([receiver, sender]),
+        "shifts": shifts,
+        "unit_shifts": unit_shifts,
+        "receiver_offsets": receiver_offsets,
+    }
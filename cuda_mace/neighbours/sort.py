@@ -0,0 +1,165 @@
+from typing import Dict, Optional
+
+import torch
+
+
+def _sort_op():
+    # imported here so that the neighbour lists themselves do not require libcuda_mace.so.
+    from cuda_mace.ops.invariant_message_passing import InvariantMessagePassingTP
+
+    return InvariantMessagePassingTP()
+
+
+def _version(tensor: torch.Tensor) -> Optional[int]:
+    # inference tensors have no version counter, so in-place changes to them cannot be
+    # detected, and results computed in inference mode cannot be used by autograd later, so
+    # neither is ever treated as cached.
+    if tensor.is_inference() or torch.is_inference_mode_enabled():
+        return None
+
+    return tensor._version
+
+
+def sort_edges(
+    edge_index: torch.Tensor,
+    nnodes: int,
+    shifts: Optional[torch.Tensor] = None,
+    unit_shifts: Optional[torch.Tensor] = None,
+    validate: bool = False,
+) -> Dict[str, torch.Tensor]:
+    """
+    Sorts an edge list by receiver (edge_index[0]) with a stable O(nedges) counting sort, and
+    returns it in the format of cuda_mace.neighbours.neighbour_list: edge_index [2, nedges]
+    (int32), the shifts and unit_shifts that were given, in the same order, and the
+    receiver_offsets [nnodes + 1] (int32), along with the permutation [nedges] (int64) from
+    the input to the sorted edges.
+
+    Receivers outside [0, nnodes) always raise an error, validate also checks the senders.
+    """
+    return EdgeSorter(validate=validate)(edge_index, nnodes, shifts, unit_shifts)
+
+
+class EdgeSorter:
+    """
+    Sorts edge lists by receiver, as required by the ops, for edge lists from neighbour
+    libraries which do not emit them in that order. The permutation is cached while the
+    topology is unchanged, i.e edge_index is the same tensor and has not been modified in
+    place since, in which case only the shifts which changed are permuted again. Inference
+    tensors, and any edges passed in inference mode, are always sorted again.
+
+    With validate=True, the senders are also bounds-checked, and cache hits check that the
+    cached sorted edges still match edge_index.
+
+    example:
+
+        sorter = EdgeSorter()
+
+        for step in range(nsteps):
+            graph = sorter(edge_index, natoms, shifts=shifts, unit_shifts=unit_shifts)
+            ...
+
+        sorter.statistics()  # {"num_sorts": ..., "num_cached": ..., ...}
+    """
+
+    def __init__(self, validate: bool = False):
+        self.validate = validate
+        self.op = _sort_op()
+
+        self.num_sorts = 0
+        self.num_cached = 0
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forces the next call to sort the edges again.
+        """
+        self._edge_index: Optional[torch.Tensor] = None
+        self._version: Optional[int] = None
+        self._nnodes = -1
+        self._graph: Dict[str, torch.Tensor] = {}
+        self._inputs: Dict[str, torch.Tensor] = {}
+
+    def _is_cached(self, edge_index: torch.Tensor, nnodes: int) -> bool:
+        if (
+            self._edge_index is not edge_index
+            or self._version is None
+            or self._version != _version(edge_index)
+        ):
+            return False
+
+        if nnodes != self._nnodes:
+            return False
+
+        if self.validate:
+            permuted = edge_index.index_select(1, self._graph["permutation"])
+            if not torch.equal(permuted.to(torch.int32), self._graph["edge_index"]):
+                return False
+
+        return True
+
+    def __call__(
+        self,
+        edge_index: torch.Tensor,
+        nnodes: int,
+        shifts: Optional[torch.Tensor] = None,
+        unit_shifts: Optional[torch.Tensor] = None,
+    ) -> Dict[str, torch.Tensor]:
+        edge_data = {
+            k: v for k, v in (("shifts", shifts), ("unit_shifts", unit_shifts)) if v is not None
+        }
+
+        if self._is_cached(edge_index, nnodes):
+            self.num_cached += 1
+
+            graph = {
+                "edge_index": self._graph["edge_index"],
+                "receiver_offsets": self._graph["receiver_offsets"],
+                "permutation": self._graph["permutation"],
+            }
+
+            for key, value in edge_data.items():
+                cached = self._inputs.get(key)
+                if (
+                    cached is not None
+                    and cached[0] is value
+                    and cached[1] is not None
+                    and cached[1] == _version(value)
+                ):
+                    graph[key] = self._graph[key]
+                else:
+                    graph[key] = value.index_select(0, graph["permutation"])
+                    self._inputs[key] = (value, _version(value))
+
+            self._graph = graph
+            return graph
+
+        result = self.op.sort_edges_by_receiver(
+            edge_index, list(edge_data.values()), nnodes, self.validate
+        )
+
+        graph = {
+            "edge_index": result[0],
+            "receiver_offsets": result[1],
+            "permutation": result[2],
+        }
+        for key, value in zip(edge_data.keys(), result[3:]):
+            graph[key] = value
+
+        self._edge_index = edge_index
+        self._version = _version(edge_index)
+        self._nnodes = nnodes
+        self._graph = graph
+        self._inputs = {key: (value, _version(value)) for key, value in edge_data.items()}
+
+        self.num_sorts += 1
+
+        return graph
+
+    def statistics(self) -> Dict[str, float]:
+        ncalls = self.num_sorts + self.num_cached
+        return {
+            "num_sorts": self.num_sorts,
+            "num_cached": self.num_cached,
+            "reuse_fraction": self.num_cached / max(ncalls, 1),
+        }
@@ -0,0 +1,114 @@
+from typing import Dict, Optional, Sequence
+
+import torch
+
+from .cell_list import neighbour_list
+
+
+class VerletNeighbourList:
+    """
+    Stateful neighbour list for molecular dynamics. The list is built with a cutoff of
+    r_max + skin, and reused as long as no atom has moved more than skin / 2 since the last
+    build, in which case no pair can have come within r_max without already being listed.
+
+    Reused lists contain pairs further apart than r_max. These contribute exactly zero to the
+    model, since the radial functions vanish beyond r_max (CubicSpline returns zero for
+    r > rmax), so callers can pass the graph straight to OptimizedInvariantMACE.
+
+    The list is also rebuilt when the number of atoms, the cell or the periodicity change.
+    Positions are compared as given, so an atom wrapped back into the cell also triggers
+    a rebuild.
+
+    example:
+
+        nl = VerletNeighbourList(r_max=model.r_max.item(), skin=0.5)
+
+        for step in range(nsteps):
+            graph = nl.update(positions, cell, pbc)
+            ...
+
+        nl.statistics()  # {"num_builds": ..., "num_avoided_builds": ..., ...}
+    """
+
+    def __init__(self, r_max: float, skin: float, self_interaction: bool = False):
+        if skin < 0.0:
+            raise ValueError("skin must be non-negative")
+
+        self.r_max = r_max
+        self.skin = skin
+        self.self_interaction = self_interaction
+
+        self.num_builds = 0
+        self.num_avoided_builds = 0
+
+        self.reset()
+
+    @property
+    def cutoff(self) -> float:
+        return self.r_max + self.skin
+
+    def reset(self):
+        """
+        Forces the next call to update() to rebuild the list.
+        """
+        self._graph: Optional[Dict[str, torch.Tensor]] = None
+        self._positions: Optional[torch.Tensor] = None
+        self._cell: Optional[torch.Tensor] = None
+        self._pbc: Optional[Sequence[bool]] = None
+
+    def needs_rebuild(
+        self,
+        positions: torch.Tensor,
+        cell: Optional[torch.Tensor] = None,
+        pbc: Optional[Sequence[bool]] = None,
+    ) -> bool:
+        if self._graph is None:
+            return True
+
+        pbc = [bool(p) for p in pbc] if pbc is not None else [False, False, False]
+
+        if positions.shape != self._positions.shape or pbc != self._pbc:
+            return True
+
+        if (cell is None) != (self._cell is None):
+            return True
+
+        if cell is not None and not torch.equal(cell.detach().view(3, 3), self._cell):
+            return True
+
+        displacement_sq = ((positions.detach() - self._positions) ** 2).sum(dim=-1)
+
+        return displacement_sq.max().item() > (0.5 * self.skin) ** 2
+
+    def update(
+        self,
+        positions: torch.Tensor,
+        cell: Optional[torch.Tensor] = None,
+        pbc: Optional[Sequence[bool]] = None,
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Returns the neighbour list for the current positions, in the format of
+        cuda_mace.neighbours.neighbour_list, rebuilding it only when required.
+        """
+        if positions.shape[0] > 0 and not self.needs_rebuild(positions, cell, pbc):
+            self.num_avoided_builds += 1
+            return self._graph
+
+        self._graph = neighbour_list(
+            positions.detach(), self.cutoff, cell, pbc, self_interaction=self.self_interaction
+        )
+        self._positions = positions.detach().clone()
+        self._cell = cell.detach().view(3, 3).clone() if cell is not None else None
+        self._pbc = [bool(p) for p in pbc] if pbc is not None else [False, False, False]
+
+        self.num_builds += 1
+
+        return self._graph
+
+    def statistics(self) -> Dict[str, float]:
+        nupdates = self.num_builds + self.num_avoided_builds
+        return {
+            "num_builds": self.num_builds,
+            "num_avoided_builds": self.num_avoided_builds,
+            "reuse_fraction": self.num_avoided_builds / max(nupdates, 1),
+        }
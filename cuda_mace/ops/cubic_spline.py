@@ -1,3 +1,5 @@
+from typing import Callable, Optional
+
 import torch
 
 
@@ -10,18 +12,11 @@ class CubicSpline(torch.nn.Module):
 
         self.register_buffer("r_knots", r_knots)
         self.register_buffer("R_out", R_out)
-        self.register_buffer(
-            "h",
-            torch.tensor(h, device="cuda"),
-        )
-        self.register_buffer(
-            "rmax",
-            torch.tensor(rmax, device="cuda"),
-        )
+        # kept as python floats so evaluating the spline never synchronises with the device.
+        self.h = float(h)
+        self.rmax = float(rmax)
 
-        coefficients = self.cubic_spline_coefficients(
-            self.r_knots, self.R_out, self.h.item()
-        ).cuda()
+        coefficients = cubic_spline_coefficients(self.r_knots, self.R_out)
 
         self.register_buffer(
             "coefficients",
@@ -33,52 +28,198 @@ class CubicSpline(torch.nn.Module):
     def forward(self, r_trial: torch.Tensor):  # [nedges]
 
         out = self.cuda_obj.forward(
-            r_trial, self.r_knots, self.coefficients, self.h.item(), self.rmax.item()
+            r_trial, self.r_knots, self.coefficients, self.h, self.rmax
         )
 
         return out  # outputs [nedges, R_out.shape[-1]]
 
-    def cubic_spline_coefficients(self, x, y, h):
-        nchannels = y.shape[-1]
+    def cubic_spline_coefficients(self, x, y, h=None):
+        return cubic_spline_coefficients(x, y)
 
-        n = x.size(0) - 1  # Number of splines
 
-        # Compute the alpha vector for the tridiagonal system
-        alpha = torch.zeros(n, nchannels, dtype=x.dtype, device=x.device)
-        for i in range(1, n):
-            alpha[i, :] = (3 / h * (y[i + 1, :] - y[i, :])) - (
-                3 / h * (y[i, :] - y[i - 1, :])
-            )
+class MultiCubicSpline(torch.nn.Module):
+    """
+    Several cubic splines sharing the same uniformly spaced knots on [0, rmax], evaluated
+    in a single pass over the samples: the interval lookup is done once per sample and
+    reused by every table. Samples beyond rmax evaluate to zero.
 
-        # Set up the tridiagonal system
-        l = torch.ones(n + 1, nchannels, dtype=x.dtype, device=x.device)
-        mu = torch.zeros(n, nchannels, dtype=x.dtype, device=x.device)
-        z = torch.zeros(n + 1, nchannels, dtype=x.dtype, device=x.device)
+    r_knots: [nknots] uniformly spaced knots, r_knots[0] = 0.
+    R_out: [ntables, nknots, noutputs] values at the knots.
 
-        # Forward pass to solve the tridiagonal system for c
-        for i in range(1, n):
-            l[i] = 2 * (x[i + 1] - x[i - 1]) - h * mu[i - 1]
-            mu[i] = h / l[i]
-            z[i] = (alpha[i] - h * z[i - 1]) / l[i]
+    forward returns [ntables, nsamples, noutputs], so out[t] is a contiguous view of the
+    outputs of table t.
+    """
 
-        # Boundary conditions for natural spline
-        l[n] = 1
-        z[n] = 0
-        c = torch.zeros(n + 1, nchannels, dtype=x.dtype, device=x.device)
+    def __init__(self, r_knots: torch.Tensor, R_out: torch.Tensor, h: float, rmax: float):
+        super().__init__()
 
-        # Back substitution to solve for c
-        for j in range(n - 1, -1, -1):
-            c[j] = z[j] - mu[j] * c[j + 1]
+        ntables, nknots, noutputs = R_out.shape
 
-        # Calculate b and d coefficients
-        b = torch.zeros(n, nchannels, dtype=x.dtype, device=x.device)
-        d = torch.zeros(n, nchannels, dtype=x.dtype, device=x.device)
-        a = y[:-1]  # Coefficient a_i corresponds to y_i
+        self.register_buffer("r_knots", r_knots)
+        # kept as python floats so evaluating the spline never synchronises with the device.
+        self.h = float(h)
+        self.rmax = float(rmax)
+        self.nknots = nknots
+        self.max_error: Optional[float] = None
+
+        # all tables are fitted at once, as channels of a single [nknots, ntables * noutputs] spline
+        coefficients = cubic_spline_coefficients(
+            r_knots, R_out.transpose(0, 1).reshape(nknots, ntables * noutputs)
+        )
 
-        for i in range(n):
-            b[i] = (y[i + 1] - y[i]) / h - h * (c[i + 1] + 2 * c[i]) / 3
-            d[i] = (c[i + 1] - c[i]) / (3 * h)
+        self.register_buffer(
+            "coefficients",
+            coefficients.view(nknots - 1, 4, ntables, noutputs).permute(2, 0, 1, 3).contiguous(),
+        )  # [ntables, nknots - 1, 4, noutputs]
+
+        self.cuda_obj = torch.classes.cubic_spline.MultiCubicSpline()
+
+    @classmethod
+    def from_coefficients(
+        cls,
+        r_knots: torch.Tensor,
+        coefficients: torch.Tensor,
+        h: float,
+        rmax: float,
+        max_error: Optional[float] = None,
+    ) -> "MultiCubicSpline":
+        """
+        Builds the spline from the knots and [ntables, nknots - 1, 4, noutputs] coefficients
+        of an existing MultiCubicSpline, without refitting.
+        """
+        obj = cls.__new__(cls)
+        torch.nn.Module.__init__(obj)
+
+        obj.register_buffer("r_knots", r_knots)
+        obj.register_buffer("coefficients", coefficients.contiguous())
+        obj.h = float(h)
+        obj.rmax = float(rmax)
+        obj.nknots = r_knots.shape[0]
+        obj.max_error = max_error
+
+        obj.cuda_obj = torch.classes.cubic_spline.MultiCubicSpline()
+
+        return obj
 
-        coefficients = torch.stack((a, b, c[:-1], d), dim=1)
+    def forward(self, r_trial: torch.Tensor):  # [nedges]
+        return self.cuda_obj.forward(
+            r_trial, self.r_knots, self.coefficients, self.h, self.rmax
+        )  # outputs [ntables, nedges, noutputs]
+
+    @classmethod
+    def fit(
+        cls,
+        fn: Callable[[torch.Tensor], torch.Tensor],
+        rmax: float,
+        tolerance: float = 1e-6,
+        r_min: float = 0.5,
+        min_knots: int = 64,
+        max_knots: int = 4096,
+        dtype: torch.dtype = torch.float32,
+        device: Optional[torch.device] = None,
+    ) -> "MultiCubicSpline":
+        """
+        Tabulates fn: [n] float64 -> [ntables, n, noutputs] on [0, rmax], doubling the
+        number of intervals from min_knots until the maximum error at the interval
+        midpoints in [r_min, rmax], relative to the largest |fn|, is below tolerance, or
+        max_knots is reached. The knot count and achieved error are stored in nknots and
+        max_error.
+
+        r_min excludes the first few intervals, where the natural boundary condition
+        dominates the error but where no edges are expected.
+        """
+        nknots = min_knots
+
+        while True:
+            r = torch.linspace(0.0, rmax, nknots, dtype=torch.float64, device=device)
+            h = rmax / (nknots - 1)
+
+            # fn is evaluated at a small positive r to avoid the 1/r of the radial basis.
+            R = fn(r.clamp(min=1e-12))
+            spline = cls(r, R, h, rmax)
+
+            r_mid = (r[:-1] + 0.5 * h)
+            r_mid = r_mid[r_mid >= r_min]
+            error = (
+                spline._evaluate_reference(r_mid) - fn(r_mid)
+            ).abs().max() / R.abs().max().clamp(min=1e-30)
+            spline.max_error = error.item()
+
+            if spline.max_error <= tolerance or nknots >= max_knots:
+                break
+
+            nknots = min(2 * (nknots - 1) + 1, max_knots)
+
+        return spline.to(dtype)
+
+    def _evaluate_reference(self, r: torch.Tensor) -> torch.Tensor:
+        # pure torch evaluation, used to validate the fit on any device.
+        idx = (r / self.h).long().clamp(0, self.coefficients.shape[1] - 1)
+        x = (r - self.r_knots[idx])[None, :, None]
+        c = self.coefficients[:, idx]  # [ntables, n, 4, noutputs]
+        return c[:, :, 0] + c[:, :, 1] * x + c[:, :, 2] * x**2 + c[:, :, 3] * x**3
+
+
+def cubic_spline_coefficients(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+    """
+    Natural cubic spline coefficients for all channels of y at once.
+
+    x: [nknots] strictly increasing knots, need not be uniformly spaced.
+    y: [nknots, nchannels] values at the knots.
+
+    returns [nknots - 1, 4, nchannels] coefficients (a, b, c, d) such that on
+    [x_i, x_{i+1}]: y(r) = a_i + b_i t + c_i t^2 + d_i t^3, with t = r - x_i.
+
+    The tridiagonal system for c only depends on the knots, so its Thomas
+    factorisation is computed once in float64, and the forward/back
+    substitutions are then carried out on every channel simultaneously.
+    """
+    device, dtype = y.device, y.dtype
+
+    x = x.detach().to("cpu", torch.float64)
+    y = y.detach().to("cpu", torch.float64)
+
+    n = x.shape[0] - 1  # number of intervals
+    nchannels = y.shape[-1]
+
+    h = x[1:] - x[:-1]  # [n]
+    slopes = (y[1:] - y[:-1]) / h[:, None]  # [n, nchannels]
+
+    c = torch.zeros(n + 1, nchannels, dtype=torch.float64)
+
+    if n > 1:
+        # interior equations i = 1..n-1, with c_0 = c_n = 0:
+        # h_{i-1} c_{i-1} + 2 (h_{i-1} + h_i) c_i + h_i c_{i+1} = rhs_i
+        rhs = 3.0 * (slopes[1:] - slopes[:-1])  # [n-1, nchannels]
+
+        lower = h[:-1].tolist()
+        diag = (2.0 * (h[:-1] + h[1:])).tolist()
+        upper = h[1:].tolist()
+
+        # Thomas factorisation, scalars only.
+        m = n - 1
+        mu = [0.0] * m
+        inv_l = [0.0] * m
+        inv_l[0] = 1.0 / diag[0]
+        for i in range(1, m):
+            mu[i - 1] = upper[i - 1] * inv_l[i - 1]
+            inv_l[i] = 1.0 / (diag[i] - lower[i] * mu[i - 1])
+
+        # forward substitution, vectorised over channels.
+        z = torch.empty(m, nchannels, dtype=torch.float64)
+        z[0] = rhs[0] * inv_l[0]
+        for i in range(1, m):
+            z[i] = (rhs[i] - lower[i] * z[i - 1]) * inv_l[i]
+
+        # back substitution, vectorised over channels.
+        c[m] = z[m - 1]
+        for i in range(m - 2, -1, -1):
+            c[i + 1] = z[i] - mu[i] * c[i + 2]
+
+    a = y[:-1]
+    b = slopes - h[:, None] * (c[1:] + 2.0 * c[:-1]) / 3.0
+    d = (c[1:] - c[:-1]) / (3.0 * h[:, None])
+
+    coefficients = torch.stack((a, b, c[:-1], d), dim=1)
 
-        return coefficients
+    return coefficients.to(device=device, dtype=dtype)
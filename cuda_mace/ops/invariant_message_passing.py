@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 import torch
 
 class InvariantMessagePassingTP(torch.nn.Module):
@@ -11,12 +13,58 @@ class InvariantMessagePassingTP(torch.nn.Module):
         node_feats: torch.Tensor,  # [nnodes, nfeats]
         edge_attrs: torch.Tensor,  # [nedges, 16]
         tp_weights: torch.Tensor,  # [nedges, 4, nfeats]
-        # [nedges] -> must be monotonically increasing
+        # [nedges]
         sender_list: torch.Tensor,
-        # [nedges] -> must be monotonically increasing
+        # [nedges] -> must be sorted, see sort_edges_by_receiver() for unsorted edge lists
         receiver_list: torch.Tensor,
         nnodes: int,
+        # [2 * nnodes] from first_occurences(), computed internally if None
+        first_occurences: Optional[torch.Tensor] = None,
+        # [sort_idx, sender_first_occurences] from sender_ordering()
+        sender_ordering: Optional[List[torch.Tensor]] = None,
     ):
-        return self.cuda_obj.forward(
-            node_feats, edge_attrs, tp_weights, sender_list, receiver_list, nnodes
+        if first_occurences is None and sender_ordering is None:
+            return self.cuda_obj.forward(
+                node_feats, edge_attrs, tp_weights, sender_list, receiver_list, nnodes
+            )  # outputs [nnodes, 16, nfeats]
+
+        empty = torch.empty(0, dtype=sender_list.dtype, device=sender_list.device)
+
+        receiver_first_occurences = empty
+        if first_occurences is not None:
+            receiver_first_occurences = first_occurences
+
+        sender_sort_idx, sender_first_occurences = empty, empty
+        if sender_ordering is not None:
+            sender_sort_idx, sender_first_occurences = sender_ordering[0], sender_ordering[1]
+
+        return self.cuda_obj.forward_precomputed(
+            node_feats,
+            edge_attrs,
+            tp_weights,
+            sender_list,
+            receiver_list,
+            receiver_first_occurences,
+            sender_sort_idx,
+            sender_first_occurences,
+            nnodes,
         )  # outputs [nnodes, 16, nfeats]
+
+    def first_occurences(self, receiver_list: torch.Tensor, nnodes: int) -> torch.Tensor:
+        # [2 * nnodes] int32: start and end edge of each receiver
+        return self.cuda_obj.calculate_first_occurences(receiver_list, nnodes)
+
+    def sender_ordering(self, sender_list: torch.Tensor, nnodes: int) -> List[torch.Tensor]:
+        # [nedges] permutation into sender order, [2 * nnodes] start and end of each sender
+        return self.cuda_obj.calculate_sender_ordering(sender_list, nnodes)
+
+    def sort_edges_by_receiver(
+        self,
+        edge_index: torch.Tensor,
+        edge_data: List[torch.Tensor],
+        nnodes: int,
+        validate: bool = False,
+    ) -> List[torch.Tensor]:
+        # stable sort by edge_index[0]: [2, nedges] int32 edge_index, [nnodes + 1] int32
+        # receiver offsets, [nedges] int64 permutation, then each [nedges, ...] edge_data
+        return self.cuda_obj.sort_edges_by_receiver(edge_index, edge_data, nnodes, validate)
@@ -1,16 +1,20 @@
 from math import prod
 import torch
-from e3nn import o3
-from typing import List
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    from e3nn import o3
 
 
 class Linear(torch.nn.Module):
 
     def __init__(self,
-                 irreps_in: o3.Irreps,
-                 irreps_out: o3.Irreps,
+                 irreps_in: "o3.Irreps",
+                 irreps_out: "o3.Irreps",
                  e3nn_instructions: List,
-                 e3nn_weights: torch.Tensor):
+                 e3nn_weights: torch.Tensor,
+                 dtype: torch.dtype = torch.float32,
+                 device: str = "cuda"):
 
         super().__init__()
 
@@ -50,10 +54,30 @@ class Linear(torch.nn.Module):
             flat_weight_index += path_nweight
 
         self.register_buffer("weights", torch.stack(
-            weights).contiguous().cuda().float())
+            weights).contiguous().to(device=device, dtype=dtype))
 
+        # derived from weights, so not part of the state dict.
         self.register_buffer("weights_transposed",  self.weights.clone(
-        ).detach().transpose(-1, -2).contiguous().cuda())
+        ).detach().transpose(-1, -2).contiguous(), persistent=False)
+
+    @classmethod
+    def from_weights(cls, weights: torch.Tensor) -> "Linear":
+        """
+        Builds the module from the per-l weights [4, K, N] of an existing Linear (its
+        "weights" buffer), without the e3nn irreps and instructions.
+        """
+        obj = cls.__new__(cls)
+        torch.nn.Module.__init__(obj)
+
+        obj.cuda_obj = torch.classes.linear_wmma.Linear()
+        obj.out_lmax = weights.shape[0] - 1
+        obj.out_dim = weights.shape[-1]
+
+        obj.register_buffer("weights", weights.contiguous())
+        obj.register_buffer("weights_transposed", weights.clone(
+        ).detach().transpose(-1, -2).contiguous(), persistent=False)
+
+        return obj
 
     def forward(self, x: torch.Tensor):
         return self.cuda_obj.forward(x, self.weights, self.weights_transposed)
@@ -61,7 +85,7 @@ class Linear(torch.nn.Module):
 
 class ElementalLinear(torch.nn.Module):
 
-    def __init__(self, irreps_in, irreps_out, e3nn_instructions, e3nn_weights, num_elements):
+    def __init__(self, irreps_in, irreps_out, e3nn_instructions, e3nn_weights, num_elements, dtype=torch.float32, device="cuda"):
 
         super().__init__()
 
@@ -97,17 +121,41 @@ class ElementalLinear(torch.nn.Module):
             flat_weight_index += path_nweight
 
         weights = torch.zeros(
-            self.num_elements, 4, w.shape[-2], w.shape[-1], dtype=torch.float32, device='cuda')
+            self.num_elements, 4, w.shape[-2], w.shape[-1], dtype=dtype, device=device)
 
         for i, ins in enumerate(self.instructions):
             start_l_idx, end_l_idx, w, path_weight = ins
             weights[:, i, ...] = w
 
         self.register_buffer("weights", weights)
+        # derived from weights, so not part of the state dict.
         self.register_buffer("weights_transposed", self.weights.clone(
-        ).detach().transpose(-1, -2).contiguous().cuda())
+        ).detach().transpose(-1, -2).contiguous(), persistent=False)
+
+    @classmethod
+    def from_weights(cls, weights: torch.Tensor) -> "ElementalLinear":
+        """
+        Builds the module from the per-element, per-l weights [nelements, 4, K, N] of an
+        existing ElementalLinear (its "weights" buffer), without the e3nn irreps and
+        instructions.
+        """
+        obj = cls.__new__(cls)
+        torch.nn.Module.__init__(obj)
+
+        obj.cuda_obj = torch.classes.linear_wmma.ElementalLinear()
+        obj.num_elements = weights.shape[0]
+        obj.out_lmax = weights.shape[1] - 1
+        obj.out_dim = weights.shape[-1]
+
+        obj.register_buffer("weights", weights.contiguous())
+        obj.register_buffer("weights_transposed", weights.clone(
+        ).detach().transpose(-1, -2).contiguous(), persistent=False)
+
+        return obj
 
     def forward(self, x, y):
         # x : [batch,  num_l, num_channels]
         # y : [batch, num_elements]
+        # on the CPU, the nodes are sorted by element once per y and each element is one
+        # GEMM per l; the ordering is cached while the same y tensor is passed unmodified.
         return self.cuda_obj.forward(x, self.weights, self.weights_transposed, y)
@@ -0,0 +1,11 @@
+import torch
+
+
+class SphericalHarmonics(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+
+        self.cuda_obj = torch.classes.spherical_harmonics.SphericalHarmonics()
+
+    def forward(self, vectors: torch.Tensor):  # [nedges, 3]
+        return self.cuda_obj.forward(vectors)  # outputs [16, nedges], l <= 3
@@ -1,11 +1,203 @@
+import hashlib
+import os
+import tempfile
+from typing import TYPE_CHECKING, Dict
+
 import torch
-from e3nn import o3
-from mace.tools.cg import U_matrix_real
+
+# e3nn and mace are only needed to build the sparse U tables, from_buffers works without them.
+if TYPE_CHECKING:
+    from e3nn import o3
+
+# sparse U tables, keyed by (irreps_in, irreps_out, correlation, dtype) and the table format.
+_SPARSE_TABLE_CACHE: Dict[str, Dict[str, torch.Tensor]] = {}
+
+# version of the layout produced by _build_sparse_tables. Bump it whenever the tables change, so
+# that files cached on disk by earlier versions are not reused.
+_SPARSE_TABLE_VERSION = 1
+
+
+def _cache_dir() -> str:
+    root = os.environ.get("CUDA_MACE_CACHE_DIR")
+    if root is None:
+        root = os.path.join(
+            os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+            "cuda_mace",
+        )
+    return os.path.join(root, "u_matrices")
+
+
+def _cache_key(irreps_in, irreps_out, correlation, dtype) -> str:
+    import e3nn
+    import mace
+    from e3nn import o3
+
+    # the coupling matrices come from e3nn and mace, so their versions are part of the key.
+    key = "|".join(
+        str(field)
+        for field in (
+            o3.Irreps(irreps_in),
+            o3.Irreps(irreps_out),
+            correlation,
+            dtype,
+            _SPARSE_TABLE_VERSION,
+            e3nn.__version__,
+            getattr(mace, "__version__", "unknown"),
+        )
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _group_rank(nz: torch.Tensor, nl: int) -> torch.Tensor:
+    """
+    position of each nonzero (i, j, ...) among the nonzeros sharing the same (i, j).
+    nz must be sorted lexicographically, as returned by torch.nonzero.
+    """
+    group = nz[:, 0] * nl + nz[:, 1]
+    counts = torch.bincount(group, minlength=nl * nl)
+    starts = torch.cumsum(counts, 0) - counts
+    return torch.arange(nz.shape[0]) - starts[group]
+
+
+def _build_sparse_tables(irreps_in, irreps_out, correlation) -> Dict[str, torch.Tensor]:
+    from e3nn import o3
+    from mace.tools.cg import U_matrix_real
+
+    U_matrices = {}
+    for nu in range(1, correlation + 1):
+        U_matrices[nu] = [
+            U_matrix_real(
+                irreps_in=irreps_in,
+                irreps_out=o3.Irreps(str(ir_out.ir)),
+                correlation=nu,
+                dtype=torch.float32,
+            )[-1].cpu().to(torch.float32)
+            for ir_out in irreps_out
+        ]
+
+    U3_num_nonsparse = torch.zeros((16, 16), dtype=torch.int16)
+
+    for U_matrix in U_matrices[3]:
+        if len(U_matrix.shape) == 4:
+            nl = U_matrix.shape[0]
+            counts = (U_matrix != 0.0).sum(dim=(2, 3)).to(torch.int16)
+            U3_num_nonsparse[:nl, :nl] = torch.where(
+                counts > 0, counts, U3_num_nonsparse[:nl, :nl])
+
+    u3_max_nonsparse = int(U3_num_nonsparse.max())
+
+    U3_indices = torch.zeros((u3_max_nonsparse, 16, 16), dtype=torch.int32)
+    U3_values = torch.zeros((u3_max_nonsparse, 16, 16), dtype=torch.float32)
+
+    for U_matrix in U_matrices[3]:
+        if len(U_matrix.shape) == 4:
+            nl = U_matrix.shape[0]
+            mask = U_matrix != 0.0
+
+            # nonzeros of U[i, j, :, :], U[j, i, :, :] and U[j, :, i, :], each
+            # ordered by (i, j) and then row-major within the (i, j) block.
+            nz1 = torch.nonzero(mask)
+            nz2 = torch.nonzero(mask.transpose(0, 1))
+            nz3 = torch.nonzero(mask.permute(2, 0, 1, 3))
+
+            if nz1.shape[0] == 0:
+                continue
+
+            rank1 = _group_rank(nz1, nl)
+            rank2 = _group_rank(nz2, nl)
+            rank3 = _group_rank(nz3, nl)
+
+            nmax = int(max(rank1.max(), rank2.max(), rank3.max())) + 1
+            ldx2 = torch.zeros((nl, nl, nmax), dtype=torch.int64)
+            ldx3 = torch.zeros((nl, nl, nmax), dtype=torch.int64)
+            ldx2[nz2[:, 0], nz2[:, 1], rank2] = nz2[:, 3]
+            ldx3[nz3[:, 0], nz3[:, 1], rank3] = nz3[:, 3]
+
+            i, j, kdx1, ldx1 = nz1.unbind(-1)
+
+            compressed_output1 = kdx1 << 8 | ldx1
+            compressed_output2 = ldx2[i, j, rank1] << 8 | ldx3[i, j, rank1]
+            compressed_output = compressed_output2 << 16 | compressed_output1
+
+            U3_indices[rank1, i, j] = compressed_output.to(torch.int32)
+            U3_values[rank1, i, j] = U_matrix[i, j, kdx1, ldx1]
+
+    U2_num_nonsparse = torch.zeros((16, 16), dtype=torch.int16)
+    U2_values = torch.zeros((16, 16), dtype=torch.float32)
+    U2_indices = torch.zeros((16, 16), dtype=torch.int16)
+
+    for U_matrix in U_matrices[2]:
+        if len(U_matrix.shape) == 3:
+            nl = U_matrix.shape[0]
+            mask = U_matrix != 0.0
+            U2_num_nonsparse[:nl, :nl] = mask.sum(dim=-1).to(torch.int16)
+
+            i, j, kdx = torch.nonzero(mask).unbind(-1)
+            U2_values[i, j] = U_matrix[i, j, kdx]
+            U2_indices[i, j] = kdx.to(torch.int16)
+
+    U1_num_values = torch.zeros((16), dtype=torch.int16)
+    U1_index = torch.zeros((16), dtype=torch.int16)
+
+    for U_matrix in U_matrices[1]:
+        if len(U_matrix.shape) == 2:
+            i, jdx = torch.nonzero(U_matrix != 0.0).unbind(-1)
+            U1_num_values[i] = 1
+            U1_index[i] = jdx.to(torch.int16)
+
+    return {
+        "U3_num_nonsparse": U3_num_nonsparse,
+        "U3_indices": U3_indices,
+        "U3_values": U3_values,
+        "U2_num_nonsparse": U2_num_nonsparse,
+        "U2_indices": U2_indices,
+        "U2_values": U2_values,
+        "U1_num_values": U1_num_values,
+        "U1_index": U1_index,
+    }
+
+
+def sparse_u_tables(irreps_in, irreps_out, correlation, dtype) -> Dict[str, torch.Tensor]:
+    """
+    Returns the sparse U3/U2/U1 tables consumed by the symmetric contraction
+    kernels, as CPU tensors. Tables are memoized in-process and on disk (in
+    $CUDA_MACE_CACHE_DIR, or ~/.cache/cuda_mace), so the Clebsch-Gordan
+    coupling matrices are only generated once per irreps combination.
+    """
+    key = _cache_key(irreps_in, irreps_out, correlation, dtype)
+
+    if key in _SPARSE_TABLE_CACHE:
+        return _SPARSE_TABLE_CACHE[key]
+
+    path = os.path.join(_cache_dir(), key + ".pt")
+
+    tables = None
+    if os.path.isfile(path):
+        try:
+            tables = torch.load(path, map_location="cpu", weights_only=True)
+        except Exception:
+            tables = None
+
+    if tables is None:
+        tables = _build_sparse_tables(irreps_in, irreps_out, correlation)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write then rename, so concurrent readers never see a partial file.
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                torch.save(tables, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    _SPARSE_TABLE_CACHE[key] = tables
+
+    return tables
 
 
 class SymmetricContraction(torch.nn.Module):
 
-    def __init__(self, irreps_in: o3.Irreps, irreps_out: o3.Irreps, W_tensors, correlation=3, device="cuda", dtype=torch.float32):
+    def __init__(self, irreps_in: "o3.Irreps", irreps_out: "o3.Irreps", W_tensors, correlation=3, device="cuda", dtype=torch.float32):
         super().__init__()
 
         self.cuda_obj = torch.classes.symm_contract.SymmetricContraction()
@@ -19,28 +211,42 @@ class SymmetricContraction(torch.nn.Module):
 
         assert correlation == 3, "CUDASymmetricContraction exclusively supports correlation=3"
 
-        self.U_matrices = {}
-
-        for nu in range(1, correlation + 1):
-            self.U_matrices[nu] = {}
-
-            for ir_id, ir_out in enumerate(irreps_out):
-                U_matrix = U_matrix_real(
-                    irreps_in=irreps_in,
-                    irreps_out=o3.Irreps(str(ir_out.ir)),
-                    correlation=nu,
-                    dtype=torch.float32
-                )[-1].to(self.device)
-                self.U_matrices[nu][ir_id] = U_matrix
-
         self.W_tensors = W_tensors
 
         self.setup_sparse_matrices()
         self.setup_weights()
 
+    @classmethod
+    def from_buffers(cls, buffers: Dict[str, torch.Tensor]) -> "SymmetricContraction":
+        """
+        Builds the module from the buffers of an existing SymmetricContraction (its state
+        dict: the sparse U tables, weights_* and nweights_*), without the irreps, the
+        Clebsch-Gordan coupling matrices or the per-l weights.
+        """
+        obj = cls.__new__(cls)
+        torch.nn.Module.__init__(obj)
+
+        obj.cuda_obj = torch.classes.symm_contract.SymmetricContraction()
+        obj.device = buffers["weights_3"].device
+        obj.dtype = buffers["weights_3"].dtype
+        obj.correlation = 3
+        obj.nlout = buffers["weights_3"].shape[0]
+
+        for name, buffer in buffers.items():
+            obj.register_buffer(name, buffer)
+
+        obj.u3_max_nonsparse = obj.U3_indices.shape[0]
+
+        obj.W3_L0_size = int(obj.nweights_3[0])
+        obj.W2_L0_size = int(obj.nweights_2[0])
+        obj.W1_L0_size = int(obj.nweights_1[0])
+
+        return obj
+
     def forward(self, x, atom_types):
 
-        assert x.shape[-1] % 32 == 0, "channel dimension of x ([-1]) must be a multiple of 32."
+        if x.is_cuda:
+            assert x.shape[-1] % 32 == 0, "channel dimension of x ([-1]) must be a multiple of 32."
         assert x.shape[1] == 16, "l dimension of x ([1]) must be 16."
 
         return self.cuda_obj.forward(
@@ -64,102 +270,13 @@ class SymmetricContraction(torch.nn.Module):
             )
 
     def setup_sparse_matrices(self):
-        lout_counter = 0
-        U3_num_nonsparse = torch.zeros((16, 16), dtype=torch.int16).to(self.device)
-      
-        for ir_id, ir_out in enumerate(self.irreps_out):
-            U_matrix = self.U_matrices[3][ir_id]
-            if (len(U_matrix.shape) == 4):
-                nl = U_matrix.shape[0]
-                for i in range(nl):
-                    for j in range(nl):
-                        kdx1, ldx1 = torch.where(U_matrix[i, j] != 0.0)
-                        if (kdx1.shape[0] > 0):
-                            U3_num_nonsparse[i, j] = kdx1.shape[0]
-
-        u3_max_nonsparse = U3_num_nonsparse.max().item()
-
-        U3_indices = torch.zeros(
-            (u3_max_nonsparse, 16, 16), dtype=torch.int32).to(self.device)
-        U3_values = torch.zeros(
-            (u3_max_nonsparse, 16, 16), dtype=torch.float32).to(self.device)
-
-        for ir_id, ir_out in enumerate(self.irreps_out):
-            U_matrix = self.U_matrices[3][ir_id]
-            if (len(U_matrix.shape) == 4):
-                nl = U_matrix.shape[0]
-                for i in range(nl):
-                    for j in range(nl):
-                        kdx1, ldx1 = torch.where(U_matrix[i, j] != 0.0)
-                        _, ldx2 = torch.where(U_matrix[j, i, :, :] != 0.0)
-                        _, ldx3 = torch.where(U_matrix[j, :, i, :] != 0.0)
-                        for k in range(kdx1.shape[0]):
-                            compressed_output1 = kdx1[k] << 8 | ldx1[k]
-                            compressed_output2 = ldx2[k] << 8 | ldx3[k]
-                            compressed_output = compressed_output2 << 16 | compressed_output1
-                            U3_indices[k, i, j] = compressed_output
-                            U3_values[k, i, j] = U_matrix[i,
-                                                            j, kdx1[k], ldx1[k]]
-
-        U2_num_nonsparse = torch.zeros(
-            (16, 16), dtype=torch.int16).to(self.device)
-
-        for ir_id, ir_out in enumerate(self.irreps_out):
-            U_matrix = self.U_matrices[2][ir_id]
-            if (len(U_matrix.shape) == 3):
-                nl = U_matrix.shape[0]
-                for i in range(nl):
-                    for j in range(nl):
-                        jdx,  = torch.where(U_matrix[i, j] != 0.0)
-                        U2_num_nonsparse[i, j] = jdx.shape[0]
-
-        u2_max_nonsparse = torch.max(torch.tensor(
-            [U2_num_nonsparse.max().item()])).item()
-
-        U2_values = torch.zeros(
-            (16, 16), dtype=torch.float32).to(self.device)
-        U2_indices = torch.zeros(
-            (16, 16), dtype=torch.int16).to(self.device)
-
-        for ir_id, ir_out in enumerate(self.irreps_out):
-            U_matrix = self.U_matrices[2][ir_id]
-            if (len(U_matrix.shape) == 3):
-                nl = U_matrix.shape[0]
-                for i in range(nl):
-                    for j in range(nl):
-                        kdx_1,  = torch.where(U_matrix[i, j] != 0.0)
-                        kdx_2,  = torch.where(U_matrix[j, i] != 0.0)
-                        if (U2_num_nonsparse[i, j] > 0):
-                            U2_values[ i,
-                                        j] = U_matrix[i, j, kdx_1]
-                            U2_indices[ i, j] = kdx_1
-
-        U1_num_values = torch.zeros(
-            (16), dtype=torch.int16).to(self.device)
-        U1_index = torch.zeros(
-            (16), dtype=torch.int16).to(self.device)
-        for ir_id, ir_out in enumerate(self.irreps_out):
-            U_matrix = self.U_matrices[1][ir_id]
-            if (len(U_matrix.shape) == 2):
-                nl = U_matrix.shape[0]
-                for i in range(nl):
-                    jdx,  = torch.where(U_matrix[i] != 0.0)
-                    if (jdx.shape[0] > 0):
-                        U1_num_values[i] = 1
-                        U1_index[i] = jdx
-
-
-
-        self.u3_max_nonsparse = u3_max_nonsparse
-        self.register_buffer("U3_num_nonsparse", U3_num_nonsparse)
-        self.register_buffer("U3_indices", U3_indices)
-        self.register_buffer("U3_values", U3_values)
-        self.register_buffer("U2_num_nonsparse", U2_num_nonsparse)
-        self.register_buffer("U2_indices", U2_indices)
-        self.register_buffer("U2_values", U2_values)
-
-        self.register_buffer("U1_num_values", U1_num_values)
-        self.register_buffer("U1_index", U1_index)
+        tables = sparse_u_tables(
+            self.irreps_in, self.irreps_out, self.correlation, self.dtype)
+
+        self.u3_max_nonsparse = tables["U3_indices"].shape[0]
+
+        for name, table in tables.items():
+            self.register_buffer(name, table.to(self.device))
 
     def setup_weights(self):
         self.weight_max_size = {}
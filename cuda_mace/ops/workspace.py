@@ -0,0 +1,45 @@
+from typing import Dict
+
+import torch
+
+
+class Workspace:
+    """
+    Pool of the output and intermediate buffers of the ops in cuda_mace.ops, reused across
+    calls while it is active. Sizes are rounded up to buckets (buckets_per_octave per power
+    of two), so that buffers keep being reused while the atom and edge counts only change
+    slightly, e.g between MD steps.
+
+    A buffer is only reused once nothing else references it, so tensors returned by the ops
+    or saved for backward are never overwritten. On CUDA, buffers read on another stream
+    should not be released before that stream has been synchronised.
+
+    example:
+
+        workspace = Workspace()
+
+        for step in range(nsteps):
+            with workspace:
+                out = model(data, compute_force=True)
+
+        workspace.statistics()  # {"num_allocations": ..., "num_avoided_allocations": ..., ...}
+    """
+
+    def __init__(self, buckets_per_octave: int = 4):
+        self.cuda_obj = torch.classes.workspace.Workspace(buckets_per_octave)
+
+    def __enter__(self):
+        self.cuda_obj.activate()
+        return self
+
+    def __exit__(self, *args):
+        self.cuda_obj.deactivate()
+
+    def clear(self):
+        """
+        Releases every buffer which is not in use.
+        """
+        self.cuda_obj.clear()
+
+    def statistics(self) -> Dict[str, int]:
+        return dict(self.cuda_obj.statistics())
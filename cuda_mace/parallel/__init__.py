@@ -0,0 +1,4 @@
+from .domain_decomposition import Domain, DomainDecomposition, partition
+from .pool import ParallelEvaluator
+
+__all__ = ['Domain', 'DomainDecomposition', 'partition', 'ParallelEvaluator']
@@ -0,0 +1,346 @@
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import torch
+
+from cuda_mace.neighbours import neighbour_list
+from cuda_mace.neighbours.cell_list import _complete_cell
+
+
+class Domain(NamedTuple):
+    """
+    Atoms of one spatial domain and of its halo, as an open cluster in which periodic images
+    are explicit atoms.
+    """
+
+    atoms: torch.Tensor  # [nlocal] index of each local atom in the full system
+    owned: torch.Tensor  # [nlocal] bool, False for halo atoms and images
+    positions: torch.Tensor  # [nlocal, 3] cartesian, images unwrapped
+
+
+def partition(
+    positions: torch.Tensor,
+    cell: Optional[torch.Tensor],
+    pbc: Optional[Sequence[bool]],
+    domains: Sequence[int],
+    halo: float,
+) -> List[Domain]:
+    """
+    Splits the system into a domains[0] x domains[1] x domains[2] grid along the cell
+    vectors (or the bounding box of the atoms along open directions). Each atom is owned by
+    exactly one domain, and each domain is padded with every atom, or periodic image, within
+    halo of its region.
+
+    The halo is selected in fractional coordinates: along each cell vector the region is
+    extended by halo times the norm of the matching reciprocal vector, which contains every
+    point within halo of the region, and possibly a few more.
+    """
+    device = positions.device
+    dtype = positions.dtype
+    natoms = positions.shape[0]
+
+    pbc = [bool(p) for p in pbc] if pbc is not None else [False, False, False]
+
+    if cell is None:
+        cell = torch.zeros(3, 3, dtype=dtype, device=device)
+
+    full_cell = _complete_cell(torch.as_tensor(cell, dtype=dtype, device=device).view(3, 3), pbc)
+    inverse = torch.linalg.inv(full_cell)
+
+    frac = positions.detach() @ inverse
+    frac = torch.where(torch.tensor(pbc, device=device), frac - torch.floor(frac), frac)
+
+    # fractional width of the halo along each cell vector.
+    width = (halo * inverse.norm(dim=0)).tolist()
+
+    lo, hi = [], []
+    for d in range(3):
+        if pbc[d]:
+            lo.append(0.0)
+            hi.append(1.0)
+        else:
+            lo.append(frac[:, d].min().item() if natoms > 0 else 0.0)
+            hi.append(frac[:, d].max().item() + 1e-9 if natoms > 0 else 1.0)
+
+    bounds = [
+        [lo[d] + (hi[d] - lo[d]) * i / domains[d] for i in range(domains[d] + 1)]
+        for d in range(3)
+    ]
+
+    domain_index = torch.stack(
+        [
+            torch.clamp(
+                torch.floor((frac[:, d] - lo[d]) / (hi[d] - lo[d]) * domains[d]).long(),
+                0,
+                domains[d] - 1,
+            )
+            for d in range(3)
+        ],
+        dim=-1,
+    )
+
+    result = []
+
+    for index in itertools.product(*[range(n) for n in domains]):
+        atoms = torch.arange(natoms, device=device)
+        images = torch.zeros(natoms, 3, dtype=torch.long, device=device)
+
+        # keeps, along each direction in turn, the (atom, image) pairs inside the padded region.
+        for d in range(3):
+            start = bounds[d][index[d]] - width[d]
+            end = bounds[d][index[d] + 1] + width[d]
+
+            reach = int(math.ceil(width[d])) + 1 if pbc[d] else 0
+
+            kept_atoms, kept_images = [], []
+            for k in range(-reach, reach + 1):
+                s = frac[atoms, d] + k
+                keep = (s >= start) & (s < end)
+
+                shifted = images[keep].clone()
+                shifted[:, d] = k
+
+                kept_atoms.append(atoms[keep])
+                kept_images.append(shifted)
+
+            atoms = torch.cat(kept_atoms)
+            images = torch.cat(kept_images)
+
+        owned = (images == 0).all(dim=-1) & (
+            domain_index[atoms] == torch.tensor(index, device=device)
+        ).all(dim=-1)
+
+        result.append(
+            Domain(
+                atoms=atoms,
+                owned=owned,
+                positions=(frac[atoms] + images.to(dtype)) @ full_cell,
+            )
+        )
+
+    return result
+
+
+def evaluate_domain(
+    model: Callable[..., Dict[str, Optional[torch.Tensor]]],
+    domain: Domain,
+    node_attrs: torch.Tensor,
+    r_max: float,
+) -> Dict[str, torch.Tensor]:
+    """
+    Evaluates one domain as an open cluster and returns the energy of its owned atoms,
+    their node energies, and the gradient of that energy with respect to every local atom,
+    halo atoms included.
+    """
+    positions = domain.positions.detach().requires_grad_(True)
+    nlocal = positions.shape[0]
+
+    graph = neighbour_list(positions.detach(), r_max)
+
+    data = {
+        "positions": positions,
+        "node_attrs": node_attrs[domain.atoms],
+        "edge_index": graph["edge_index"],
+        "shifts": graph["shifts"],
+        "unit_shifts": graph["unit_shifts"],
+        "receiver_offsets": graph["receiver_offsets"],
+        "cell": torch.zeros(3, 3, dtype=positions.dtype, device=positions.device),
+        "batch": torch.zeros(nlocal, dtype=torch.long, device=positions.device),
+        "ptr": torch.tensor([0, nlocal], dtype=torch.long, device=positions.device),
+    }
+
+    with torch.enable_grad():
+        outputs = model(data, training=False, compute_force=False)
+
+        node_energy = outputs["node_energy"][domain.owned]
+        energy = node_energy.sum()
+
+        if energy.requires_grad:
+            gradient = torch.autograd.grad(energy, positions)[0]
+        else:
+            gradient = torch.zeros_like(positions)
+
+    return {
+        "energy": energy.detach(),
+        "node_energy": node_energy.detach(),
+        "gradient": gradient,
+    }
+
+
+# per-process model of the worker pool, see _init_worker.
+_WORKER_MODEL = None
+
+
+def _init_worker(metadata, tensors, num_threads):
+    global _WORKER_MODEL
+
+    from cuda_mace.models import OptimizedInvariantMACE
+
+    torch.set_num_threads(num_threads)
+    _WORKER_MODEL = OptimizedInvariantMACE.from_tensors(metadata, tensors)
+
+
+def _evaluate_in_worker(domain: Domain, node_attrs: torch.Tensor, r_max: float):
+    return evaluate_domain(_WORKER_MODEL, domain, node_attrs, r_max)
+
+
+class DomainDecomposition:
+    """
+    Evaluates a system as a set of spatial domains, padded with halo atoms out to the
+    receptive field of the model (num_interactions * r_max), so that the energy of the atoms
+    owned by a domain is exact. Each domain only needs memory for its own atoms and halo.
+
+    Forces are the gradients of the owned energies of each domain with respect to all of
+    its local atoms, accumulated onto the original atoms, which gives the forces of the
+    full system with a halo of a single receptive field. Virials follow from the same
+    gradients and the local positions.
+
+    Domains are evaluated one after the other, or by num_workers processes, each holding
+    its own copy of an OptimizedInvariantMACE rebuilt from the tensors of model.
+
+    example:
+
+        dd = DomainDecomposition(model, domains=(2, 2, 2))
+        out = dd(positions, node_attrs, cell=cell, pbc=(True, True, True))
+        out["energy"], out["forces"]
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        domains: Sequence[int] = (2, 2, 2),
+        receptive_field: Optional[float] = None,
+        num_workers: int = 0,
+        threads_per_worker: int = 1,
+    ):
+        if len(domains) != 3 or any(n < 1 for n in domains):
+            raise ValueError("domains must be three positive integers")
+
+        self.model = model
+        self.domains = tuple(int(n) for n in domains)
+        self.r_max = float(model.r_max)
+
+        if receptive_field is None:
+            receptive_field = int(model.num_interactions) * self.r_max
+
+        self.receptive_field = receptive_field
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            if not hasattr(self.model, "metadata"):
+                raise ValueError("worker processes require an OptimizedInvariantMACE model")
+
+            import torch.multiprocessing as mp
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    self.model.metadata(),
+                    {k: v.detach().cpu() for k, v in self.model.state_dict().items()},
+                    self.threads_per_worker,
+                ),
+            )
+
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def partition(
+        self,
+        positions: torch.Tensor,
+        cell: Optional[torch.Tensor] = None,
+        pbc: Optional[Sequence[bool]] = None,
+    ) -> List[Domain]:
+        return partition(positions, cell, pbc, self.domains, self.receptive_field)
+
+    def _evaluate(self, domains: List[Domain], node_attrs: torch.Tensor) -> List[Dict[str, torch.Tensor]]:
+        if self.num_workers > 0:
+            pool = self._pool()
+            futures = [
+                pool.submit(_evaluate_in_worker, domain, node_attrs, self.r_max)
+                for domain in domains
+            ]
+            return [future.result() for future in futures]
+
+        return [evaluate_domain(self.model, domain, node_attrs, self.r_max) for domain in domains]
+
+    def __call__(
+        self,
+        positions: torch.Tensor,
+        node_attrs: torch.Tensor,
+        cell: Optional[torch.Tensor] = None,
+        pbc: Optional[Sequence[bool]] = None,
+        compute_virials: bool = False,
+        compute_stress: bool = False,
+    ) -> Dict[str, Optional[torch.Tensor]]:
+        """
+        Returns the energy [1], node_energy [natoms] and forces [natoms, 3] of the system,
+        and the virials and stress [1, 3, 3] if requested, in the same layout as
+        OptimizedInvariantMACE.forward.
+        """
+        natoms = positions.shape[0]
+        domains = self.partition(positions, cell, pbc)
+        results = self._evaluate(domains, node_attrs)
+
+        energy = torch.zeros(1, dtype=positions.dtype, device=positions.device)
+        node_energy = torch.zeros(natoms, dtype=positions.dtype, device=positions.device)
+        forces = torch.zeros(natoms, 3, dtype=positions.dtype, device=positions.device)
+        virials = torch.zeros(1, 3, 3, dtype=positions.dtype, device=positions.device)
+
+        for domain, result in zip(domains, results):
+            gradient = result["gradient"].to(positions.dtype)
+
+            energy += result["energy"].to(positions.dtype)
+            node_energy[domain.atoms[domain.owned]] = result["node_energy"].to(positions.dtype)
+            forces.index_add_(0, domain.atoms, -gradient)
+
+            if compute_virials or compute_stress:
+                # the owned energy is translation invariant, so the origin does not matter.
+                w = domain.positions.T @ gradient
+                virials[0] -= 0.5 * (w + w.T)
+
+        stress = None
+        if compute_stress:
+            if cell is None or pbc is None or not all(pbc):
+                raise ValueError("the stress requires a fully periodic cell")
+            volume = torch.linalg.det(torch.as_tensor(cell, dtype=positions.dtype).view(3, 3)).abs()
+            stress = -virials / volume
+
+        return {
+            "energy": energy,
+            "node_energy": node_energy,
+            "forces": forces,
+            "virials": virials if (compute_virials or compute_stress) else None,
+            "stress": stress,
+        }
+
+    def statistics(self, domains: List[Domain]) -> Dict[str, float]:
+        """
+        Sizes of a partition: the largest number of local atoms held by a domain, and the
+        mean ratio of local to owned atoms.
+        """
+        nlocal = [d.atoms.shape[0] for d in domains]
+        nowned = [int(d.owned.sum()) for d in domains]
+
+        return {
+            "num_domains": len(domains),
+            "max_local_atoms": max(nlocal),
+            "mean_halo_ratio": sum(l / max(o, 1) for l, o in zip(nlocal, nowned)) / len(domains),
+        }
@@ -0,0 +1,173 @@
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import torch
+
+from cuda_mace.serving import collate_structures, split_outputs
+
+# per-process model of the worker pool, see _init_worker.
+_WORKER = {}
+
+
+def _init_worker(model: torch.nn.Module, num_threads: int, model_kwargs: Dict[str, Any]):
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    _WORKER["model"] = model
+    _WORKER["model_kwargs"] = model_kwargs
+
+
+def _to_numpy(structure: Dict[str, torch.Tensor]) -> Dict[str, np.ndarray]:
+    # arrays are pickled inline, tensors would each be moved to a shared memory segment.
+    return {k: v.detach().cpu().numpy() for k, v in structure.items()}
+
+
+def _evaluate_chunk(chunk: List[Dict[str, np.ndarray]]) -> List[Dict[str, np.ndarray]]:
+    structures = [{k: torch.from_numpy(v) for k, v in s.items()} for s in chunk]
+
+    data = collate_structures(structures)
+    outputs = _WORKER["model"](data, **_WORKER["model_kwargs"])
+
+    return [_to_numpy(r) for r in split_outputs(outputs, data["ptr"])]
+
+
+def _shared_fraction(_) -> float:
+    """
+    Fraction of the bytes of the worker's model tensors which live in shared memory.
+    """
+    model = _WORKER["model"]
+    tensors = list(model.parameters()) + list(model.buffers())
+    total = sum(t.numel() * t.element_size() for t in tensors)
+    shared = sum(t.numel() * t.element_size() for t in tensors if t.is_shared())
+    return shared / max(total, 1)
+
+
+class ParallelEvaluator:
+    """
+    Evaluates many independent structures on a pool of CPU worker processes. The model is
+    sent to each worker once, when the pool starts: its parameters and buffers are moved to
+    shared memory, so the workers map the same weights rather than holding a copy each.
+    Each worker uses threads_per_worker intra-op threads.
+
+    Structures (dicts in the format of cuda_mace.serving.collate_structures) are sent in
+    chunks of chunk_size, each evaluated as one batched forward pass, and results are
+    returned in input order. Iterators are consumed lazily, with at most max_pending chunks
+    in flight.
+
+    example:
+
+        with ParallelEvaluator(model, num_workers=16) as pool:
+            results = pool.evaluate(structures)
+
+        pool.statistics()["structures_per_second"]
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        num_workers: Optional[int] = None,
+        threads_per_worker: int = 1,
+        chunk_size: int = 1,
+        max_pending: Optional[int] = None,
+        model_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+
+        self.model = model
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending if max_pending is not None else 4 * self.num_workers
+        self.model_kwargs = {"compute_force": True} if model_kwargs is None else model_kwargs
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self.num_structures = 0
+        self.elapsed = 0.0
+
+    def start(self):
+        if self._executor is not None:
+            return
+
+        import torch.multiprocessing as mp
+
+        self.model.share_memory()
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model, self.threads_per_worker, self.model_kwargs),
+        )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def map(self, structures: Iterable[Dict[str, torch.Tensor]]) -> Iterator[Dict[str, torch.Tensor]]:
+        """
+        Yields the outputs of each structure, in input order.
+        """
+        self.start()
+
+        start = perf_counter()
+        iterator = iter(structures)
+        pending = deque()
+
+        def submit() -> bool:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if not chunk:
+                return False
+            pending.append(self._executor.submit(_evaluate_chunk, [_to_numpy(s) for s in chunk]))
+            return True
+
+        while len(pending) < self.max_pending and submit():
+            pass
+
+        while pending:
+            results = pending.popleft().result()
+            submit()
+
+            for result in results:
+                self.num_structures += 1
+                yield {k: torch.from_numpy(v) for k, v in result.items()}
+
+            self.elapsed += perf_counter() - start
+            start = perf_counter()
+
+    def evaluate(self, structures: Iterable[Dict[str, torch.Tensor]]) -> List[Dict[str, torch.Tensor]]:
+        return list(self.map(structures))
+
+    def shared_fraction(self) -> List[float]:
+        """
+        Fraction of the bytes of the model tensors held in shared memory, i.e not copied, as
+        reported by num_workers tasks run on the pool.
+        """
+        self.start()
+        return list(self._executor.map(_shared_fraction, range(self.num_workers)))
+
+    def statistics(self) -> Dict[str, float]:
+        return {
+            "num_workers": self.num_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "num_structures": self.num_structures,
+            "elapsed": self.elapsed,
+            "structures_per_second": self.num_structures / max(self.elapsed, 1e-12),
+        }
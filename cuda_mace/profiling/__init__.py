@@ -0,0 +1,3 @@
+from .profiler import Profiler, profile
+
+__all__ = ['Profiler', 'profile']
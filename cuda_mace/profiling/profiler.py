@@ -0,0 +1,300 @@
+import json
+import threading
+from collections import defaultdict
+from time import perf_counter
+from typing import Any, Dict, List
+
+import torch
+
+try:
+    import nvtx
+except ImportError:
+    nvtx = None
+
+
+def _shapes(value: Any) -> Any:
+    """
+    shapes of the tensors contained in a (possibly nested) argument, None for anything else.
+    """
+    if isinstance(value, torch.Tensor):
+        return list(value.shape)
+    if isinstance(value, (list, tuple)):
+        return [_shapes(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _shapes(v) for k, v in value.items() if isinstance(v, torch.Tensor)}
+    return None
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 0
+
+
+def _is_op(module: torch.nn.Module) -> bool:
+    return type(module).__module__.startswith("cuda_mace.ops")
+
+
+class _Frame:
+    def __init__(self, name: str, phase: str, shapes: Any):
+        self.name = name
+        self.phase = phase
+        self.shapes = shapes
+        self.start = 0.0
+        self.allocated = 0
+        self.peak = 0
+
+
+class Profiler:
+    """
+    Records the wall time, input shapes, output bytes and, on CUDA, the change in allocated
+    memory and peak memory of each forward and backward call of the instrumented modules.
+
+    Modules are instrumented with hooks which only exist between __enter__ and __exit__,
+    so there is no overhead outside of the profiling context. Use cuda_mace.profiling.profile
+    to construct one.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        max_depth: int = 2,
+        synchronize: bool = True,
+        use_nvtx: bool = True,
+    ):
+        self.model = model
+        self.max_depth = max_depth
+        self.use_nvtx = use_nvtx and nvtx is not None
+        self.cuda = synchronize and torch.cuda.is_available()
+
+        self.events: List[Dict[str, Any]] = []
+
+        self._handles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = 0.0
+
+    def modules(self) -> Dict[str, torch.nn.Module]:
+        """
+        modules which are instrumented: the root, its submodules up to max_depth (with
+        ModuleList entries counted as part of their parent), and every cuda_mace.ops module.
+        """
+        selected = {}
+        for name, module in self.model.named_modules():
+            if isinstance(module, torch.nn.ModuleList):
+                continue
+
+            depth = len([p for p in name.split(".") if p and not p.isdigit()])
+
+            if name == "" or depth <= self.max_depth or _is_op(module):
+                selected[name if name else type(module).__name__] = module
+
+        return selected
+
+    def __enter__(self):
+        self.events = []
+        self._origin = perf_counter()
+
+        for name, module in self.modules().items():
+            self._handles.append(
+                module.register_forward_pre_hook(self._forward_pre_hook(name), with_kwargs=True)
+            )
+            self._handles.append(module.register_forward_hook(self._forward_hook(name)))
+            self._handles.append(module.register_full_backward_pre_hook(self._backward_pre_hook(name)))
+            self._handles.append(module.register_full_backward_hook(self._backward_hook(name)))
+
+        return self
+
+    def __exit__(self, *args):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def _stack(self) -> List[_Frame]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _push(self, name: str, phase: str, shapes: Any):
+        stack = self._stack()
+        frame = _Frame(name, phase, shapes)
+
+        if self.cuda:
+            torch.cuda.synchronize()
+            # fold the peak reached so far into the enclosing calls before resetting it.
+            peak = torch.cuda.max_memory_allocated()
+            for f in stack:
+                f.peak = max(f.peak, peak)
+            torch.cuda.reset_peak_memory_stats()
+            frame.allocated = torch.cuda.memory_allocated()
+
+        if self.use_nvtx:
+            nvtx.push_range(message="%s.%s" % (name, phase))
+
+        stack.append(frame)
+        frame.start = perf_counter()
+
+    def _pop(self, name: str, phase: str, outputs: Any):
+        end = perf_counter()
+        stack = self._stack()
+
+        if not stack or stack[-1].name != name or stack[-1].phase != phase:
+            return
+
+        frame = stack.pop()
+
+        if self.use_nvtx:
+            nvtx.pop_range()
+
+        event = {
+            "name": name,
+            "phase": phase,
+            "start": frame.start - self._origin,
+            "duration": end - frame.start,
+            "thread": threading.get_ident(),
+            "shapes": frame.shapes,
+            "output_bytes": _nbytes(outputs),
+        }
+
+        if self.cuda:
+            torch.cuda.synchronize()
+            end = perf_counter()
+            peak = torch.cuda.max_memory_allocated()
+            for f in stack:
+                f.peak = max(f.peak, peak)
+            event["duration"] = end - frame.start
+            event["allocated_bytes"] = torch.cuda.memory_allocated() - frame.allocated
+            event["peak_bytes"] = max(frame.peak, peak)
+
+        with self._lock:
+            self.events.append(event)
+
+    def _forward_pre_hook(self, name):
+        def hook(module, args, kwargs):
+            shapes = _shapes(list(args))
+            if kwargs:
+                shapes = {"args": shapes, "kwargs": {k: _shapes(v) for k, v in kwargs.items()}}
+            self._push(name, "forward", shapes)
+
+        return hook
+
+    def _forward_hook(self, name):
+        def hook(module, args, outputs):
+            self._pop(name, "forward", outputs)
+
+        return hook
+
+    def _backward_pre_hook(self, name):
+        def hook(module, grad_output):
+            self._push(name, "backward", _shapes(list(grad_output)))
+
+        return hook
+
+    def _backward_hook(self, name):
+        def hook(module, grad_input, grad_output):
+            self._pop(name, "backward", grad_input)
+
+        return hook
+
+    def export_chrome_trace(self, path: str):
+        """
+        writes the recorded calls in the Chrome trace event format, which can be opened in
+        chrome://tracing or https://ui.perfetto.dev.
+        """
+        trace = []
+        for event in self.events:
+            args = {k: v for k, v in event.items() if k not in ("name", "phase", "start", "duration", "thread")}
+            trace.append(
+                {
+                    "name": event["name"],
+                    "cat": event["phase"],
+                    "ph": "X",
+                    "ts": event["start"] * 1e6,
+                    "dur": event["duration"] * 1e6,
+                    "pid": 0,
+                    "tid": event["thread"],
+                    "args": args,
+                }
+            )
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+    def summary(self, sort_by: str = "total") -> str:
+        """
+        table of the number of calls, total and mean wall time, and largest peak memory of
+        each (module, phase), sorted by total time.
+        """
+        rows = defaultdict(lambda: {"calls": 0, "total": 0.0, "peak": None, "bytes": 0})
+
+        for event in self.events:
+            row = rows[(event["name"], event["phase"])]
+            row["calls"] += 1
+            row["total"] += event["duration"]
+            row["bytes"] = max(row["bytes"], event["output_bytes"])
+            if "peak_bytes" in event:
+                row["peak"] = max(row["peak"] or 0, event["peak_bytes"])
+
+        key = {"total": lambda r: -r[1]["total"], "name": lambda r: r[0]}[sort_by]
+
+        lines = [
+            "%-40s %-9s %6s %12s %12s %14s %14s"
+            % ("module", "phase", "calls", "total (ms)", "mean (ms)", "output (MB)", "peak (MB)")
+        ]
+        for (name, phase), row in sorted(rows.items(), key=key):
+            lines.append(
+                "%-40s %-9s %6d %12.3f %12.3f %14.3f %14s"
+                % (
+                    name,
+                    phase,
+                    row["calls"],
+                    row["total"] * 1e3,
+                    row["total"] * 1e3 / row["calls"],
+                    row["bytes"] / 2**20,
+                    "%.3f" % (row["peak"] / 2**20) if row["peak"] is not None else "-",
+                )
+            )
+
+        return "\n".join(lines)
+
+
+class _Disabled:
+    events: List[Dict[str, Any]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def export_chrome_trace(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": []}, f)
+
+    def summary(self, sort_by: str = "total") -> str:
+        return ""
+
+
+def profile(model: torch.nn.Module, enabled: bool = True, **kwargs):
+    """
+    Opt-in profiling context for OptimizedInvariantMACE or any cuda_mace.ops module:
+
+        with profile(model) as prof:
+            model(batch, compute_force=True)
+
+        print(prof.summary())
+        prof.export_chrome_trace("trace.json")
+
+    On CUDA, each call is synchronized so that wall times are attributed to the right
+    module, and allocated/peak memory is recorded. On CPU only host timers are used. NVTX
+    ranges are emitted when the nvtx package is available. When enabled is False, nothing
+    is instrumented.
+    """
+    if not enabled:
+        return _Disabled()
+
+    return Profiler(model, **kwargs)
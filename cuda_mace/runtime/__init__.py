@@ -0,0 +1,12 @@
+"""
+Inference-only entry point: loads converted model artifacts and runs them with torch and
+libcuda_mace.so alone. e3nn and mace are only imported by the conversion path
+(cuda_mace.models.OptimizedInvariantMACE(mace_model), tools/model_surgery.py), so importing
+this module does not pull them in.
+"""
+from cuda_mace.models.artifact import load_artifact as load
+from cuda_mace.models.artifact import read_artifact
+from cuda_mace.models.InvariantMACE import OptimizedInvariantMACE
+from cuda_mace.neighbours import neighbour_list
+
+__all__ = ['load', 'read_artifact', 'OptimizedInvariantMACE', 'neighbour_list']
@@ -0,0 +1,3 @@
+from .batching import BatchingEngine, collate_structures, split_outputs
+
+__all__ = ['BatchingEngine', 'collate_structures', 'split_outputs']
@@ -0,0 +1,313 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import torch
+
+# outputs of OptimizedInvariantMACE.forward which are indexed per graph, and per atom.
+GRAPH_OUTPUTS = ("energy", "interaction_energy", "virials", "stress")
+NODE_OUTPUTS = ("node_energy", "forces")
+
+
+def collate_structures(
+    structures: Sequence[Dict[str, torch.Tensor]], device: Optional[torch.device] = None
+) -> Dict[str, torch.Tensor]:
+    """
+    Packs independent structures into a single disjoint graph in the layout expected by
+    OptimizedInvariantMACE, i.e concatenated atoms and edges, edge_index offset by the
+    number of preceding atoms, and the matching ptr/batch tensors.
+
+    Each structure is a dict containing "positions" [natoms, 3], "node_attrs"
+    [natoms, nelements], "edge_index" [2, nedges] and "shifts" [nedges, 3], and optionally
+    "unit_shifts" [nedges, 3] and "cell" [3, 3].
+    """
+    natoms = [s["positions"].shape[0] for s in structures]
+
+    ptr = torch.zeros(len(structures) + 1, dtype=torch.long)
+    ptr[1:] = torch.cumsum(torch.tensor(natoms, dtype=torch.long), dim=0)
+
+    edge_index = torch.cat(
+        [s["edge_index"].long() + ptr[i] for i, s in enumerate(structures)], dim=1
+    )
+
+    batch = torch.repeat_interleave(
+        torch.arange(len(structures)), torch.tensor(natoms, dtype=torch.long)
+    )
+
+    positions = torch.cat([s["positions"] for s in structures], dim=0)
+    shifts = torch.cat([s["shifts"] for s in structures], dim=0)
+
+    data = {
+        "positions": positions,
+        "node_attrs": torch.cat([s["node_attrs"] for s in structures], dim=0),
+        "edge_index": edge_index,
+        "shifts": shifts,
+        "unit_shifts": torch.cat(
+            [s.get("unit_shifts", torch.zeros_like(s["shifts"])) for s in structures], dim=0
+        ),
+        "cell": torch.cat(
+            [
+                s.get("cell", torch.zeros(3, 3, dtype=positions.dtype)).view(3, 3)
+                for s in structures
+            ],
+            dim=0,
+        ),
+        "batch": batch,
+        "ptr": ptr,
+    }
+
+    if device is not None:
+        data = {k: v.to(device) for k, v in data.items()}
+
+    return data
+
+
+def split_outputs(
+    outputs: Dict[str, Optional[torch.Tensor]], ptr: torch.Tensor
+) -> List[Dict[str, torch.Tensor]]:
+    """
+    Inverse of collate_structures for model outputs: returns one dict per structure,
+    containing the per-graph and per-atom outputs that were computed.
+    """
+    ptr = ptr.tolist()
+    results = [{} for _ in range(len(ptr) - 1)]
+
+    for key in GRAPH_OUTPUTS:
+        value = outputs.get(key)
+        if value is not None:
+            value = value.detach()
+            for i in range(len(results)):
+                results[i][key] = value[i]
+
+    for key in NODE_OUTPUTS:
+        value = outputs.get(key)
+        if value is not None:
+            value = value.detach()
+            for i in range(len(results)):
+                results[i][key] = value[ptr[i] : ptr[i + 1]]
+
+    return results
+
+
+class _Request:
+    def __init__(self, structure: Dict[str, torch.Tensor], future: asyncio.Future, arrival: float):
+        self.structure = structure
+        self.future = future
+        self.arrival = arrival
+        self.natoms = structure["positions"].shape[0]
+        self.nedges = structure["edge_index"].shape[1]
+
+
+_STOP = object()
+
+
+class BatchingEngine:
+    """
+    In-process dynamic batching around a MACE model. Structures submitted through the
+    async submit() method are packed into a single disjoint-graph batch, up to max_atoms
+    and max_edges, or until the oldest queued structure has waited max_wait seconds. A
+    single forward pass is then evaluated on a worker thread, and energies and forces are
+    returned to each caller.
+
+    A structure that exceeds the budgets on its own is evaluated in a batch of one.
+
+    example:
+
+        async with BatchingEngine(model, max_atoms=4096, max_wait=2e-3) as engine:
+            results = await asyncio.gather(*[engine.submit(s) for s in structures])
+    """
+
+    def __init__(
+        self,
+        model: Callable[..., Dict[str, Optional[torch.Tensor]]],
+        max_atoms: int = 4096,
+        max_edges: Optional[int] = None,
+        max_wait: float = 2e-3,
+        device: Optional[torch.device] = None,
+        model_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        if max_atoms <= 0 or (max_edges is not None and max_edges <= 0):
+            raise ValueError("max_atoms and max_edges must be positive")
+
+        self.model = model
+        self.max_atoms = max_atoms
+        self.max_edges = max_edges
+        self.max_wait = max_wait
+        self.device = device
+        self.model_kwargs = {"compute_force": True} if model_kwargs is None else model_kwargs
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._carry: Optional[_Request] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stopping = False
+        self._num_pending = 0
+
+        self.num_batches = 0
+        self.num_structures = 0
+        self.max_queue_depth = 0
+        self.last_fill_ratio = 0.0
+        self._total_fill_ratio = 0.0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    def start(self):
+        if self._task is not None:
+            raise RuntimeError("BatchingEngine is already running")
+
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._serve())
+
+    async def stop(self):
+        """
+        Evaluates all structures submitted so far, then shuts the engine down.
+        """
+        if self._task is None:
+            return
+
+        self._stopping = True
+        self._queue.put_nowait(_STOP)
+
+        try:
+            await self._task
+        finally:
+            self._executor.shutdown(wait=True)
+            self._task = None
+            self._executor = None
+
+    async def submit(self, structure: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        """
+        Queues a single structure (see collate_structures for the expected keys), and
+        returns its outputs once the batch it was assigned to has been evaluated.
+        """
+        if self._task is None or self._stopping:
+            raise RuntimeError("BatchingEngine is not running")
+
+        loop = asyncio.get_running_loop()
+        request = _Request(structure, loop.create_future(), loop.time())
+
+        self._queue.put_nowait(request)
+        self._num_pending += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        return await request.future
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        number of structures waiting to be assigned to a batch.
+        """
+        return self._num_pending
+
+    @property
+    def mean_fill_ratio(self) -> float:
+        return self._total_fill_ratio / max(self.num_batches, 1)
+
+    def statistics(self) -> Dict[str, float]:
+        return {
+            "num_batches": self.num_batches,
+            "num_structures": self.num_structures,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "last_fill_ratio": self.last_fill_ratio,
+            "mean_fill_ratio": self.mean_fill_ratio,
+            "mean_batch_size": self.num_structures / max(self.num_batches, 1),
+        }
+
+    def _fits(self, natoms: int, nedges: int) -> bool:
+        return natoms <= self.max_atoms and (self.max_edges is None or nedges <= self.max_edges)
+
+    def _fill_ratio(self, natoms: int, nedges: int) -> float:
+        ratio = natoms / self.max_atoms
+        if self.max_edges is not None:
+            ratio = max(ratio, nedges / self.max_edges)
+        return ratio
+
+    async def _next(self, timeout: float):
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+
+        if timeout <= 0.0:
+            return None
+
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            request = self._carry if self._carry is not None else await self._queue.get()
+            self._carry = None
+
+            if request is _STOP:
+                break
+
+            batch = [request]
+            natoms, nedges = request.natoms, request.nedges
+            deadline = request.arrival + self.max_wait
+            stop = False
+
+            while self._fits(natoms, nedges):
+                request = await self._next(deadline - loop.time())
+
+                if request is None:
+                    break
+
+                if request is _STOP:
+                    stop = True
+                    break
+
+                if not self._fits(natoms + request.natoms, nedges + request.nedges):
+                    self._carry = request
+                    break
+
+                batch.append(request)
+                natoms += request.natoms
+                nedges += request.nedges
+
+            self._num_pending -= len(batch)
+            self.num_batches += 1
+            self.num_structures += len(batch)
+            self.last_fill_ratio = self._fill_ratio(natoms, nedges)
+            self._total_fill_ratio += self.last_fill_ratio
+
+            await self._evaluate(batch)
+
+            if stop:
+                break
+
+    def _forward(self, structures: List[Dict[str, torch.Tensor]]) -> List[Dict[str, torch.Tensor]]:
+        data = collate_structures(structures, self.device)
+        outputs = self.model(data, **self.model_kwargs)
+        return split_outputs(outputs, data["ptr"])
+
+    async def _evaluate(self, batch: List[_Request]):
+        loop = asyncio.get_running_loop()
+
+        try:
+            results = await loop.run_in_executor(
+                self._executor, self._forward, [r.structure for r in batch]
+            )
+        except Exception as e:
+            for r in batch:
+                if not r.future.done():
+                    r.future.set_exception(e)
+            return
+
+        for r, result in zip(batch, results):
+            if not r.future.done():
+                r.future.set_result(result)
@@ -1,5 +1,6 @@
 #include "cubic_spline.h"
 #include "cubic_spline_wrapper.hpp"
+#include "cubic_spline_cpu.hpp"
 
 #include <iostream>
 #include <torch/script.h>
@@ -15,7 +16,8 @@ torch::Tensor CubicSplineAutograd::forward(AutogradContext *ctx,
                                            torch::Tensor coeffs, double r_width,
                                            double r_max) {
 
-  auto result = jit_evaluate_spline(r, r_knots, coeffs, r_width, r_max);
+  auto result = r.is_cuda() ? jit_evaluate_spline(r, r_knots, coeffs, r_width, r_max)
+                            : cpu_evaluate_spline(r, r_knots, coeffs, r_width, r_max);
 
   if (r.requires_grad()) {
     ctx->save_for_backward({result[1]});
@@ -30,7 +32,37 @@ variable_list CubicSplineAutograd::backward(AutogradContext *ctx,
 
   torch::Tensor R_deriv = saved_variables[0];
 
-  torch::Tensor result = jit_backward_spline(grad_outputs[0].contiguous(), R_deriv);
+  torch::Tensor result = R_deriv.is_cuda() ? jit_backward_spline(grad_outputs[0].contiguous(), R_deriv)
+                                           : cpu_backward_spline(grad_outputs[0], R_deriv);
+
+  torch::Tensor undef;
+
+  return {result, undef, undef, undef, undef};
+}
+
+torch::Tensor MultiCubicSplineAutograd::forward(AutogradContext *ctx,
+                                                torch::Tensor r,
+                                                torch::Tensor r_knots,
+                                                torch::Tensor coeffs,
+                                                double r_width, double r_max) {
+
+  auto result = r.is_cuda() ? jit_evaluate_multi_spline(r, r_knots, coeffs, r_width, r_max)
+                            : cpu_evaluate_multi_spline(r, r_knots, coeffs, r_width, r_max);
+
+  if (r.requires_grad()) {
+    ctx->save_for_backward({result[1]});
+  }
+
+  return result[0];
+}
+
+variable_list MultiCubicSplineAutograd::backward(AutogradContext *ctx,
+                                                 variable_list grad_outputs) {
+  auto saved_variables = ctx->get_saved_variables();
+
+  torch::Tensor R_deriv = saved_variables[0]; // [ntables, nsamples, noutputs]
+
+  torch::Tensor result = (grad_outputs[0] * R_deriv).sum({0, 2});
 
   torch::Tensor undef;
 
@@ -44,6 +76,12 @@ torch::Tensor CubicSpline::forward(torch::Tensor r, torch::Tensor r_knots,
   return CubicSplineAutograd::apply(r, r_knots, coeffs, r_width, r_max);
 }
 
+torch::Tensor MultiCubicSpline::forward(torch::Tensor r, torch::Tensor r_knots,
+                                        torch::Tensor coeffs, double r_width,
+                                        double r_max) {
+  return MultiCubicSplineAutograd::apply(r, r_knots, coeffs, r_width, r_max);
+}
+
 TORCH_LIBRARY(cubic_spline, m) {
   m.class_<CubicSpline>("CubicSpline")
       .def(torch::init<>(), "", {})
@@ -58,4 +96,18 @@ TORCH_LIBRARY(cubic_spline, m) {
             obj->__setstate__(state);
             return obj;
           });
+
+  m.class_<MultiCubicSpline>("MultiCubicSpline")
+      .def(torch::init<>(), "", {})
+
+      .def("forward", &MultiCubicSpline::forward)
+      .def_pickle(
+          [](const c10::intrusive_ptr<MultiCubicSpline> &self)
+              -> std::vector<torch::Tensor> { return self->__getstate__(); },
+          [](const std::vector<torch::Tensor> &state)
+              -> c10::intrusive_ptr<MultiCubicSpline> {
+            auto obj = c10::make_intrusive<MultiCubicSpline>();
+            obj->__setstate__(state);
+            return obj;
+          });
 }
\ No newline at end of file
@@ -1,5 +1,6 @@
 #include "invariant_message_passing_wrapper.hpp"
 #include "invariant_message_passing.h"
+#include "invariant_message_passing_cpu.hpp"
 
 #include <torch/script.h>
 #include <iostream>
@@ -15,17 +16,43 @@ torch::Tensor InvariantMessagePassingTPAutograd::forward(
     torch::Tensor radial,
     torch::Tensor sender_list,
     torch::Tensor receiver_list,
+    torch::Tensor first_occurences,
+    torch::Tensor sender_sort_idx,
+    torch::Tensor sender_first_occurences,
     const int64_t nnodes)
 {
-    torch::Tensor first_occurences = jit_calculate_first_occurences(receiver_list, nnodes);
+    const bool use_cuda = X.is_cuda();
+    const bool requires_grad = X.requires_grad() || Y.requires_grad() || radial.requires_grad();
+
+    // the kernels index the features through raw pointers. Copies made here do not
+    // require grad, so requires_grad is taken from the inputs beforehand.
+    X = X.contiguous();
+    Y = Y.contiguous();
+    radial = radial.contiguous();
+
+    // offsets which have not been precomputed by the caller are passed as empty tensors.
+    if (first_occurences.numel() != 2 * nnodes)
+    {
+        first_occurences = calculate_first_occurences(receiver_list, nnodes);
+    }
 
     //auto result  = forward_gpu(X, Y, radial, sender_list, receiver_list, first_occurences, nnodes);
-    std::vector<torch::Tensor> result = jit_forward_message_passing(X, Y, radial, sender_list, receiver_list, first_occurences, nnodes);
+    std::vector<torch::Tensor> result = use_cuda ? jit_forward_message_passing(X, Y, radial, sender_list, receiver_list, first_occurences, nnodes)
+                                                 : cpu_forward_message_passing(X, Y, radial, sender_list, receiver_list, first_occurences, nnodes);
     
-    if (X.requires_grad() || Y.requires_grad() || radial.requires_grad())
+    if (requires_grad)
     {
+        // edges permuted into sender order, used by the backward pass to
+        // accumulate gradX without atomics. Scales with nedges, not nnodes^2.
+        if (sender_sort_idx.numel() != sender_list.numel() || sender_first_occurences.numel() != 2 * nnodes)
+        {
+            std::vector<torch::Tensor> sender_ordering = calculate_sender_ordering(sender_list, nnodes);
+            sender_sort_idx = sender_ordering[0];
+            sender_first_occurences = sender_ordering[1];
+        }
+
         ctx->saved_data["nnodes"] = nnodes;
-        ctx->save_for_backward({X, Y, radial, sender_list, receiver_list, first_occurences, result[1]});
+        ctx->save_for_backward({X, Y, radial, sender_list, receiver_list, first_occurences, sender_sort_idx, sender_first_occurences});
     }
     
     return result[0];
@@ -42,16 +69,43 @@ variable_list InvariantMessagePassingTPAutograd::backward(AutogradContext *ctx,
     auto sender_list = saved_variables[3];
     auto receiver_list = saved_variables[4];
     auto first_occurences = saved_variables[5];
-    auto node_edge_index = saved_variables[6];
+    auto sender_sort_idx = saved_variables[6];
+    auto sender_first_occurences = saved_variables[7];
 
     int64_t nnodes = ctx->saved_data["nnodes"].toInt();
 
-    //auto result = backward_gpu(X, Y, radial, grad_outputs[0], sender_list, receiver_list, first_occurences, node_edge_index, nnodes);
-    std::vector<torch::Tensor> result = jit_backward_message_passing(X, Y, radial, grad_outputs[0], sender_list, receiver_list, first_occurences, node_edge_index, nnodes);
+    std::vector<torch::Tensor> result;
+
+    if (X.is_cuda())
+    {
+        result = jit_backward_message_passing(X, Y, radial, grad_outputs[0].contiguous(), sender_list, receiver_list, first_occurences, sender_sort_idx, sender_first_occurences, nnodes);
+    }
+    else
+    {
+        result = cpu_backward_message_passing(X, Y, radial, grad_outputs[0].contiguous(), sender_list, receiver_list, first_occurences, sender_sort_idx, sender_first_occurences, nnodes);
+    }
 
     torch::Tensor undef;
 
-    return {result[0], result[1], result[2], undef, undef, undef};
+    return {result[0], result[1], result[2], undef, undef, undef, undef, undef, undef};
+}
+
+torch::Tensor calculate_first_occurences(torch::Tensor receiver_list, const int64_t nnodes)
+{
+    return receiver_list.is_cuda() ? jit_calculate_first_occurences(receiver_list, nnodes)
+                                   : cpu_calculate_first_occurences(receiver_list, nnodes);
+}
+
+std::vector<torch::Tensor> calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes)
+{
+    return sender_list.is_cuda() ? jit_calculate_sender_ordering(sender_list, nnodes)
+                                 : cpu_calculate_sender_ordering(sender_list, nnodes);
+}
+
+std::vector<torch::Tensor> sort_edges_by_receiver(torch::Tensor edge_index, std::vector<torch::Tensor> edge_data, const int64_t nnodes, const bool validate)
+{
+    return edge_index.is_cuda() ? jit_sort_edges_by_receiver(edge_index, edge_data, nnodes, validate)
+                                : cpu_sort_edges_by_receiver(edge_index, edge_data, nnodes, validate);
 }
 
 // wrapper class which we expose to the API.
@@ -63,7 +117,38 @@ torch::Tensor InvariantMessagePassingTP::forward(
     torch::Tensor receiver_list,
     const int64_t nnodes)
 {
-    return InvariantMessagePassingTPAutograd::apply(X, Y, radial, sender_list, receiver_list, nnodes);
+    torch::Tensor empty = torch::empty({0}, sender_list.options());
+
+    return InvariantMessagePassingTPAutograd::apply(X, Y, radial, sender_list, receiver_list, empty, empty, empty, nnodes);
+}
+
+torch::Tensor InvariantMessagePassingTP::forward_precomputed(
+    torch::Tensor X,
+    torch::Tensor Y,
+    torch::Tensor radial,
+    torch::Tensor sender_list,
+    torch::Tensor receiver_list,
+    torch::Tensor first_occurences,
+    torch::Tensor sender_sort_idx,
+    torch::Tensor sender_first_occurences,
+    const int64_t nnodes)
+{
+    return InvariantMessagePassingTPAutograd::apply(X, Y, radial, sender_list, receiver_list, first_occurences, sender_sort_idx, sender_first_occurences, nnodes);
+}
+
+torch::Tensor InvariantMessagePassingTP::calculate_first_occurences(torch::Tensor receiver_list, const int64_t nnodes)
+{
+    return ::calculate_first_occurences(receiver_list, nnodes);
+}
+
+std::vector<torch::Tensor> InvariantMessagePassingTP::calculate_sender_ordering(torch::Tensor sender_list, const int64_t nnodes)
+{
+    return ::calculate_sender_ordering(sender_list, nnodes);
+}
+
+std::vector<torch::Tensor> InvariantMessagePassingTP::sort_edges_by_receiver(torch::Tensor edge_index, std::vector<torch::Tensor> edge_data, const int64_t nnodes, const bool validate)
+{
+    return ::sort_edges_by_receiver(edge_index, edge_data, nnodes, validate);
 }
 
 TORCH_LIBRARY(inv_message_passing, m)
@@ -72,6 +157,10 @@ TORCH_LIBRARY(inv_message_passing, m)
         .def(torch::init<>(), "", {})
 
         .def("forward", &InvariantMessagePassingTP::forward, "", {torch::arg("X"), torch::arg("Y"), torch::arg("raidal"), torch::arg("sender_list"), torch::arg("receiver_list"), torch::arg("nnodes")})
+        .def("forward_precomputed", &InvariantMessagePassingTP::forward_precomputed, "", {torch::arg("X"), torch::arg("Y"), torch::arg("radial"), torch::arg("sender_list"), torch::arg("receiver_list"), torch::arg("first_occurences"), torch::arg("sender_sort_idx"), torch::arg("sender_first_occurences"), torch::arg("nnodes")})
+        .def("calculate_first_occurences", &InvariantMessagePassingTP::calculate_first_occurences, "", {torch::arg("receiver_list"), torch::arg("nnodes")})
+        .def("calculate_sender_ordering", &InvariantMessagePassingTP::calculate_sender_ordering, "", {torch::arg("sender_list"), torch::arg("nnodes")})
+        .def("sort_edges_by_receiver", &InvariantMessagePassingTP::sort_edges_by_receiver, "", {torch::arg("edge_index"), torch::arg("edge_data"), torch::arg("nnodes"), torch::arg("validate")})
         .def_pickle(
             [](const c10::intrusive_ptr<InvariantMessagePassingTP> &self) -> std::vector<torch::Tensor>
             {
@@ -1,5 +1,8 @@
 #include "linear.h"
 #include "linear_wrapper.hpp"
+#include "linear_cpu.hpp"
+
+#include <cmath>
 
 using namespace std;
 using namespace torch::autograd;
@@ -16,7 +19,8 @@ torch::Tensor LinearAutograd::forward(
         ctx->save_for_backward({W_transposed});
     }
 
-    torch::Tensor result = jit_linear(X, W);
+    torch::Tensor result = X.is_cuda() ? jit_linear(X, W)
+                                       : cpu_linear(X, W, 1.0 / std::sqrt((double)W.size(1)));
 
     return result;
 }
@@ -27,7 +31,8 @@ variable_list LinearAutograd::backward(AutogradContext *ctx, variable_list grad_
 
     auto W_T = saved_variables[0];
 
-    torch::Tensor dX = jit_linear(grad_outputs[0].contiguous(), W_T);
+    torch::Tensor dX = W_T.is_cuda() ? jit_linear(grad_outputs[0].contiguous(), W_T)
+                                     : cpu_linear(grad_outputs[0], W_T, 1.0 / std::sqrt((double)W_T.size(2)));
 
     torch::Tensor undef;
 
@@ -48,15 +53,19 @@ torch::Tensor ElementalLinearAutograd::forward(
     torch::Tensor X,
     torch::Tensor W,
     torch::Tensor W_transposed,
-    torch::Tensor one_hot_embedding)
+    torch::Tensor one_hot_embedding,
+    torch::Tensor node_ordering,
+    torch::Tensor element_offsets)
 {
 
     if (X.requires_grad())
     {
-        ctx->save_for_backward({one_hot_embedding, W_transposed});
+        ctx->save_for_backward({one_hot_embedding, W_transposed, node_ordering, element_offsets});
     }
 
-    torch::Tensor result = jit_elemental_linear(X, W, one_hot_embedding);
+    torch::Tensor result = X.is_cuda() ? jit_elemental_linear(X, W, one_hot_embedding)
+                                       : cpu_elemental_linear(X, W, node_ordering, element_offsets,
+                                                              1.0 / std::sqrt((double)W.size(2)));
 
     return result;
 }
@@ -68,11 +77,41 @@ variable_list ElementalLinearAutograd::backward(AutogradContext *ctx, variable_l
     auto one_hot_embedding = saved_variables[0];
     auto W_T = saved_variables[1];
 
-    torch::Tensor dX = jit_elemental_linear(grad_outputs[0].contiguous(), W_T, one_hot_embedding);
+    torch::Tensor dX;
+
+    if (W_T.is_cuda())
+    {
+        dX = jit_elemental_linear(grad_outputs[0].contiguous(), W_T, one_hot_embedding);
+    }
+    else
+    {
+        dX = cpu_elemental_linear(grad_outputs[0], W_T, saved_variables[2], saved_variables[3],
+                                  1.0 / std::sqrt((double)W_T.size(3)));
+    }
 
     torch::Tensor undef;
 
-    return {dX, undef, undef, undef};
+    return {dX, undef, undef, undef, undef, undef};
+}
+
+std::vector<torch::Tensor> ElementalLinear::element_ordering(torch::Tensor one_hot_embedding)
+{
+    // inference tensors have no version counter, and an ordering computed in inference mode
+    // could not be saved for backward by later calls, so neither is cached.
+    if (one_hot_embedding.is_inference() || c10::InferenceMode::is_enabled())
+    {
+        return cpu_element_ordering(one_hot_embedding);
+    }
+
+    if (!cached_one_hot_embedding.defined() || !cached_one_hot_embedding.is_same(one_hot_embedding) ||
+        cached_version != one_hot_embedding._version())
+    {
+        cached_ordering = cpu_element_ordering(one_hot_embedding);
+        cached_one_hot_embedding = one_hot_embedding;
+        cached_version = one_hot_embedding._version();
+    }
+
+    return cached_ordering;
 }
 
 // wrapper class which we expose to the API.
@@ -82,7 +121,15 @@ torch::Tensor ElementalLinear::forward(
     torch::Tensor W_transposed,
     torch::Tensor one_hot_embedding)
 {
-    return ElementalLinearAutograd::apply(X, W, W_transposed, one_hot_embedding);
+    if (X.is_cuda())
+    {
+        torch::Tensor undef;
+        return ElementalLinearAutograd::apply(X, W, W_transposed, one_hot_embedding, undef, undef);
+    }
+
+    auto ordering = element_ordering(one_hot_embedding);
+
+    return ElementalLinearAutograd::apply(X, W, W_transposed, one_hot_embedding, ordering[0], ordering[1]);
 }
 
 TORCH_LIBRARY(linear_wmma, m)
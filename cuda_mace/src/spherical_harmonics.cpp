@@ -1,5 +1,6 @@
 #include "spherical_harmonics.h"
 #include "spherical_harmonics_wrapper.hpp"
+#include "spherical_harmonics_cpu.hpp"
 
 #include <torch/script.h>
 #include <iostream>
@@ -12,7 +13,8 @@ torch::Tensor SphericalHarmonicsAutograd::forward(
         AutogradContext *ctx,
         torch::Tensor xyz)
 {
-    auto result = jit_spherical_harmonics(xyz);
+    auto result = xyz.is_cuda() ? jit_spherical_harmonics(xyz)
+                                : cpu_spherical_harmonics(xyz, xyz.requires_grad());
 
     if (xyz.requires_grad())
     {
@@ -28,7 +30,8 @@ variable_list SphericalHarmonicsAutograd::backward(AutogradContext *ctx, variabl
 
     torch::Tensor sph_deriv = saved_variables[0];
     
-    torch::Tensor result = jit_spherical_harmonics_backward(sph_deriv, grad_outputs[0].contiguous());
+    torch::Tensor result = sph_deriv.is_cuda() ? jit_spherical_harmonics_backward(sph_deriv, grad_outputs[0].contiguous())
+                                               : cpu_spherical_harmonics_backward(sph_deriv, grad_outputs[0]);
     
     return {result};
 }
@@ -1,5 +1,7 @@
 #include "symmetric_contraction_wrapper.hpp"
 #include "symmetric_contraction.h"
+#include "symmetric_contraction_cpu.hpp"
+
 #include <torch/script.h>
 #include <iostream>
 
@@ -30,7 +32,9 @@ torch::Tensor SymmetricContractionAutograd::forward(
 
     std::vector<torch::Tensor> result;
 
-    result = jit_symmetric_contraction_forward(
+    auto forward_impl = X.is_cuda() ? jit_symmetric_contraction_forward : cpu_symmetric_contraction_forward;
+
+    result = forward_impl(
         X,
         atom_types,
         U3_max_nonsparse,
@@ -64,7 +68,8 @@ variable_list SymmetricContractionAutograd::backward(AutogradContext *ctx, varia
 
     auto gradX = saved_variables[0];
 
-    torch::Tensor result = jit_symmetric_contraction_backward(gradX, grad_outputs[0]);
+    torch::Tensor result = gradX.is_cuda() ? jit_symmetric_contraction_backward(gradX, grad_outputs[0])
+                                           : cpu_symmetric_contraction_backward(gradX, grad_outputs[0].contiguous());
 
     torch::Tensor undef;
 
@@ -91,9 +96,11 @@ torch::Tensor SymmetricContraction::forward(
     const int64_t W2_size,
     const int64_t W1_size)
 {
+    // the kernels index X through raw pointers. The copy is made here, outside the autograd
+    // function, so that it is recorded by autograd and still requires grad.
     return SymmetricContractionAutograd::apply(
-        X,
-        atom_types,
+        X.contiguous(),
+        atom_types.contiguous(),
         U3_max_nonsparse,
         U3_num_nonzero,
         U3_indices,
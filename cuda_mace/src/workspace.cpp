@@ -0,0 +1,160 @@
+#include "workspace.h"
+
+#include <torch/script.h>
+
+using namespace std;
+
+namespace
+{
+    std::mutex active_mutex;
+    c10::intrusive_ptr<Workspace> active_workspace;
+}
+
+Workspace::Workspace(const int64_t buckets_per_octave) : buckets_per_octave(buckets_per_octave)
+{
+    TORCH_CHECK(buckets_per_octave > 0, "buckets_per_octave must be positive");
+}
+
+int64_t Workspace::bucket_size(const int64_t numel) const
+{
+    // smallest buffers share a single bucket.
+    int64_t size = std::max<int64_t>(numel, 256);
+
+    int64_t octave = int64_t(1) << (63 - __builtin_clzll((uint64_t)size));
+    int64_t step = std::max<int64_t>(octave / buckets_per_octave, 1);
+
+    return ((size + step - 1) / step) * step;
+}
+
+torch::Tensor Workspace::empty(at::IntArrayRef sizes, const torch::TensorOptions &options)
+{
+    int64_t numel = c10::multiply_integers(sizes);
+
+    if (numel == 0)
+    {
+        return torch::empty(sizes, options);
+    }
+
+    int64_t capacity = bucket_size(numel);
+    auto device = options.device();
+
+    Key key = std::make_tuple(
+        (int)device.type(), (int)device.index(), (int)c10::typeMetaToScalarType(options.dtype()), capacity);
+
+    std::lock_guard<std::mutex> guard(mutex);
+
+    std::vector<torch::Tensor> &bucket = buffers[key];
+
+    for (torch::Tensor &buffer : bucket)
+    {
+        // the pool holds the only reference, nothing can still read or write the buffer.
+        if (buffer.storage().use_count() == 1)
+        {
+            num_reuses++;
+            return buffer.narrow(0, 0, numel).view(sizes);
+        }
+    }
+
+    torch::Tensor buffer = torch::empty({capacity}, options);
+    bucket.push_back(buffer);
+
+    num_allocations++;
+    reserved_bytes += capacity * buffer.element_size();
+
+    return buffer.narrow(0, 0, numel).view(sizes);
+}
+
+void Workspace::activate()
+{
+    std::lock_guard<std::mutex> guard(active_mutex);
+
+    if (active_workspace.get() == this)
+    {
+        return;
+    }
+
+    previous = active_workspace;
+    active_workspace = c10::intrusive_ptr<Workspace>::reclaim_copy(this);
+}
+
+void Workspace::deactivate()
+{
+    std::lock_guard<std::mutex> guard(active_mutex);
+
+    if (active_workspace.get() == this)
+    {
+        active_workspace = previous;
+        previous.reset();
+    }
+}
+
+void Workspace::clear()
+{
+    std::lock_guard<std::mutex> guard(mutex);
+
+    for (auto &item : buffers)
+    {
+        std::vector<torch::Tensor> kept;
+
+        for (torch::Tensor &buffer : item.second)
+        {
+            if (buffer.storage().use_count() == 1)
+            {
+                reserved_bytes -= buffer.numel() * buffer.element_size();
+            }
+            else
+            {
+                kept.push_back(buffer);
+            }
+        }
+
+        item.second = kept;
+    }
+}
+
+c10::Dict<std::string, int64_t> Workspace::statistics()
+{
+    std::lock_guard<std::mutex> guard(mutex);
+
+    int64_t num_buffers = 0;
+    for (auto &item : buffers)
+    {
+        num_buffers += item.second.size();
+    }
+
+    c10::Dict<std::string, int64_t> result;
+    result.insert("num_allocations", num_allocations);
+    result.insert("num_avoided_allocations", num_reuses);
+    result.insert("num_buffers", num_buffers);
+    result.insert("reserved_bytes", reserved_bytes);
+
+    return result;
+}
+
+torch::Tensor workspace_empty(at::IntArrayRef sizes, const torch::TensorOptions &options)
+{
+    c10::intrusive_ptr<Workspace> workspace;
+    {
+        std::lock_guard<std::mutex> guard(active_mutex);
+        workspace = active_workspace;
+    }
+
+    if (!workspace)
+    {
+        return torch::empty(sizes, options);
+    }
+
+    return workspace->empty(sizes, options);
+}
+
+TORCH_LIBRARY(workspace, m)
+{
+    m.class_<Workspace>("Workspace")
+        .def(torch::init<int64_t>(), "", {torch::arg("buckets_per_octave") = 4})
+
+        .def("activate", &Workspace::activate)
+        .def("deactivate", &Workspace::deactivate)
+        .def("clear", &Workspace::clear)
+        .def("statistics", &Workspace::statistics)
+        .def("bucket_size", &Workspace::bucket_size);
+}
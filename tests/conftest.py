@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import torch
+
+
+@pytest.fixture(scope="session")
+def mace_model():
+    pytest.importorskip("mace")
+    from e3nn import o3
+    from mace import modules
+
+    torch.manual_seed(0)
+
+    return modules.ScaleShiftMACE(
+        r_max=5.0,
+        num_bessel=8,
+        num_polynomial_cutoff=5,
+        max_ell=3,
+        interaction_cls=modules.interaction_classes["RealAgnosticResidualInteractionBlock"],
+        interaction_cls_first=modules.interaction_classes["RealAgnosticInteractionBlock"],
+        num_interactions=2,
+        num_elements=3,
+        hidden_irreps=o3.Irreps("16x0e"),
+        MLP_irreps=o3.Irreps("16x0e"),
+        atomic_energies=np.array([-1.0, -3.0, -5.0]),
+        avg_num_neighbors=20.0,
+        atomic_numbers=[1, 6, 8],
+        correlation=3,
+        gate=torch.nn.functional.silu,
+        atomic_inter_scale=1.3,
+        atomic_inter_shift=0.1,
+    ).double()
+
+
+@pytest.fixture(scope="session")
+def batch(mace_model):
+    """
+    A periodic box of 40 random H, C and O atoms, as the float64 dict of a MACE batch.
+    """
+    from ase import Atoms
+    from mace import data, tools
+    from mace.tools import torch_geometric
+
+    rng = np.random.default_rng(0)
+    natoms = 40
+    length = (natoms / 0.08) ** (1 / 3)
+    atoms = Atoms(
+        numbers=rng.choice([1, 6, 8], natoms),
+        positions=rng.random((natoms, 3)) * length,
+        cell=np.eye(3) * length,
+        pbc=True,
+    )
+
+    z_table = tools.AtomicNumberTable([int(z) for z in mace_model.atomic_numbers])
+    config = data.config_from_atoms(atoms)
+    loader = torch_geometric.dataloader.DataLoader(
+        dataset=[data.AtomicData.from_config(config, z_table=z_table, cutoff=5.0)],
+        batch_size=1,
+    )
+
+    return {
+        key: value.double() if torch.is_floating_point(value) else value
+        for key, value in next(iter(loader)).to_dict().items()
+        if isinstance(value, torch.Tensor)
+    }
@@ -0,0 +1,192 @@
+/*
+Tests of the on-disk kernel cache with a stub compiler, so that no GPU is needed. Built and run by
+tests/test_kernel_cache.py. Usage: test_kernel_cache <scratch directory>
+*/
+#include "cuda_cache.hpp"
+
+#include <thread>
+
+#define CHECK(condition)                                                                           \
+    do {                                                                                           \
+        if (!(condition)) {                                                                        \
+            std::cerr << __FILE__ << ":" << __LINE__ << ": check failed: " #condition << std::endl; \
+            std::exit(1);                                                                          \
+        }                                                                                          \
+    } while (0)
+
+namespace fs = std::filesystem;
+
+class StubCompiler : public KernelCompiler {
+  public:
+    std::string compile(
+        const std::string& kernel_name,
+        const std::string& kernel_code,
+        const std::string&,
+        const std::vector<std::string>&,
+        int arch,
+        std::string& lowered_name
+    ) override {
+        ncompiled++;
+        lowered_name = "_Z" + kernel_name;
+        return "// ptx " + std::to_string(arch) + "\n" + kernel_code;
+    }
+
+    std::string version() override { return compiler_version; }
+
+    int ncompiled = 0;
+    std::string compiler_version = "stub-1.0";
+};
+
+static std::string compile(
+    StubCompiler& compiler,
+    KernelDiskCache& cache,
+    const std::string& code,
+    const std::vector<std::string>& options = {"-O3"},
+    int arch = 80
+) {
+    std::string lowered_name;
+    return compileWithCache(compiler, cache, "kernel", code, "kernel.cu", options, arch, lowered_name);
+}
+
+static size_t count_files(const fs::path& directory, const std::string& pattern) {
+    size_t count = 0;
+    for (const auto& entry : fs::directory_iterator(directory)) {
+        if (entry.path().filename().string().find(pattern) != std::string::npos) {
+            count++;
+        }
+    }
+    return count;
+}
+
+static void test_hits_and_misses(const fs::path& directory) {
+    StubCompiler compiler;
+    KernelDiskCache cache(directory, KernelDiskCache::DEFAULT_MAX_BYTES);
+
+    std::string ptx = compile(compiler, cache, "code");
+    CHECK(compiler.ncompiled == 1);
+
+    // same key: read from disk, also by a new cache instance, i.e another process.
+    CHECK(compile(compiler, cache, "code") == ptx);
+    KernelDiskCache other(directory, KernelDiskCache::DEFAULT_MAX_BYTES);
+    std::string lowered_name;
+    CHECK(compileWithCache(compiler, other, "kernel", "code", "kernel.cu", {"-O3"}, 80, lowered_name) == ptx);
+    CHECK(lowered_name == "_Zkernel");
+    CHECK(compiler.ncompiled == 1);
+
+    // every part of the key invalidates the entry.
+    compile(compiler, cache, "other code");
+    CHECK(compiler.ncompiled == 2);
+    compile(compiler, cache, "code", {"-O2"});
+    CHECK(compiler.ncompiled == 3);
+    compile(compiler, cache, "code", {"-O3"}, 90);
+    CHECK(compiler.ncompiled == 4);
+    compiler.compiler_version = "stub-2.0";
+    compile(compiler, cache, "code");
+    CHECK(compiler.ncompiled == 5);
+
+    // a disabled cache always compiles.
+    KernelDiskCache disabled;
+    compile(compiler, disabled, "code");
+    compile(compiler, disabled, "code");
+    CHECK(compiler.ncompiled == 7);
+}
+
+static void test_atomic_write(const fs::path& directory) {
+    StubCompiler compiler;
+    KernelDiskCache cache(directory, KernelDiskCache::DEFAULT_MAX_BYTES);
+
+    std::string key = KernelDiskCache::key("kernel", "code", {}, 80, compiler.version());
+    std::string ptx(1 << 20, 'x');
+
+    // concurrent writers of the same entry, with a reader which must never see a partial file.
+    std::atomic<bool> done{false};
+    std::atomic<int> partial{0};
+
+    std::thread reader([&]() {
+        while (!done) {
+            std::string loaded, lowered_name;
+            if (cache.load(key, loaded, lowered_name) && (loaded != ptx || lowered_name != "name")) {
+                partial++;
+            }
+        }
+    });
+
+    std::vector<std::thread> writers;
+    for (int i = 0; i < 4; i++) {
+        writers.emplace_back([&]() {
+            for (int j = 0; j < 10; j++) {
+                cache.store(key, ptx, "name");
+            }
+        });
+    }
+    for (auto& writer : writers) {
+        writer.join();
+    }
+    done = true;
+    reader.join();
+
+    CHECK(partial == 0);
+    CHECK(count_files(directory, ".tmp.") == 0);
+
+    // an empty entry, e.g left by a crash of an older version, is a miss and is replaced.
+    std::ofstream(directory / (key + ".ptx"), std::ios::trunc).close();
+    std::string loaded, lowered_name;
+    CHECK(!cache.load(key, loaded, lowered_name));
+}
+
+static void test_lru_eviction(const fs::path& directory) {
+    const std::string ptx(1000, 'x');
+
+    // room for two entries, each of 1000 bytes plus the lowered name.
+    KernelDiskCache cache(directory, 2500);
+
+    cache.store("a", ptx, "a");
+    cache.store("b", ptx, "b");
+
+    // "a" was used more recently than "b".
+    auto now = fs::file_time_type::clock::now();
+    fs::last_write_time(directory / "a.ptx", now - std::chrono::seconds(10));
+    fs::last_write_time(directory / "b.ptx", now - std::chrono::seconds(20));
+
+    std::string loaded, lowered_name;
+    CHECK(cache.load("a", loaded, lowered_name));
+
+    cache.store("c", ptx, "c");
+
+    CHECK(fs::exists(directory / "a.ptx"));
+    CHECK(!fs::exists(directory / "b.ptx"));
+    CHECK(fs::exists(directory / "c.ptx"));
+}
+
+static void test_parse_size() {
+    const auto default_size = KernelDiskCache::DEFAULT_MAX_BYTES;
+
+    CHECK(KernelDiskCache::parseSize("1048576") == 1048576);
+    CHECK(KernelDiskCache::parseSize("0") == 0);
+
+    // malformed sizes keep the default instead of disabling the cache.
+    CHECK(KernelDiskCache::parseSize("") == default_size);
+    CHECK(KernelDiskCache::parseSize("abc") == default_size);
+    CHECK(KernelDiskCache::parseSize("256MB") == default_size);
+    CHECK(KernelDiskCache::parseSize("-1") == default_size);
+    CHECK(KernelDiskCache::parseSize("99999999999999999999999") == default_size);
+
+    setenv("CUDA_MACE_KERNEL_CACHE_DIR", "/tmp", 1);
+    setenv("CUDA_MACE_KERNEL_CACHE_SIZE", "lots", 1);
+    KernelDiskCache cache = KernelDiskCache::fromEnvironment();
+    CHECK(cache.enabled());
+    CHECK(cache.maxBytes() == default_size);
+}
+
+int main(int argc, char** argv) {
+    CHECK(argc == 2);
+    fs::path root(argv[1]);
+
+    test_hits_and_misses(root / "hits");
+    test_atomic_write(root / "atomic");
+    test_lru_eviction(root / "lru");
+    test_parse_size();
+
+    std::cout << "ok" << std::endl;
+    return 0;
+}
@@ -0,0 +1,43 @@
+import pytest
+import torch
+
+import cuda_mace.runtime
+from cuda_mace.models import OptimizedInvariantMACE, load_artifact, save_artifact
+from cuda_mace.models.artifact import ARTIFACT_VERSION, read_artifact
+
+
+@pytest.mark.parametrize("precision", ["mixed", "fp64"])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(mace_model, batch, tmp_path, precision, mmap):
+    kwargs = {"compute_force": True, "compute_stress": True}
+    model = OptimizedInvariantMACE(mace_model, precision=precision)
+    reference = model(batch, **kwargs)
+
+    save_artifact(model, tmp_path / "model.cmace")
+
+    for loaded in (
+        load_artifact(tmp_path / "model.cmace", device="cpu", mmap=mmap),
+        cuda_mace.runtime.load(tmp_path / "model.cmace", device="cpu"),
+    ):
+        assert loaded.metadata() == model.metadata()
+
+        out = loaded(batch, **kwargs)
+        for key in ("energy", "forces", "stress"):
+            torch.testing.assert_close(out[key], reference[key], rtol=0.0, atol=0.0)
+
+
+def test_rejects_other_files(mace_model, tmp_path):
+    save_artifact(OptimizedInvariantMACE(mace_model), tmp_path / "model.cmace")
+    artifact = read_artifact(tmp_path / "model.cmace", mmap=False)
+
+    torch.save(dict(artifact, format="something.else"), tmp_path / "format.pt")
+    with pytest.raises(ValueError, match="is not a cuda_mace model artifact"):
+        load_artifact(tmp_path / "format.pt", device="cpu")
+
+    torch.save({"tensors": artifact["tensors"]}, tmp_path / "state_dict.pt")
+    with pytest.raises(ValueError, match="is not a cuda_mace model artifact"):
+        load_artifact(tmp_path / "state_dict.pt", device="cpu")
+
+    torch.save(dict(artifact, version=ARTIFACT_VERSION + 1), tmp_path / "version.pt")
+    with pytest.raises(ValueError, match="artifact version %d" % (ARTIFACT_VERSION + 1)):
+        load_artifact(tmp_path / "version.pt", device="cpu")
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+import torch
+
+from cuda_mace.serving import BatchingEngine, collate_structures
+
+
+def structure(natoms, nedges, seed):
+    generator = torch.Generator().manual_seed(seed)
+    return {
+        "positions": torch.randn(natoms, 3, dtype=torch.float64, generator=generator),
+        "node_attrs": torch.ones(natoms, 1, dtype=torch.float64),
+        "edge_index": torch.randint(0, natoms, (2, nedges), generator=generator),
+        "shifts": torch.zeros(nedges, 3, dtype=torch.float64),
+    }
+
+
+class StubModel:
+    """
+    Per-graph energies and per-atom forces which only depend on the structure itself, so that
+    results returned to the wrong caller are detected. Records the atom count of every batch.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, data, compute_force=True):
+        self.batches.append(data["positions"].shape[0])
+        nstructures = data["ptr"].shape[0] - 1
+
+        energy = torch.zeros(nstructures, dtype=data["positions"].dtype)
+        energy.index_add_(0, data["batch"], data["positions"].sum(dim=1))
+
+        return {"energy": energy, "forces": -data["positions"]}
+
+
+def evaluate(engine, structures):
+    async def run():
+        async with engine:
+            return await asyncio.gather(*[engine.submit(s) for s in structures])
+
+    return asyncio.run(run())
+
+
+def test_collate_structures():
+    structures = [structure(3, 4, 0), structure(5, 6, 1), structure(2, 1, 2)]
+    data = collate_structures(structures)
+
+    assert data["ptr"].tolist() == [0, 3, 8, 10]
+    assert data["batch"].tolist() == [0] * 3 + [1] * 5 + [2] * 2
+
+    offsets = torch.tensor([0] * 4 + [3] * 6 + [8] * 1)
+    edge_index = torch.cat([s["edge_index"] for s in structures], dim=1)
+    assert torch.equal(data["edge_index"], edge_index + offsets)
+
+    assert data["cell"].shape == (9, 3)
+    assert data["unit_shifts"].shape == (11, 3)
+
+
+def test_results_are_returned_to_their_caller():
+    structures = [structure(1 + i % 7, 10, i) for i in range(20)]
+    model = StubModel()
+
+    results = evaluate(BatchingEngine(model, max_atoms=16, max_wait=1e-2), structures)
+
+    for s, result in zip(structures, results):
+        torch.testing.assert_close(result["energy"], s["positions"].sum(dim=1).sum())
+        assert torch.equal(result["forces"], -s["positions"])
+
+    assert len(model.batches) > 1
+
+
+def test_budgets():
+    model = StubModel()
+    structures = [structure(4, 10, i) for i in range(10)] + [structure(40, 10, 10)]
+
+    engine = BatchingEngine(model, max_atoms=10, max_wait=1e-2)
+    evaluate(engine, structures)
+
+    # two structures of 4 atoms per batch, and the oversized structure on its own.
+    assert sorted(model.batches) == [8] * 5 + [40]
+
+    model = StubModel()
+    engine = BatchingEngine(model, max_atoms=100, max_edges=25, max_wait=1e-2)
+    evaluate(engine, structures[:10])
+
+    assert model.batches == [8] * 5
+
+
+def test_max_wait_flush():
+    model = StubModel()
+    engine = BatchingEngine(model, max_atoms=4096, max_wait=5e-2)
+
+    async def run():
+        async with engine:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+
+            # the budget is never reached, so the batch is only flushed by the timeout.
+            await asyncio.wait_for(engine.submit(structure(4, 10, 0)), timeout=10.0)
+            return loop.time() - start
+
+    elapsed = asyncio.run(run())
+
+    assert elapsed >= engine.max_wait * 0.9
+    assert model.batches == [4]
+
+
+def test_statistics():
+    model = StubModel()
+    engine = BatchingEngine(model, max_atoms=10, max_wait=1e-2)
+    evaluate(engine, [structure(5, 10, i) for i in range(6)])
+
+    statistics = engine.statistics()
+
+    assert statistics["num_batches"] == 3
+    assert statistics["num_structures"] == 6
+    assert statistics["mean_batch_size"] == 2.0
+    assert statistics["mean_fill_ratio"] == pytest.approx(1.0)
+    assert statistics["last_fill_ratio"] == pytest.approx(1.0)
+    assert statistics["queue_depth"] == 0
+    assert statistics["max_queue_depth"] >= 2
+
+
+def test_errors_are_returned_to_every_caller():
+    def model(data, compute_force=True):
+        raise RuntimeError("model failed")
+
+    with pytest.raises(RuntimeError, match="model failed"):
+        evaluate(BatchingEngine(model, max_atoms=10), [structure(4, 10, i) for i in range(2)])
@@ -0,0 +1,88 @@
+from copy import deepcopy
+
+import numpy as np
+import pytest
+import torch
+
+from cuda_mace.models import OptimizedInvariantMACE
+
+ase = pytest.importorskip("ase")
+mace_calculators = pytest.importorskip("mace.calculators")
+
+from ase import units
+from ase.md.velocitydistribution import MaxwellBoltzmannDistribution
+from ase.md.verlet import VelocityVerlet
+
+from cuda_mace.calculators import MACECalculator
+
+# absolute (energy, forces, stress) tolerances of the fp64 model against MACE, see
+# tests/test_models.py.
+TOLERANCES = (1e-6, 2e-5, 1e-7)
+
+
+def random_atoms(natoms=40, seed=0):
+    rng = np.random.default_rng(seed)
+    length = (natoms / 0.08) ** (1 / 3)
+    return ase.Atoms(
+        numbers=rng.choice([1, 6, 8], natoms),
+        positions=rng.random((natoms, 3)) * length,
+        cell=np.eye(3) * length,
+        pbc=True,
+    )
+
+
+def test_md(mace_model):
+    atoms = random_atoms()
+    atoms.calc = MACECalculator(OptimizedInvariantMACE(mace_model, precision="fp64"), skin=0.5)
+
+    reference = mace_calculators.MACECalculator(
+        models=deepcopy(mace_model), device="cpu", default_dtype="float64"
+    )
+
+    MaxwellBoltzmannDistribution(atoms, temperature_K=300, rng=np.random.default_rng(0))
+    dynamics = VelocityVerlet(atoms, timestep=1.0 * units.fs)
+
+    nsteps = 5
+    for _ in range(nsteps):
+        dynamics.run(1)
+
+        expected = atoms.copy()
+        expected.calc = reference
+
+        energy, forces, stress = TOLERANCES
+        np.testing.assert_allclose(
+            atoms.get_potential_energy(), expected.get_potential_energy(), rtol=0.0, atol=energy
+        )
+        np.testing.assert_allclose(atoms.get_forces(), expected.get_forces(), rtol=0.0, atol=forces)
+        np.testing.assert_allclose(atoms.get_stress(), expected.get_stress(), rtol=0.0, atol=stress)
+
+    statistics = atoms.calc.statistics()
+
+    # forces at the start and at every step, plus the stress at every step, which does not
+    # move the atoms and so reuses the neighbour list.
+    assert statistics["num_calls"] == 2 * nsteps + 1
+    assert statistics["num_input_allocations"] == 1
+    assert statistics["num_builds"] == 1
+    assert statistics["num_avoided_builds"] == 2 * nsteps
+    assert statistics["workspace_num_avoided_allocations"] > 0
+
+    # new atomic numbers reallocate the inputs.
+    atoms.numbers[0] = 8 if atoms.numbers[0] != 8 else 1
+    atoms.get_potential_energy()
+    assert atoms.calc.statistics()["num_input_allocations"] == 2
+
+
+def test_unsupported(mace_model):
+    calculator = MACECalculator(OptimizedInvariantMACE(mace_model, precision="fp64"))
+
+    atoms = random_atoms(natoms=5)
+    atoms.numbers[0] = 7
+    atoms.calc = calculator
+    with pytest.raises(ValueError, match=r"does not support atomic numbers \[7\]"):
+        atoms.get_potential_energy()
+
+    atoms = random_atoms(natoms=5)
+    atoms.pbc = (True, True, False)
+    atoms.calc = calculator
+    with pytest.raises(ase.calculators.calculator.PropertyNotImplementedError):
+        atoms.get_stress()
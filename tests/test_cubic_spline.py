@@ -0,0 +1,23 @@
+import pytest
+import torch
+
+from cuda_mace.ops.cubic_spline import cubic_spline_coefficients
+
+
+def test_natural_spline_coefficients():
+    interpolate = pytest.importorskip("scipy.interpolate")
+
+    generator = torch.Generator().manual_seed(0)
+
+    # non-uniform knots, with spacings varying by an order of magnitude.
+    spacing = 0.05 + torch.rand(40, dtype=torch.float64, generator=generator)
+    x = torch.cat([torch.zeros(1, dtype=torch.float64), torch.cumsum(spacing, 0)])
+    y = torch.randn(x.shape[0], 256, dtype=torch.float64, generator=generator)
+
+    coefficients = cubic_spline_coefficients(x, y)  # [nknots - 1, 4, nchannels]
+
+    # scipy stores the coefficients from the highest power down, as [4, nknots - 1, nchannels].
+    ref = interpolate.CubicSpline(x.numpy(), y.numpy(), bc_type="natural").c
+    ref = torch.from_numpy(ref).flip(0).permute(1, 0, 2)
+
+    torch.testing.assert_close(coefficients, ref)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import torch
+
+from cuda_mace.models import OptimizedInvariantMACE
+from cuda_mace.neighbours import neighbour_list
+from cuda_mace.parallel import DomainDecomposition
+
+
+@pytest.fixture(scope="module")
+def model(mace_model):
+    return OptimizedInvariantMACE(mace_model, precision="fp64")
+
+
+def random_system(natoms, pbc, seed=0):
+    rng = np.random.default_rng(seed)
+    length = (natoms / 0.08) ** (1 / 3)
+
+    cell = torch.tensor(
+        [[length, 0.0, 0.0], [0.5, length, 0.0], [0.3, 0.2, length]], dtype=torch.float64
+    )
+    positions = torch.from_numpy(rng.random((natoms, 3))) @ cell
+    node_attrs = torch.nn.functional.one_hot(torch.from_numpy(rng.integers(0, 3, natoms)), 3)
+
+    return positions, node_attrs.double(), cell, pbc
+
+
+def monolithic(model, positions, node_attrs, cell, pbc):
+    graph = neighbour_list(positions, model.r_max.item(), cell=cell, pbc=pbc)
+    natoms = positions.shape[0]
+
+    data = {
+        "positions": positions,
+        "node_attrs": node_attrs,
+        "edge_index": graph["edge_index"],
+        "shifts": graph["shifts"],
+        "unit_shifts": graph["unit_shifts"],
+        "receiver_offsets": graph["receiver_offsets"],
+        "cell": cell,
+        "batch": torch.zeros(natoms, dtype=torch.long),
+        "ptr": torch.tensor([0, natoms]),
+    }
+
+    return model(data, compute_force=True, compute_virials=any(pbc), compute_stress=all(pbc))
+
+
+@pytest.mark.parametrize(
+    "pbc, domains",
+    [
+        ((True, True, True), (1, 1, 1)),
+        ((True, True, True), (2, 1, 1)),
+        ((True, True, True), (2, 2, 2)),
+        ((True, True, False), (2, 1, 2)),
+        ((False, False, False), (2, 2, 1)),
+    ],
+)
+def test_domain_decomposition(model, pbc, domains):
+    system = random_system(60, pbc)
+    reference = monolithic(model, *system)
+
+    positions, node_attrs, cell, pbc = system
+    out = DomainDecomposition(model, domains=domains)(
+        positions, node_attrs, cell=cell, pbc=pbc, compute_virials=any(pbc), compute_stress=all(pbc)
+    )
+
+    keys = ["energy", "node_energy", "forces"]
+    if any(pbc):
+        keys.append("virials")
+    if all(pbc):
+        keys.append("stress")
+
+    for key in keys:
+        torch.testing.assert_close(out[key], reference[key].detach(), rtol=1e-10, atol=1e-10)
+
+
+def test_every_atom_is_owned_once(model):
+    positions, _, cell, pbc = random_system(60, (True, True, False))
+    domains = DomainDecomposition(model, domains=(3, 2, 2)).partition(positions, cell, pbc)
+
+    assert len(domains) == 12
+
+    owned = torch.cat([domain.atoms[domain.owned] for domain in domains])
+    assert torch.equal(owned.sort().values, torch.arange(60))
+
+
+def test_invalid_domains(model):
+    with pytest.raises(ValueError, match="domains must be three positive integers"):
+        DomainDecomposition(model, domains=(2, 0, 1))
@@ -0,0 +1,109 @@
+import pytest
+import torch
+
+from cuda_mace.ops.invariant_message_passing import InvariantMessagePassingTP
+
+LM_TO_L = torch.tensor([0] + [1] * 3 + [2] * 5 + [3] * 7)
+
+
+def random_graph(nnodes, nedges, nchannels, dtype=torch.float64, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+
+    # receivers must be sorted, senders are in random order. At low densities some nodes
+    # neither send nor receive.
+    receiver = torch.sort(torch.randint(0, nnodes, (nedges,), generator=generator)).values
+    sender = torch.randint(0, nnodes, (nedges,), generator=generator)
+
+    X = torch.randn(nnodes, nchannels, dtype=dtype, generator=generator)
+    Y = torch.randn(16, nedges, dtype=dtype, generator=generator)
+    radial = torch.randn(nedges, 4, nchannels, dtype=dtype, generator=generator)
+
+    return X, Y, radial, sender.int(), receiver.int()
+
+
+def reference(X, Y, radial, sender, receiver, nnodes):
+    messages = X[sender.long()][:, None, :] * Y.t()[:, :, None] * radial[:, LM_TO_L, :]
+    out = torch.zeros(nnodes, 16, X.shape[1], dtype=X.dtype)
+    return out.index_add(0, receiver.long(), messages)
+
+
+def test_gradcheck():
+    tp = InvariantMessagePassingTP()
+    nnodes = 7
+    X, Y, radial, sender, receiver = random_graph(nnodes, 25, 3)
+
+    assert torch.autograd.gradcheck(
+        lambda X, Y, radial: tp(X, Y, radial, sender, receiver, nnodes),
+        (X.requires_grad_(), Y.requires_grad_(), radial.requires_grad_()),
+    )
+
+
+@pytest.mark.parametrize("precomputed", [False, True])
+def test_large_graph_gradients(precomputed):
+    tp = InvariantMessagePassingTP()
+    nnodes = 50000
+    X, Y, radial, sender, receiver = random_graph(nnodes, 3 * nnodes, 4)
+
+    kwargs = {}
+    if precomputed:
+        kwargs["first_occurences"] = tp.first_occurences(receiver, nnodes)
+        kwargs["sender_ordering"] = tp.sender_ordering(sender, nnodes)
+
+    inputs = [t.clone().requires_grad_() for t in (X, Y, radial)]
+    ref_inputs = [t.clone().requires_grad_() for t in (X, Y, radial)]
+
+    out = tp(*inputs, sender, receiver, nnodes, **kwargs)
+    ref = reference(*ref_inputs, sender, receiver, nnodes)
+
+    torch.testing.assert_close(out, ref)
+
+    grad_out = torch.randn_like(ref)
+    grads = torch.autograd.grad(out, inputs, grad_out)
+    ref_grads = torch.autograd.grad(ref, ref_inputs, grad_out)
+
+    for grad, ref_grad in zip(grads, ref_grads):
+        torch.testing.assert_close(grad, ref_grad)
+
+
+def test_non_contiguous_inputs():
+    tp = InvariantMessagePassingTP()
+    nnodes = 30
+    X, Y, radial, sender, receiver = random_graph(nnodes, 400, 8)
+
+    strided = [
+        X.t().contiguous().t(),
+        Y.t().contiguous().t(),
+        radial.permute(2, 1, 0).contiguous().permute(2, 1, 0),
+    ]
+    assert not any(t.is_contiguous() for t in strided)
+
+    inputs = [t.requires_grad_() for t in strided]
+    ref_inputs = [t.clone().requires_grad_() for t in (X, Y, radial)]
+
+    out = tp(*inputs, sender, receiver, nnodes)
+    ref = tp(*ref_inputs, sender, receiver, nnodes)
+
+    torch.testing.assert_close(out, ref)
+
+    grad_out = torch.randn_like(ref)
+    grads = torch.autograd.grad(out, inputs, grad_out)
+    ref_grads = torch.autograd.grad(ref, ref_inputs, grad_out)
+
+    for grad, ref_grad in zip(grads, ref_grads):
+        torch.testing.assert_close(grad, ref_grad)
+
+
+def test_sender_ordering():
+    tp = InvariantMessagePassingTP()
+    nnodes = 1000
+    sender = torch.randint(0, nnodes, (200000,), generator=torch.Generator().manual_seed(0)).int()
+
+    sort_idx, first_occurences = tp.sender_ordering(sender, nnodes)
+    counts = torch.bincount(sender, minlength=nnodes)
+
+    assert torch.equal(sort_idx.long(), torch.argsort(sender, stable=True))
+    assert torch.equal(first_occurences[:nnodes].long(), torch.cumsum(counts, 0) - counts)
+    assert torch.equal(first_occurences[nnodes:].long(), torch.cumsum(counts, 0))
+
+    with pytest.raises(RuntimeError, match="sender_list contains nodes outside"):
+        tp.sender_ordering(torch.tensor([0, 3, 1, nnodes], dtype=torch.int32), nnodes)
@@ -0,0 +1,45 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+INCLUDE = os.path.join(HERE, "..", "cuda_mace", "jit_wrappers", "include")
+
+
+def test_kernel_cache(tmp_path):
+    """
+    Builds and runs tests/cpp/test_kernel_cache.cpp, which exercises the on-disk kernel cache with
+    a stub compiler. Only the CUDA headers are needed, not a GPU.
+    """
+    compiler = shutil.which(os.environ.get("CXX", "c++"))
+    cuda_include = os.path.join(os.environ.get("CUDA_HOME", "/usr/local/cuda"), "include")
+
+    if compiler is None:
+        pytest.skip("no C++ compiler found")
+    if not os.path.isfile(os.path.join(cuda_include, "nvrtc.h")):
+        pytest.skip("CUDA headers not found, set CUDA_HOME")
+
+    executable = tmp_path / "test_kernel_cache"
+    subprocess.run(
+        [
+            compiler,
+            "-std=c++17",
+            "-I" + INCLUDE,
+            "-I" + cuda_include,
+            os.path.join(HERE, "cpp", "test_kernel_cache.cpp"),
+            "-o",
+            str(executable),
+            "-ldl",
+            "-pthread",
+        ],
+        check=True,
+    )
+
+    result = subprocess.run(
+        [str(executable), str(tmp_path / "cache")], capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "ignoring invalid CUDA_MACE_KERNEL_CACHE_SIZE" in result.stderr
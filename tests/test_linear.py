@@ -0,0 +1,64 @@
+import pytest
+import torch
+
+o3 = pytest.importorskip("e3nn.o3")
+
+from cuda_mace.models.InvariantMACE import element_linear_to_cuda, linear_to_cuda
+
+NCHANNELS = 8
+NELEMENTS = 3
+IRREPS = o3.Irreps("+".join("%dx%s" % (NCHANNELS, ir) for ir in ["0e", "1o", "2e", "3o"]))
+
+
+def to_e3nn(x):
+    # [nnodes, 16, nchannels] -> [nnodes, irreps.dim], with each l block channel-major.
+    return torch.cat([x[:, l * l: (l + 1) ** 2].transpose(1, 2).flatten(1) for l in range(4)], 1)
+
+
+def from_e3nn(x):
+    blocks, start = [], 0
+    for l in range(4):
+        end = start + NCHANNELS * (2 * l + 1)
+        blocks.append(x[:, start:end].reshape(-1, NCHANNELS, 2 * l + 1).transpose(1, 2))
+        start = end
+    return torch.cat(blocks, 1)
+
+
+def check_parity(module, e3nn_module, x, *args):
+    x_e3nn = x.detach().clone().requires_grad_()
+
+    out = module(x, *args)
+    ref = from_e3nn(e3nn_module(to_e3nn(x_e3nn), *args))
+
+    torch.testing.assert_close(out, ref)
+
+    grad_out = torch.randn_like(ref)
+    (grad,) = torch.autograd.grad(out, x, grad_out)
+    (ref_grad,) = torch.autograd.grad(ref, x_e3nn, grad_out)
+
+    torch.testing.assert_close(grad, ref_grad)
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_linear(dtype):
+    torch.manual_seed(0)
+    e3nn_linear = o3.Linear(IRREPS, IRREPS).to(dtype)
+    linear = linear_to_cuda(e3nn_linear, dtype)
+
+    x = torch.randn(50, 16, NCHANNELS, dtype=dtype, requires_grad=True)
+
+    check_parity(linear, e3nn_linear, x)
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_elemental_linear(dtype):
+    torch.manual_seed(0)
+    skip_tp = o3.FullyConnectedTensorProduct(
+        IRREPS, o3.Irreps("%dx0e" % NELEMENTS), IRREPS
+    ).to(dtype)
+    elemental_linear = element_linear_to_cuda(skip_tp, dtype)
+
+    x = torch.randn(50, 16, NCHANNELS, dtype=dtype, requires_grad=True)
+    node_attrs = torch.nn.functional.one_hot(torch.randint(0, NELEMENTS, (50,)), NELEMENTS)
+
+    check_parity(elemental_linear, skip_tp, x, node_attrs.to(dtype))
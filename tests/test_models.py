@@ -0,0 +1,72 @@
+import pytest
+import torch
+
+from cuda_mace.models import OptimizedInvariantMACE
+from cuda_mace.models.precision import PRECISION_POLICIES
+
+# absolute (energy, forces, stress) tolerances against the float64 MACE model. Even in fp64 the
+# forces are limited by the radial splines (spline_tolerance) and the float32 U tables of the
+# symmetric contraction.
+TOLERANCES = {
+    "fp32": (1e-5, 5e-5, 1e-6),
+    "mixed": (1e-6, 5e-5, 1e-6),
+    "fp64": (1e-6, 2e-5, 1e-7),
+}
+
+
+@pytest.fixture(scope="module")
+def model(mace_model):
+    return OptimizedInvariantMACE(mace_model)
+
+
+def test_energy_inference(model, batch):
+    reference = model(batch, compute_force=True)
+
+    # node_attrs in float64 are cast to the compute dtype inside inference mode.
+    energy = model.energy(batch)
+    torch.testing.assert_close(energy["energy"], reference["energy"].detach())
+
+    # node_attrs already in the compute dtype are used as they are, so nothing computed in
+    # inference mode may be reused by the following forward pass.
+    data = dict(batch, node_attrs=batch["node_attrs"].to(model.compute_dtype))
+    model.energy(data)
+    out = model(data, compute_force=True)
+
+    torch.testing.assert_close(out["forces"], reference["forces"])
+
+
+def test_script(model, batch, tmp_path):
+    kwargs = {"compute_force": True, "compute_stress": True}
+    reference = model(batch, **kwargs)
+
+    torch.jit.save(model.script(), tmp_path / "model.pt")
+    scripted = torch.jit.load(tmp_path / "model.pt")
+    frozen = torch.jit.freeze(torch.jit.script(model).eval())
+
+    for m in (scripted, frozen):
+        out = m(batch, **kwargs)
+        for key in ("energy", "forces", "stress"):
+            torch.testing.assert_close(out[key], reference[key])
+
+
+@pytest.mark.parametrize("precision", PRECISION_POLICIES.keys())
+def test_precision(mace_model, batch, precision):
+    kwargs = {"compute_force": True, "compute_stress": True}
+    reference = mace_model({k: v.clone() for k, v in batch.items()}, training=False, **kwargs)
+
+    state = {k: v.clone() for k, v in mace_model.state_dict().items()}
+    model = OptimizedInvariantMACE(mace_model, precision=precision)
+
+    # the conversion must not cast or modify the caller's model.
+    for key, value in mace_model.state_dict().items():
+        assert value.dtype == state[key].dtype and torch.equal(value, state[key]), key
+
+    out = model(batch, **kwargs)
+
+    policy = PRECISION_POLICIES[precision]
+    assert out["energy"].dtype == policy.energy_dtype
+
+    for key, tolerance in zip(("energy", "forces", "stress"), TOLERANCES[precision]):
+        torch.testing.assert_close(
+            out[key].double(), reference[key].detach(), rtol=0.0, atol=tolerance
+        )
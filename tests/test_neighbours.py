@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+import torch
+
+from cuda_mace.neighbours import neighbour_list
+
+ase = pytest.importorskip("ase")
+matscipy_neighbours = pytest.importorskip("matscipy.neighbours")
+
+CUTOFF = 3.0
+
+CELLS = {
+    "cubic": (np.diag([8.0, 8.0, 8.0]), (True, True, True), 60),
+    "triclinic": ([[7.0, 0.0, 0.0], [2.5, 6.5, 0.0], [-1.5, 2.0, 7.5]], (True, True, True), 50),
+    # smaller than the cutoff, so every atom sees several images of each neighbour.
+    "tiny": ([[2.0, 0.0, 0.0], [0.4, 2.2, 0.0], [0.3, -0.2, 1.9]], (True, True, True), 2),
+    "slab": (np.diag([6.0, 7.0, 12.0]), (True, True, False), 40),
+    "wire": (np.diag([10.0, 10.0, 4.0]), (False, False, True), 20),
+    "open": (np.diag([10.0, 10.0, 10.0]), (False, False, False), 40),
+}
+
+
+def random_atoms(cell, pbc, natoms, seed=0):
+    rng = np.random.default_rng(seed)
+    cell = np.asarray(cell, dtype=np.float64)
+    positions = rng.random((natoms, 3)) @ cell
+    return ase.Atoms(numbers=[1] * natoms, positions=positions, cell=cell, pbc=pbc)
+
+
+def edge_set(receiver, sender, unit_shifts):
+    return sorted(zip(receiver.tolist(), sender.tolist(), map(tuple, unit_shifts.tolist())))
+
+
+@pytest.mark.parametrize("name", CELLS.keys())
+@pytest.mark.parametrize("unwrapped", [False, True])
+def test_neighbour_list(name, unwrapped):
+    atoms = random_atoms(*CELLS[name])
+    pbc = tuple(bool(p) for p in atoms.pbc)
+
+    if unwrapped:
+        # positions outside the cell along the periodic directions, e.g after MD steps.
+        atoms.positions += (np.array([1.7, -2.4, 0.8]) * pbc) @ atoms.cell.array
+
+    positions = torch.from_numpy(atoms.positions)
+    cell = torch.from_numpy(atoms.cell.array) if any(pbc) else None
+
+    graph = neighbour_list(positions, CUTOFF, cell=cell, pbc=pbc)
+    receiver, sender = graph["edge_index"]
+
+    i, j, S = matscipy_neighbours.neighbour_list("ijS", atoms, CUTOFF)
+    reference = edge_set(i, j, S.astype(np.float64))
+
+    assert len(reference) > 0
+    assert edge_set(receiver, sender, graph["unit_shifts"]) == reference
+
+    assert graph["edge_index"].dtype == torch.int32
+    assert graph["receiver_offsets"].dtype == torch.int32
+    assert torch.all(receiver[1:] >= receiver[:-1])
+
+    counts = torch.bincount(receiver, minlength=len(atoms))
+    assert graph["receiver_offsets"][0] == 0
+    assert torch.equal(graph["receiver_offsets"][1:], torch.cumsum(counts, 0).int())
+
+    if cell is not None:
+        torch.testing.assert_close(graph["shifts"], graph["unit_shifts"] @ cell)
+
+    vectors = positions[sender.long()] - positions[receiver.long()] + graph["shifts"]
+    assert torch.all(vectors.norm(dim=1) < CUTOFF)
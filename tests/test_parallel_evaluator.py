@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import torch
+
+from cuda_mace.models import OptimizedInvariantMACE
+from cuda_mace.neighbours import neighbour_list
+from cuda_mace.parallel import ParallelEvaluator
+from cuda_mace.serving import collate_structures
+
+
+def random_molecules(nstructures, r_max, seed=0):
+    rng = np.random.default_rng(seed)
+
+    structures = []
+    for _ in range(nstructures):
+        natoms = int(rng.integers(3, 16))
+        positions = torch.from_numpy(rng.random((natoms, 3)) * (natoms / 0.1) ** (1 / 3))
+        graph = neighbour_list(positions, r_max)
+
+        structures.append(
+            {
+                "positions": positions,
+                "node_attrs": torch.nn.functional.one_hot(
+                    torch.from_numpy(rng.integers(0, 3, natoms)), 3
+                ).double(),
+                "edge_index": graph["edge_index"],
+                "shifts": graph["shifts"],
+            }
+        )
+
+    return structures
+
+
+@pytest.mark.parametrize("iterator", [False, True])
+def test_parallel_evaluator(mace_model, iterator):
+    model = OptimizedInvariantMACE(mace_model, precision="fp64")
+    structures = random_molecules(10, model.r_max.item())
+
+    references = [model(collate_structures([s]), compute_force=True) for s in structures]
+
+    # chunks of 3 with at most 2 in flight, so that iterators are consumed lazily.
+    with ParallelEvaluator(model, num_workers=2, chunk_size=3, max_pending=2) as pool:
+        results = pool.evaluate(iter(structures) if iterator else structures)
+        assert pool.shared_fraction() == [1.0, 1.0]
+
+    assert len(results) == len(structures)
+
+    for structure, result, reference in zip(structures, results, references):
+        assert result["forces"].shape == structure["positions"].shape
+        torch.testing.assert_close(result["energy"], reference["energy"][0].detach())
+        torch.testing.assert_close(result["forces"], reference["forces"].detach())
+
+    statistics = pool.statistics()
+    assert statistics["num_workers"] == 2
+    assert statistics["num_structures"] == len(structures)
+    assert statistics["structures_per_second"] > 0.0
+
+
+def test_invalid_chunk_size():
+    with pytest.raises(ValueError, match="chunk_size must be positive"):
+        ParallelEvaluator(torch.nn.Linear(1, 1), chunk_size=0)
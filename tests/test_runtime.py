@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+CONVERSION_ONLY_MODULES = ["e3nn", "mace", "ase", "scipy"]
+
+
+def test_runtime_imports_torch_only():
+    code = (
+        "import sys\n"
+        "import cuda_mace.runtime\n"
+        "print(' '.join(m for m in %r if m in sys.modules))\n" % CONVERSION_ONLY_MODULES
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
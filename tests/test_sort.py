@@ -0,0 +1,48 @@
+import torch
+
+from cuda_mace.neighbours import EdgeSorter
+
+
+def random_edges(nnodes=50, nedges=1000, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    edge_index = torch.randint(0, nnodes, (2, nedges), generator=generator)
+    shifts = torch.randn(nedges, 3, dtype=torch.float64, generator=generator)
+    return edge_index, shifts
+
+
+def test_sort_edges():
+    edge_index, shifts = random_edges()
+    sorter = EdgeSorter(validate=True)
+
+    graph = sorter(edge_index, 50, shifts=shifts)
+    permutation = torch.argsort(edge_index[0], stable=True)
+
+    assert torch.equal(graph["permutation"], permutation)
+    assert torch.equal(graph["edge_index"], edge_index[:, permutation].int())
+    assert torch.equal(graph["shifts"], shifts[permutation])
+
+    sorter(edge_index, 50, shifts=shifts)
+    assert (sorter.num_sorts, sorter.num_cached) == (1, 1)
+
+
+def test_inference_mode_is_not_cached():
+    sorter = EdgeSorter()
+
+    with torch.inference_mode():
+        edge_index, shifts = random_edges()
+        sorter(edge_index, 50, shifts=shifts)
+        sorter(edge_index, 50, shifts=shifts)
+
+    assert (sorter.num_sorts, sorter.num_cached) == (2, 0)
+
+    # edges sorted in inference mode must not be reused where autograd records the graph.
+    edge_index, shifts = random_edges()
+    with torch.inference_mode():
+        sorter(edge_index, 50, shifts=shifts)
+
+    positions = torch.randn(50, 3, dtype=torch.float64, requires_grad=True)
+    graph = sorter(edge_index, 50, shifts=shifts)
+    vectors = positions[graph["edge_index"][1].long()] - positions[graph["edge_index"][0].long()]
+    (vectors + graph["shifts"]).square().sum().backward()
+
+    assert not graph["shifts"].is_inference()
@@ -0,0 +1,46 @@
+import pytest
+import torch
+
+from cuda_mace.ops.spherical_harmonics import SphericalHarmonics
+
+o3 = pytest.importorskip("e3nn.o3")
+
+# absolute (forward, backward) tolerances against e3nn.
+TOLERANCES = {torch.float32: (1e-5, 1e-4), torch.float64: (5e-14, 5e-13)}
+
+
+def random_vectors(nedges, dtype, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(nedges, 3, dtype=dtype, generator=generator)
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_spherical_harmonics(dtype):
+    sph = SphericalHarmonics()
+    reference = o3.SphericalHarmonics(list(range(4)), True, "component")
+
+    vectors = random_vectors(1000, dtype).requires_grad_()
+    out = sph(vectors)
+    ref = reference(vectors).T
+
+    assert out.shape == (16, 1000)
+
+    forward, backward = TOLERANCES[dtype]
+    torch.testing.assert_close(out, ref, rtol=0.0, atol=forward)
+
+    grad_out = torch.randn_like(out)
+    (grad,) = torch.autograd.grad(out, vectors, grad_out)
+    (ref_grad,) = torch.autograd.grad(ref, vectors, grad_out)
+    torch.testing.assert_close(grad, ref_grad, rtol=0.0, atol=backward)
+
+    # without grad the derivatives are skipped, which must not change the values.
+    with torch.no_grad():
+        torch.testing.assert_close(sph(vectors), out.detach(), rtol=0.0, atol=0.0)
+
+    with torch.inference_mode():
+        torch.testing.assert_close(sph(vectors.detach()), out.detach(), rtol=0.0, atol=0.0)
+
+
+def test_gradcheck():
+    vectors = random_vectors(20, torch.float64).requires_grad_()
+    assert torch.autograd.gradcheck(SphericalHarmonics(), (vectors,))
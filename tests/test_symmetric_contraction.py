@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+o3 = pytest.importorskip("e3nn.o3")
+pytest.importorskip("mace")
+
+from mace.modules.symmetric_contraction import SymmetricContraction
+
+from cuda_mace.models.InvariantMACE import product_to_cuda
+
+NCHANNELS = 8
+NELEMENTS = 3
+
+# the sparse U tables are stored in float32 for both dtypes.
+TOLERANCES = {torch.float32: 1e-4, torch.float64: 1e-5}
+
+
+def converted(dtype):
+    torch.manual_seed(0)
+    irreps_in = o3.Irreps("+".join("%dx%s" % (NCHANNELS, ir) for ir in ["0e", "1o", "2e", "3o"]))
+    irreps_out = o3.Irreps("%dx0e" % NCHANNELS)
+
+    reference = SymmetricContraction(
+        irreps_in, irreps_out, correlation=3, num_elements=NELEMENTS
+    ).to(dtype)
+
+    product = SimpleNamespace(
+        symmetric_contractions=reference,
+        linear=o3.Linear(irreps_out, irreps_out),
+        use_sc=False,
+    )
+
+    return product_to_cuda(product, dtype).symmetric_contractions, reference
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+@pytest.mark.parametrize("strided", [False, True])
+def test_symmetric_contraction(dtype, strided):
+    contraction, reference = converted(dtype)
+
+    nnodes = 20
+    atom_types = torch.randint(0, NELEMENTS, (nnodes,))
+    node_attrs = torch.nn.functional.one_hot(atom_types, NELEMENTS).to(dtype)
+
+    # mace takes [nnodes, nchannels, 16], the kernels [nnodes, 16, nchannels].
+    x_mace = torch.randn(nnodes, NCHANNELS, 16, dtype=dtype, requires_grad=True)
+    x = x_mace.detach().transpose(1, 2)
+    if not strided:
+        x = x.contiguous()
+    x.requires_grad_()
+
+    out = contraction(x, atom_types.int()).squeeze(1)
+    ref = reference(x_mace, node_attrs)
+
+    tolerance = TOLERANCES[dtype]
+    torch.testing.assert_close(out, ref, rtol=tolerance, atol=tolerance)
+
+    grad_out = torch.randn_like(ref)
+    (grad,) = torch.autograd.grad(out, x, grad_out)
+    (ref_grad,) = torch.autograd.grad(ref, x_mace, grad_out)
+
+    torch.testing.assert_close(grad, ref_grad.transpose(1, 2), rtol=tolerance, atol=tolerance)
+
+
+def test_sparse_table_cache(tmp_path, monkeypatch):
+    import mace.tools.cg
+
+    from cuda_mace.ops import symmetric_contraction
+
+    monkeypatch.setenv("CUDA_MACE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(symmetric_contraction, "_SPARSE_TABLE_CACHE", {})
+
+    calls = []
+    U_matrix_real = mace.tools.cg.U_matrix_real
+
+    def counted(*args, **kwargs):
+        calls.append(1)
+        return U_matrix_real(*args, **kwargs)
+
+    monkeypatch.setattr(mace.tools.cg, "U_matrix_real", counted)
+
+    irreps_in, irreps_out = o3.Irreps("0e+1o+2e+3o"), o3.Irreps("0e")
+    args = (irreps_in, irreps_out, 3, torch.float32)
+
+    fresh = symmetric_contraction._build_sparse_tables(irreps_in, irreps_out, 3)
+    nbuilt = len(calls)
+
+    # the first call builds the tables and writes them to disk, the second only reads the file.
+    symmetric_contraction.sparse_u_tables(*args)
+    assert len(calls) == 2 * nbuilt
+
+    symmetric_contraction._SPARSE_TABLE_CACHE.clear()
+    cached = symmetric_contraction.sparse_u_tables(*args)
+    assert len(calls) == 2 * nbuilt
+
+    assert cached.keys() == fresh.keys()
+    for name in fresh:
+        assert torch.equal(cached[name], fresh[name]), name
+
+    # files written for another table format are not reused.
+    symmetric_contraction._SPARSE_TABLE_CACHE.clear()
+    version = symmetric_contraction._SPARSE_TABLE_VERSION
+    monkeypatch.setattr(symmetric_contraction, "_SPARSE_TABLE_VERSION", version + 1)
+    symmetric_contraction.sparse_u_tables(*args)
+    assert len(calls) == 3 * nbuilt
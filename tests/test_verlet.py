@@ -0,0 +1,100 @@
+import pytest
+import torch
+
+from cuda_mace.models import OptimizedInvariantMACE
+from cuda_mace.neighbours import VerletNeighbourList, neighbour_list
+
+
+def random_box(natoms=30, length=8.0, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    positions = torch.rand(natoms, 3, dtype=torch.float64, generator=generator) * length
+    cell = torch.eye(3, dtype=torch.float64) * length
+    return positions, cell
+
+
+def test_rebuild_threshold():
+    positions, cell = random_box()
+    pbc = (True, True, True)
+    nl = VerletNeighbourList(r_max=3.0, skin=1.0)
+
+    graph = nl.update(positions, cell, pbc)
+
+    # displacements are measured from the last build, not from the previous step.
+    moved = positions.clone()
+    for displacement in (0.2, 0.35, 0.49):
+        moved[0, 0] = positions[0, 0] + displacement
+        assert nl.update(moved, cell, pbc) is graph
+    assert nl.num_builds == 1
+
+    moved[0, 0] = positions[0, 0] + 0.51
+    rebuilt = nl.update(moved, cell, pbc)
+    assert rebuilt is not graph
+    assert nl.num_builds == 2
+
+    # rebuilt lists are identical to a fresh search at r_max + skin.
+    reference = neighbour_list(moved, nl.cutoff, cell, pbc)
+    for key in reference:
+        assert torch.equal(rebuilt[key], reference[key]), key
+
+    assert nl.statistics() == {
+        "num_builds": 2,
+        "num_avoided_builds": 3,
+        "reuse_fraction": 0.6,
+    }
+
+
+def test_rebuild_on_system_change():
+    positions, cell = random_box()
+    pbc = (True, True, True)
+    nl = VerletNeighbourList(r_max=3.0, skin=1.0)
+
+    nl.update(positions, cell, pbc)
+
+    assert nl.needs_rebuild(positions, cell * 1.01, pbc)
+    assert nl.needs_rebuild(positions, cell, (True, True, False))
+    assert nl.needs_rebuild(positions, None, pbc)
+    assert nl.needs_rebuild(positions[:-1], cell, pbc)
+    assert not nl.needs_rebuild(positions.clone(), cell.clone(), [1, 1, 1])
+
+    graph = nl.update(positions[:-1], cell, pbc)
+    assert graph["receiver_offsets"].shape[0] == positions.shape[0]
+    assert nl.num_builds == 2
+
+    nl.reset()
+    nl.update(positions[:-1], cell, pbc)
+    assert nl.num_builds == 3
+
+
+def test_skin(mace_model, batch):
+    """
+    Pairs between r_max and r_max + skin contribute exactly zero, so a Verlet list can be passed
+    to the model as it is.
+    """
+    model = OptimizedInvariantMACE(mace_model)
+    r_max = model.r_max.item()
+
+    positions = batch["positions"]
+    cell = batch["cell"].view(3, 3)
+    pbc = (True, True, True)
+
+    outputs = []
+    for cutoff in (r_max, r_max + 1.0):
+        graph = neighbour_list(positions, cutoff, cell, pbc)
+        data = dict(
+            batch,
+            edge_index=graph["edge_index"],
+            shifts=graph["shifts"],
+            unit_shifts=graph["unit_shifts"],
+        )
+        outputs.append((graph["edge_index"].shape[1], model(data, compute_force=True)))
+
+    (nedges, out), (nedges_skin, out_skin) = outputs
+    assert nedges_skin > nedges
+
+    torch.testing.assert_close(out_skin["energy"], out["energy"])
+    torch.testing.assert_close(out_skin["forces"], out["forces"])
+
+
+def test_negative_skin():
+    with pytest.raises(ValueError, match="skin must be non-negative"):
+        VerletNeighbourList(r_max=3.0, skin=-0.1)
@@ -0,0 +1,95 @@
+import pytest
+import torch
+
+from cuda_mace.models import OptimizedInvariantMACE
+from cuda_mace.ops.spherical_harmonics import SphericalHarmonics
+from cuda_mace.ops.workspace import Workspace
+
+
+def random_vectors(nedges=5000, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(nedges, 3, dtype=torch.float64, generator=generator)
+
+
+def test_held_outputs_are_not_reused():
+    sph = SphericalHarmonics()
+    workspace = Workspace()
+    vectors = random_vectors()
+
+    with workspace:
+        held = sph(vectors)
+        expected = held.clone()
+        pointer = held.data_ptr()
+
+        other = sph(2.0 * vectors)
+        assert other.data_ptr() != pointer
+        assert torch.equal(held, expected)
+
+        # a view keeps the whole buffer alive.
+        view = held[3]
+        del held, other
+
+        sph(3.0 * vectors)
+        assert torch.equal(view, expected[3])
+
+        del view
+
+        statistics = workspace.statistics()
+        reused = sph(4.0 * vectors)
+
+    assert reused.data_ptr() == pointer
+    assert workspace.statistics()["num_avoided_allocations"] == (
+        statistics["num_avoided_allocations"] + 1
+    )
+    assert workspace.statistics()["num_allocations"] == statistics["num_allocations"]
+
+
+def test_model(mace_model, batch):
+    model = OptimizedInvariantMACE(mace_model, precision="fp64")
+    workspace = Workspace()
+    kwargs = {"compute_force": True, "compute_stress": True}
+
+    held = []
+    for step in range(3):
+        data = dict(batch, positions=batch["positions"] + 0.01 * step)
+        reference = model(data, **kwargs)
+
+        with workspace:
+            out = model(data, **kwargs)
+
+        for key in ("energy", "node_energy", "forces", "stress", "node_feats"):
+            assert torch.equal(out[key], reference[key]), key
+
+        held.append((out["node_feats"], reference["node_feats"]))
+
+        if step == 0:
+            num_allocations = workspace.statistics()["num_allocations"]
+
+    # outputs of earlier steps were not overwritten by the later ones.
+    for out, reference in held:
+        assert torch.equal(out, reference)
+
+    statistics = workspace.statistics()
+    assert statistics["num_allocations"] == num_allocations
+    assert statistics["num_avoided_allocations"] > 0
+    assert statistics["reserved_bytes"] > 0
+
+    # nothing is drawn from the workspace outside of its context.
+    model(batch, **kwargs)
+    assert workspace.statistics() == statistics
+
+    del held, out, reference
+    workspace.clear()
+    assert workspace.statistics()["reserved_bytes"] == 0
+
+
+def test_bucket_size():
+    workspace = Workspace(buckets_per_octave=4)
+
+    assert workspace.cuda_obj.bucket_size(1) == 256
+    assert workspace.cuda_obj.bucket_size(1024) == 1024
+    assert workspace.cuda_obj.bucket_size(1025) == 1280
+    assert workspace.cuda_obj.bucket_size(1300) == 1536
+
+    with pytest.raises(RuntimeError, match="buckets_per_octave must be positive"):
+        Workspace(buckets_per_octave=0)
@@ -0,0 +1,569 @@
+"""
+Benchmark suite for the cuda_mace ops and the optimized model.
+
+Each op is timed over a sweep of atoms, edges, channels and dtypes, for the forward pass
+and for forward + backward. Medians and percentiles over many iterations are reported,
+along with the throughput in edges per second of the per-edge ops, and results can be
+written to JSON and compared against a stored baseline:
+
+    python tools/benchmark.py --output results.json
+    python tools/benchmark.py --baseline results.json --threshold 0.1
+    python tools/benchmark.py --ops model --model model.pt --sizes 2 3 4
+    python tools/benchmark.py --ops spherical_harmonics --device cpu --channels 32
+
+If the requested device is not available, the benchmarks are reported as skipped. Any other
+error is raised.
+"""
+
+import json
+import os
+import platform
+import sys
+from copy import deepcopy
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+OPS = [
+    "cubic_spline",
+    "multi_spline",
+    "spherical_harmonics",
+    "message_passing",
+    "linear",
+    "elemental_linear",
+    "symmetric_contraction",
+]
+
+# ops evaluated once per edge, for which the throughput in edges per second is reported.
+EDGE_OPS = ["cubic_spline", "multi_spline", "spherical_harmonics", "message_passing"]
+
+PERCENTILES = [10, 50, 90, 99]
+
+
+def build_parser():
+    """
+    Create a parser for the command line tool.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cuda_mace ops and optimized model."
+    )
+
+    parser.add_argument(
+        "--ops",
+        type=str,
+        nargs="+",
+        default=OPS,
+        choices=OPS + ["model"],
+        help="Ops to benchmark, 'model' benchmarks the full optimized model.",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="cuda" if torch.cuda.is_available() else "cpu",
+    )
+    parser.add_argument("--dtypes", type=str, nargs="+", default=["float32"])
+    parser.add_argument("--natoms", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument(
+        "--neighbours",
+        type=int,
+        nargs="+",
+        default=[30],
+        help="Average number of edges per atom, nedges = natoms * neighbours.",
+    )
+    parser.add_argument("--channels", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--nelements", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--niter", type=int, default=50)
+
+    parser.add_argument("--model", type=str, help="Path to a MACE model, for --ops model.")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[2, 3, 4],
+        help="Diamond supercell repetitions for the model benchmark.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        help="Profile one force evaluation of the model per size, and write a Chrome trace to "
+        "this path (suffixed with the size).",
+    )
+
+    parser.add_argument("--output", type=str, help="Write results to this JSON file.")
+    parser.add_argument("--baseline", type=str, help="Compare against this JSON file.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown of the median reported as a regression.",
+    )
+
+    return parser
+
+
+def synchronize(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def time_function(fn: Callable, device, warmup: int, niter: int) -> Dict[str, float]:
+    """
+    Times niter calls of fn after warmup calls, synchronizing after each one. Returns
+    timing statistics in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    synchronize(device)
+
+    timings = []
+    for _ in range(niter):
+        start = perf_counter()
+        fn()
+        synchronize(device)
+        timings.append((perf_counter() - start) * 1e3)
+
+    timings = np.array(timings)
+
+    stats = {"mean": float(timings.mean()), "min": float(timings.min()), "max": float(timings.max())}
+    for p in PERCENTILES:
+        stats["p%d" % p] = float(np.percentile(timings, p))
+    stats["median"] = stats["p50"]
+    stats["niter"] = niter
+
+    return stats
+
+
+def peak_memory(fn: Callable, device) -> Optional[float]:
+    """
+    Peak memory in MB allocated by torch during one call of fn, above what was allocated
+    before the call. Only available on CUDA.
+    """
+    if torch.device(device).type != "cuda":
+        return None
+
+    synchronize(device)
+    torch.cuda.reset_peak_memory_stats()
+    baseline = torch.cuda.memory_allocated()
+
+    fn()
+    synchronize(device)
+
+    return (torch.cuda.max_memory_allocated() - baseline) / 2**20
+
+
+def forward_only(forward: Callable, inputs: List[torch.Tensor]) -> Callable:
+    """
+    Returns a closure evaluating forward(*inputs) without tracking gradients.
+    """
+
+    def fn():
+        with torch.no_grad():
+            forward(*inputs)
+
+    return fn
+
+
+def with_backward(forward: Callable, inputs: List[torch.Tensor]) -> Callable:
+    """
+    Returns a closure evaluating forward(*inputs) followed by the gradient of its output
+    with respect to inputs.
+    """
+    inputs = [x.detach().requires_grad_(True) for x in inputs]
+    grad_output = []
+
+    def fn():
+        out = forward(*inputs)
+        if not grad_output:
+            grad_output.append(torch.randn_like(out))
+        torch.autograd.grad(out, inputs, grad_output[0])
+
+    return fn
+
+
+def sorted_edges(natoms, nedges, device):
+    receiver = torch.sort(torch.randint(0, natoms, (nedges,), device=device)).values.int()
+    sender = torch.randint(0, natoms, (nedges,), device=device).int()
+    return sender, receiver
+
+
+def coupling_irreps(channels):
+    from e3nn import o3
+
+    return o3.Irreps("+".join("%dx%s" % (channels, ir) for ir in ["0e", "1o", "2e", "3o"]))
+
+
+def setup_cubic_spline(natoms, nedges, channels, dtype, device, nelements):
+    from cuda_mace.ops.cubic_spline import CubicSpline
+
+    rmax = 5.0
+    r, h = np.linspace(1e-12, rmax + 1.0, 256, retstep=True)
+    r_knots = torch.tensor(r, dtype=dtype, device=device)
+    R = torch.randn(r_knots.shape[0], 4 * channels, dtype=dtype, device=device)
+    spline = CubicSpline(r_knots, R, h, rmax)
+
+    lengths = torch.rand(nedges, dtype=dtype, device=device) * rmax
+
+    return spline.forward, [lengths]
+
+
+def setup_multi_spline(natoms, nedges, channels, dtype, device, nelements, ntables=2):
+    from cuda_mace.ops.cubic_spline import MultiCubicSpline
+
+    rmax = 5.0
+    r, h = np.linspace(0.0, rmax, 256, retstep=True)
+    r_knots = torch.tensor(r, dtype=dtype, device=device)
+    R = torch.randn(ntables, r_knots.shape[0], 4 * channels, dtype=dtype, device=device)
+    spline = MultiCubicSpline(r_knots, R, h, rmax)
+
+    lengths = torch.rand(nedges, dtype=dtype, device=device) * rmax
+
+    return spline.forward, [lengths]
+
+
+def setup_spherical_harmonics(natoms, nedges, channels, dtype, device, nelements):
+    from cuda_mace.ops.spherical_harmonics import SphericalHarmonics
+
+    sph = SphericalHarmonics()
+    vectors = torch.randn(nedges, 3, dtype=dtype, device=device)
+
+    return sph, [vectors]
+
+
+def setup_message_passing(natoms, nedges, channels, dtype, device, nelements):
+    from cuda_mace.ops.invariant_message_passing import InvariantMessagePassingTP
+
+    tp = InvariantMessagePassingTP()
+    X = torch.randn(natoms, channels, dtype=dtype, device=device)
+    Y = torch.randn(16, nedges, dtype=dtype, device=device)
+    radial = torch.randn(nedges, 4, channels, dtype=dtype, device=device)
+    sender, receiver = sorted_edges(natoms, nedges, device)
+
+    def forward(X, Y, radial):
+        return tp.forward(X, Y, radial, sender, receiver, natoms)
+
+    return forward, [X, Y, radial]
+
+
+def setup_linear(natoms, nedges, channels, dtype, device, nelements):
+    from e3nn import o3
+    from cuda_mace.ops.linear import Linear
+
+    irreps = coupling_irreps(channels)
+    e3nn_linear = o3.Linear(irreps, irreps)
+    linear = Linear(
+        irreps, irreps, e3nn_linear.instructions, e3nn_linear.weight.detach(), dtype=dtype, device=device
+    )
+
+    x = torch.randn(natoms, 16, channels, dtype=dtype, device=device)
+
+    return linear, [x]
+
+
+def setup_elemental_linear(natoms, nedges, channels, dtype, device, nelements):
+    from e3nn import o3
+    from cuda_mace.ops.linear import ElementalLinear
+
+    irreps = coupling_irreps(channels)
+    instructions = o3.Linear(irreps, irreps).instructions
+    weights = torch.randn(nelements, 4 * channels * channels) / channels**0.5
+    linear = ElementalLinear(
+        irreps, irreps, instructions, weights, nelements, dtype=dtype, device=device
+    )
+
+    x = torch.randn(natoms, 16, channels, dtype=dtype, device=device)
+    one_hot = torch.nn.functional.one_hot(
+        torch.randint(0, nelements, (natoms,), device=device), nelements
+    ).to(dtype)
+
+    return (lambda x: linear(x, one_hot)), [x]
+
+
+def setup_symmetric_contraction(natoms, nedges, channels, dtype, device, nelements):
+    from e3nn import o3
+    from mace.tools.cg import U_matrix_real
+    from cuda_mace.ops.symmetric_contraction import SymmetricContraction
+
+    irreps_in = o3.Irreps("0e+1o+2e+3o")
+    irreps_out = o3.Irreps("0e")
+
+    weights = {"0": {}}
+    for nu in range(1, 4):
+        nweights = U_matrix_real(irreps_in, irreps_out, nu, dtype=torch.float32)[-1].shape[-1]
+        weights["0"][nu] = torch.randn(nelements, nweights, channels, dtype=dtype)
+
+    contraction = SymmetricContraction(irreps_in, irreps_out, weights, device=device, dtype=dtype)
+
+    x = torch.randn(natoms, 16, channels, dtype=dtype, device=device)
+    atom_types = torch.randint(0, nelements, (natoms,), device=device).int()
+
+    return (lambda x: contraction(x, atom_types)), [x]
+
+
+SETUP = {
+    "cubic_spline": setup_cubic_spline,
+    "multi_spline": setup_multi_spline,
+    "spherical_harmonics": setup_spherical_harmonics,
+    "message_passing": setup_message_passing,
+    "linear": setup_linear,
+    "elemental_linear": setup_elemental_linear,
+    "symmetric_contraction": setup_symmetric_contraction,
+}
+
+
+def unavailable(device) -> Optional[str]:
+    """
+    Returns the reason the ops cannot run on device, or None if they can.
+    """
+    if torch.device(device).type == "cuda" and not torch.cuda.is_available():
+        return "CUDA is not available"
+
+    return None
+
+
+def benchmark_ops(args) -> List[Dict]:
+    results = []
+    reason = unavailable(args.device)
+
+    for op in [op for op in args.ops if op in SETUP]:
+        for dtype in args.dtypes:
+            for natoms in args.natoms:
+                for neighbours in args.neighbours:
+                    for channels in args.channels:
+                        params = {
+                            "natoms": natoms,
+                            "nedges": natoms * neighbours,
+                            "channels": channels,
+                            "dtype": dtype,
+                            "device": args.device,
+                        }
+
+                        if reason is not None:
+                            results.append({"name": op, "params": params, "skipped": reason})
+                            report(results[-1])
+                            continue
+
+                        forward, inputs = SETUP[op](
+                            natoms,
+                            natoms * neighbours,
+                            channels,
+                            getattr(torch, dtype),
+                            args.device,
+                            args.nelements,
+                        )
+                        modes = {
+                            "forward": forward_only(forward, inputs),
+                            "backward": with_backward(forward, inputs),
+                        }
+
+                        for mode, fn in modes.items():
+                            stats = time_function(fn, args.device, args.warmup, args.niter)
+                            if op in EDGE_OPS:
+                                stats["edges_per_second"] = params["nedges"] / (stats["median"] * 1e-3)
+                            results.append({"name": op, "mode": mode, "params": params, "stats": stats})
+                            report(results[-1])
+
+    return results
+
+
+def diamond_batch(model, size, device):
+    from ase import build
+    from mace import data, tools
+    from mace.tools import torch_geometric
+
+    atoms = build.bulk("C", "diamond", a=3.567, cubic=True).repeat((size, size, size))
+    atoms.positions += 0.05 * np.random.default_rng(0).standard_normal(atoms.positions.shape)
+
+    z_table = tools.AtomicNumberTable([int(z) for z in model.atomic_numbers])
+    config = data.config_from_atoms(atoms)
+
+    loader = torch_geometric.dataloader.DataLoader(
+        dataset=[data.AtomicData.from_config(config, z_table=z_table, cutoff=model.r_max.item())],
+        batch_size=1,
+        shuffle=False,
+        drop_last=False,
+    )
+
+    return next(iter(loader)).to(device)
+
+
+def benchmark_model(
+    model, opt_model, sizes, device, warmup, niter, compare=False, profile_path=None
+) -> List[Dict]:
+    """
+    Times the optimized model, and optionally the original model, on diamond supercells of
+    each size, for energies only and for energies and forces. The optimized model is also
+    timed with its energy-only inference path (mode "energy_inference"), and on CUDA the peak
+    memory of each mode is recorded. If profile_path is given, the per-module breakdown of
+    one force evaluation is printed and saved as a Chrome trace.
+    """
+    models = {"model": opt_model}
+    if compare:
+        models["original_model"] = model
+
+    results = []
+
+    for size in sizes:
+        batch = diamond_batch(model, size, device)
+
+        params = {
+            "natoms": batch.num_nodes,
+            "nedges": batch.edge_index.shape[1],
+            "device": device,
+        }
+
+        for name, m in models.items():
+            modes = {}
+
+            if hasattr(m, "energy"):
+                modes["energy_inference"] = lambda m=m: m.energy(batch.to_dict())
+
+            modes["forward"] = lambda m=m: m(batch.to_dict(), training=False, compute_force=False)
+            modes["forward_backward"] = lambda m=m: m(
+                batch.to_dict(), training=False, compute_force=True
+            )
+
+            for mode, fn in modes.items():
+                stats = time_function(fn, device, warmup, niter)
+                memory = peak_memory(fn, device)
+                if memory is not None:
+                    stats["peak_memory_mb"] = memory
+
+                results.append({"name": name, "mode": mode, "params": params, "stats": stats})
+                report(results[-1])
+
+        if profile_path is not None:
+            from cuda_mace.profiling import profile
+
+            with profile(opt_model) as prof:
+                opt_model(batch.to_dict(), training=False, compute_force=True)
+
+            print(prof.summary())
+            root, ext = os.path.splitext(profile_path)
+            prof.export_chrome_trace("%s_%d%s" % (root, size, ext or ".json"))
+
+    return results
+
+
+def load_and_benchmark_model(args) -> List[Dict]:
+    from cuda_mace.models import OptimizedInvariantMACE
+
+    if args.model is None:
+        raise ValueError("--model is required to benchmark the full model")
+
+    reason = unavailable(args.device)
+    if reason is not None:
+        result = {"name": "model", "params": {"device": args.device}, "skipped": reason}
+        report(result)
+        return [result]
+
+    # the optimized model is built on the device of the model it is converted from.
+    model = torch.load(args.model, map_location=args.device).to(torch.float64)
+    opt_model = OptimizedInvariantMACE(deepcopy(model))
+
+    return benchmark_model(
+        model, opt_model, args.sizes, args.device, args.warmup, args.niter, profile_path=args.profile
+    )
+
+
+def result_key(result: Dict) -> str:
+    return json.dumps([result["name"], result.get("mode"), result["params"]], sort_keys=True)
+
+
+def report(result: Dict):
+    params = " ".join("%s=%s" % (k, v) for k, v in result["params"].items() if k != "device")
+
+    if "skipped" in result:
+        print("%-22s %-17s %-50s skipped: %s" % (result["name"], "", params, result["skipped"]))
+        return
+
+    stats = result["stats"]
+    line = "%-22s %-17s %-50s median %9.3f ms  p10 %9.3f  p90 %9.3f  p99 %9.3f" % (
+        result["name"], result["mode"], params, stats["median"], stats["p10"], stats["p90"], stats["p99"]
+    )
+    if "edges_per_second" in stats:
+        line += "  %9.3g edges/s" % stats["edges_per_second"]
+    if "peak_memory_mb" in stats:
+        line += "  peak %9.1f MB" % stats["peak_memory_mb"]
+    print(line)
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> int:
+    """
+    Prints the change in median time for each benchmark present in both runs, and returns
+    the number of regressions beyond threshold.
+    """
+    baseline = {result_key(r): r for r in baseline if "stats" in r}
+
+    nregressions = 0
+
+    print("\n--Comparison against baseline (median)")
+    for result in results:
+        if "stats" not in result or result_key(result) not in baseline:
+            continue
+
+        old = baseline[result_key(result)]["stats"]["median"]
+        new = result["stats"]["median"]
+        change = new / old - 1.0
+
+        status = ""
+        if change > threshold:
+            status = "REGRESSION"
+            nregressions += 1
+        elif change < -threshold:
+            status = "improved"
+
+        params = " ".join("%s=%s" % (k, v) for k, v in result["params"].items() if k != "device")
+        print(
+            "%-22s %-17s %-50s %9.3f -> %9.3f ms (%+6.1f%%) %s"
+            % (result["name"], result["mode"], params, old, new, 100.0 * change, status)
+        )
+
+    return nregressions
+
+
+def metadata(device) -> Dict:
+    info = {
+        "date": datetime.now().isoformat(),
+        "torch": torch.__version__,
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "device": str(device),
+        "num_threads": torch.get_num_threads(),
+    }
+
+    if torch.device(device).type == "cuda":
+        info["gpu"] = torch.cuda.get_device_name()
+        info["cuda"] = torch.version.cuda
+
+    return info
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+
+    results = benchmark_ops(args)
+
+    if "model" in args.ops:
+        results += load_and_benchmark_model(args)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"metadata": metadata(args.device), "results": results}, f, indent=2)
+        print(f"--Saved results to: {args.output}")
+
+    if args.baseline is not None:
+        if not os.path.isfile(args.baseline):
+            raise FileNotFoundError(args.baseline)
+
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+        if compare(results, baseline, args.threshold) > 0:
+            sys.exit(1)
@@ -0,0 +1,137 @@
+from time import perf_counter
+
+import numpy as np
+
+from cuda_mace.calculators import MACECalculator
+from cuda_mace.runtime import load
+
+
+def build_parser():
+    """
+    Create a parser for the command line tool.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the per-call overhead of MACECalculator over the model itself."
+    )
+
+    parser.add_argument("--model", type=str, required=True, help="Path to a converted model artifact.")
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=5,
+        help="Repetitions of the 8 atom diamond cell along each direction (5: 1000 atoms).",
+    )
+    parser.add_argument("--skin", type=float, default=0.5)
+    parser.add_argument("--nsteps", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--stress", action="store_true", help="Also request the stress.")
+
+    return parser
+
+
+def diamond(model, size):
+    from ase import build
+
+    atoms = build.bulk("C", "diamond", a=3.567, cubic=True).repeat((size, size, size))
+    atoms.rattle(0.05, seed=0)
+
+    # models without carbon use their first element on the same lattice.
+    numbers = [int(z) for z in model.atomic_numbers]
+    if 6 not in numbers:
+        atoms.set_atomic_numbers([numbers[0]] * len(atoms))
+
+    return atoms
+
+
+def time_mace_inputs(model, atoms, nsteps):
+    """
+    Mean time to build the inputs with mace.data.AtomicData.from_config and a DataLoader,
+    as done per call without the calculator, or None if mace is not installed.
+    """
+    try:
+        from mace import data, tools
+        from mace.tools import torch_geometric
+    except ImportError:
+        return None
+
+    z_table = tools.AtomicNumberTable([int(z) for z in model.atomic_numbers])
+
+    start = perf_counter()
+    for _ in range(nsteps):
+        config = data.config_from_atoms(atoms)
+        loader = torch_geometric.dataloader.DataLoader(
+            dataset=[data.AtomicData.from_config(config, z_table=z_table, cutoff=model.r_max.item())],
+            batch_size=1,
+            shuffle=False,
+            drop_last=False,
+        )
+        next(iter(loader)).to_dict()
+
+    return (perf_counter() - start) / nsteps
+
+
+def benchmark(model, atoms, skin, nsteps, warmup, stress):
+    """
+    Times force (and optionally stress) calls along a short random walk of small steps, so
+    that the neighbour list is mostly reused as in MD, and calls with unchanged positions,
+    which are answered from the ASE cache.
+    """
+    calc = MACECalculator(model, skin=skin)
+    atoms.calc = calc
+    rng = np.random.default_rng(0)
+    steps = 0.002 * rng.standard_normal((warmup + nsteps, len(atoms), 3))
+
+    def step(i):
+        atoms.positions += steps[i]
+        atoms.get_forces()
+        if stress:
+            atoms.get_stress()
+
+    for i in range(warmup):
+        step(i)
+
+    calc.num_calls = 0
+    calc.model_time = calc.total_time = 0.0
+
+    start = perf_counter()
+    for i in range(warmup, warmup + nsteps):
+        step(i)
+    elapsed = (perf_counter() - start) / calc.num_calls
+
+    start = perf_counter()
+    for _ in range(nsteps):
+        atoms.get_forces()
+    cached = (perf_counter() - start) / nsteps
+
+    stats = calc.statistics()
+
+    print("atoms: %d, edges: %d" % (len(atoms), calc.neighbour_list._graph["edge_index"].shape[1]))
+    print("%-36s %10.3f ms" % ("call", elapsed * 1e3))
+    print("%-36s %10.3f ms" % ("  model forward and backward", stats["mean_model_time"] * 1e3))
+    print("%-36s %10.3f ms" % ("  calculator overhead", stats["mean_overhead"] * 1e3))
+    print("%-36s %10.3f ms" % ("  ase overhead", (elapsed - calc.total_time / calc.num_calls) * 1e3))
+    print("%-36s %10.3f ms" % ("call with unchanged positions", cached * 1e3))
+    print(
+        "neighbour list builds: %d, reused: %d, input allocations: %d"
+        % (stats["num_builds"], stats["num_avoided_builds"], stats["num_input_allocations"])
+    )
+    print(
+        "workspace allocations: %d, avoided: %d"
+        % (stats["workspace_num_allocations"], stats["workspace_num_avoided_allocations"])
+    )
+
+    mace_inputs = time_mace_inputs(model, atoms, max(nsteps // 4, 1))
+    if mace_inputs is not None:
+        print("%-36s %10.3f ms" % ("mace AtomicData inputs (reference)", mace_inputs * 1e3))
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    model = load(args.model, device=args.device)
+    atoms = diamond(model, args.size)
+
+    benchmark(model, atoms, args.skin, args.nsteps, args.warmup, args.stress)
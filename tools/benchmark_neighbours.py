@@ -0,0 +1,160 @@
+from time import time
+
+import numpy as np
+import torch
+
+from cuda_mace.neighbours import neighbour_list, sort_edges
+
+
+def build_parser():
+    """
+    Create a parser for the command line tool.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cell-list neighbour list against system size."
+    )
+
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000, 1000000],
+        help="Number of atoms in each benchmarked system.",
+    )
+    parser.add_argument("--cutoff", type=float, default=5.0)
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=0.05,
+        help="Number density (atoms / A^3) of the random periodic systems.",
+    )
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--dtype", type=str, default="float64")
+    parser.add_argument("--niter", type=int, default=3)
+    parser.add_argument(
+        "--reference",
+        action="store_true",
+        help="Also time matscipy on the same systems (as used by mace.data).",
+        default=False,
+    )
+    parser.add_argument(
+        "--sort",
+        action="store_true",
+        help="Also time sorting the shuffled edges by receiver, against torch.argsort.",
+        default=False,
+    )
+
+    return parser
+
+
+def random_system(natoms, density, dtype, device, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    length = (natoms / density) ** (1.0 / 3.0)
+    cell = torch.eye(3, dtype=dtype) * length
+    positions = torch.rand(natoms, 3, generator=generator, dtype=dtype) * length
+    return positions.to(device), cell.to(device)
+
+
+def synchronize(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def time_median(function, device, niter):
+    function()
+    synchronize(device)
+
+    timings = []
+    for _ in range(niter):
+        start = time()
+        function()
+        synchronize(device)
+        timings.append(time() - start)
+
+    return float(np.median(timings))
+
+
+def benchmark_sort(output, natoms, device, niter):
+    """
+    Times sorting the edges, shuffled, by receiver with the counting sort of sort_edges,
+    against torch.argsort followed by permuting edge_index and the shifts.
+    """
+    nedges = output["edge_index"].shape[1]
+    shuffle = torch.randperm(nedges, device=device)
+
+    edge_index = output["edge_index"][:, shuffle].long()
+    shifts = output["shifts"][shuffle]
+
+    def argsort():
+        permutation = torch.argsort(edge_index[0], stable=True)
+        edge_index[:, permutation].int()
+        shifts[permutation]
+
+    reference = time_median(argsort, device, niter)
+    elapsed = time_median(lambda: sort_edges(edge_index, natoms, shifts=shifts), device, niter)
+
+    print("%10s %12s %12.2f %14s" % ("argsort", "", reference * 1e3, ""))
+    print("%10s %12s %12.2f %14s" % ("sort_edges", "", elapsed * 1e3, "x%.2f" % (reference / elapsed)))
+
+
+def benchmark(sizes, cutoff, density, device, dtype, niter, reference=False, sort=False) -> None:
+    pbc = (True, True, True)
+
+    print("%10s %12s %12s %14s" % ("natoms", "nedges", "time (ms)", "time/atom (us)"))
+
+    for natoms in sizes:
+        positions, cell = random_system(natoms, density, dtype, device)
+
+        # warmup
+        output = neighbour_list(positions, cutoff, cell, pbc)
+        synchronize(device)
+
+        timings = []
+        for _ in range(niter):
+            start = time()
+            output = neighbour_list(positions, cutoff, cell, pbc)
+            synchronize(device)
+            timings.append(time() - start)
+
+        elapsed = float(np.median(timings))
+        nedges = output["edge_index"].shape[1]
+        print(
+            "%10d %12d %12.2f %14.3f"
+            % (natoms, nedges, elapsed * 1e3, elapsed * 1e6 / natoms)
+        )
+
+        if reference:
+            from matscipy.neighbours import neighbour_list as matscipy_neighbour_list
+
+            start = time()
+            matscipy_neighbour_list(
+                "ijS",
+                pbc=pbc,
+                cell=cell.cpu().numpy(),
+                positions=positions.cpu().numpy(),
+                cutoff=cutoff,
+            )
+            print("%10s %12s %12.2f" % ("matscipy", "", (time() - start) * 1e3))
+
+        if sort:
+            benchmark_sort(output, natoms, device, niter)
+
+        del output
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+
+    benchmark(
+        args.sizes,
+        args.cutoff,
+        args.density,
+        args.device,
+        getattr(torch, args.dtype),
+        args.niter,
+        args.reference,
+        args.sort,
+    )
@@ -0,0 +1,102 @@
+from time import perf_counter
+
+import numpy as np
+import torch
+
+from cuda_mace.neighbours import neighbour_list
+from cuda_mace.parallel import ParallelEvaluator
+from cuda_mace.runtime import load
+
+
+def build_parser():
+    """
+    Create a parser for the command line tool.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput of ParallelEvaluator against the number of workers."
+    )
+
+    parser.add_argument("--model", type=str, required=True, help="Path to a converted model artifact.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--nstructures", type=int, default=512)
+    parser.add_argument(
+        "--natoms",
+        type=int,
+        nargs=2,
+        default=[10, 40],
+        help="Range of the number of atoms of the random molecules.",
+    )
+    parser.add_argument("--dtype", type=str, default="float64")
+
+    return parser
+
+
+def random_molecules(model, nstructures, natoms_range, dtype, seed=0):
+    """
+    Random non-periodic molecules at liquid-like density, with their neighbour lists.
+    """
+    rng = np.random.default_rng(seed)
+    nelements = len(model.atomic_numbers)
+    r_max = model.r_max.item()
+
+    structures = []
+    for _ in range(nstructures):
+        natoms = int(rng.integers(natoms_range[0], natoms_range[1] + 1))
+        length = (natoms / 0.1) ** (1.0 / 3.0)
+        positions = torch.tensor(rng.random((natoms, 3)) * length, dtype=dtype)
+        graph = neighbour_list(positions, r_max)
+
+        structures.append(
+            {
+                "positions": positions,
+                "node_attrs": torch.nn.functional.one_hot(
+                    torch.tensor(rng.integers(0, nelements, natoms)), nelements
+                ).to(dtype),
+                "edge_index": graph["edge_index"],
+                "shifts": graph["shifts"],
+            }
+        )
+
+    return structures
+
+
+def benchmark(model, structures, workers, threads_per_worker, chunk_size):
+    print("%8s %14s %10s %12s %8s" % ("workers", "structures/s", "speedup", "efficiency", "shared"))
+
+    baseline = None
+
+    for num_workers in workers:
+        with ParallelEvaluator(
+            model, num_workers=num_workers, threads_per_worker=threads_per_worker, chunk_size=chunk_size
+        ) as pool:
+            shared = min(pool.shared_fraction())
+
+            # warmup, one chunk per worker
+            pool.evaluate(structures[: num_workers * chunk_size])
+
+            start = perf_counter()
+            pool.evaluate(structures)
+            throughput = len(structures) / (perf_counter() - start)
+
+        if baseline is None:
+            baseline = throughput / num_workers
+
+        speedup = throughput / baseline
+        print(
+            "%8d %14.1f %10.2f %12.2f %8.2f"
+            % (num_workers, throughput, speedup, speedup / num_workers, shared)
+        )
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    dtype = getattr(torch, args.dtype)
+    model = load(args.model, device="cpu")
+    structures = random_molecules(model, args.nstructures, args.natoms, dtype)
+
+    benchmark(model, structures, args.workers, args.threads_per_worker, args.chunk_size)
@@ -1,17 +1,25 @@
 from typing import Dict, List, Optional, Type
+import os
+import tempfile
 import torch
 from mace.tools import torch_geometric
 from mace import data, tools
 from time import time
 
 from copy import deepcopy
-import nvtx
 
 from mace.modules.utils import (
     get_edge_vectors_and_lengths,
 )
 
-from cuda_mace.models import OptimizedInvariantMACE
+from cuda_mace.models import OptimizedInvariantMACE, load_artifact, save_artifact
+from cuda_mace.models.precision import (
+    PRECISION_POLICIES,
+    precision_report,
+    print_precision_report,
+)
+
+from benchmark import benchmark_model
 
 
 def build_parser():
@@ -36,7 +44,7 @@ def build_parser():
     parser.add_argument(
         "--benchmark",
         action="store_true",
-        help="Benchmark the optimized model.",
+        help="Benchmark the optimized model, see tools/benchmark.py for the full suite.",
         default=False,
     )
     parser.add_argument(
@@ -46,6 +54,28 @@ def build_parser():
         default=False,
     )
 
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="mixed",
+        choices=list(PRECISION_POLICIES.keys()),
+        help="Precision policy of the optimized model.",
+    )
+
+    parser.add_argument(
+        "--script",
+        action="store_true",
+        help="Save the TorchScript version of the optimized model.",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--compare-formats",
+        action="store_true",
+        help="Compare the size and load time of the model artifact against pickling the model.",
+        default=False,
+    )
+
     parser.add_argument(
         "--size",
         type=int,
@@ -139,101 +169,45 @@ def accuracy(
         print("---F64:F32_Opt absolute force error (mean, max)---")
         print("%.5f %.5f" % (abs_error.mean().item(), abs_error.max().item()))
 
+        print("---Error of each precision policy against the F64 model---")
+        print_precision_report(precision_report(model, batch.to_dict()))
 
-def benchmark(
-    model, model_opt, size=4, compare=False, dtype=torch.float64
-) -> None:
-    from ase import build
-
-    # build very large diamond structure
-    atoms = build.bulk("C", "diamond", a=3.567, cubic=True)
-    atoms_list = [atoms.repeat((size, size, size))]
-    print("Number of atoms", len(atoms_list[0]))
-
-    configs = [data.config_from_atoms(atoms) for atoms in atoms_list]
-
-    z_table = tools.AtomicNumberTable([int(z) for z in model.atomic_numbers])
-
-    data_loader = torch_geometric.dataloader.DataLoader(
-        dataset=[
-            data.AtomicData.from_config(
-                config, z_table=z_table, cutoff=model.r_max.item()
-            )
-            for config in configs
-        ],
-        batch_size=1,
-        shuffle=False,
-        drop_last=False,
-    )
-    batch = next(iter(data_loader)).to("cuda")
-
-    print("num nodes", batch.num_nodes)
-    print("num edges", batch.edge_index.shape)
-
-    batch = batch.to("cuda")
-    batch["positions"] = batch["positions"] + 0.05 * torch.randn(
-        batch["positions"].shape,
-        dtype=batch["positions"].dtype,
-        device=batch["positions"].device,
-    )
-
-    batch["positions"].requires_grad_(True)
-    batch["node_attrs"].requires_grad_(True)
-
-    batch.positions = batch.positions.to(torch.float32)
-    batch.node_attrs = batch.node_attrs.to(torch.float32)
-    batch.shifts = batch.shifts.to(torch.float32)
 
-    batch2 = batch.clone()
-    batch2.positions = batch2.positions.to(dtype)
-    batch2.node_attrs = batch2.node_attrs.to(dtype)
-    batch2.shifts = batch2.shifts.to(dtype)
-
-    batch2["positions"].requires_grad_(True)
-    batch2["node_attrs"].requires_grad_(True)
-    model = model.to(dtype)
-
-    warmup = 30
-    niter = 20
-    # warmup
-
-    if compare:
-        for i in range(warmup):
-            output_org = model(
-                batch2.to_dict(), training=False, compute_force=True)
-        torch.cuda.synchronize()
+def compare_formats(model, model_opt, niter=5) -> None:
+    """
+    File size and load time of the model artifact (with and without mmap) against pickling
+    the converted module, alone and together with the original model as previously saved.
+    """
 
+    def timed(load):
+        load()
         start = time()
-        for i in range(niter):
-            output_org = model(
-                batch2.to_dict(), training=False, compute_force=True)
-        torch.cuda.synchronize()
-        print("original model time: %.2e (ms)" %
-              ((time() - start) * (1000 / niter)))
-
-    for i in range(warmup):
-        output_opt = model_opt(
-            batch.to_dict(), training=False, compute_force=True)
-    torch.cuda.synchronize()
-
-    start = time()
-    for i in range(warmup):
-        output_opt = model_opt(
-            batch.to_dict(), training=False, compute_force=True)
-    torch.cuda.synchronize()
-
-    rng = nvtx.start_range(message="model_opt", color="blue")
-    nbench = 1
-    start = time()
-    for i in range(nbench):
-        output_opt = model_opt(
-            batch.to_dict(), training=False, compute_force=True)
-    torch.cuda.synchronize()
-    print(
-        "optimized model time:  %.2e (ms)" % (
-            (time() - start) * (1000 / nbench))
-    )
-    nvtx.end_range(rng)
+        for _ in range(niter):
+            load()
+        return (time() - start) / niter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = os.path.join(tmp, "previous.model")
+        pickled = os.path.join(tmp, "pickled.model")
+        artifact = os.path.join(tmp, "artifact.model")
+
+        torch.save((model_opt, model), previous)
+        torch.save(model_opt, pickled)
+        save_artifact(model_opt, artifact)
+
+        formats = [
+            ("module + original", previous, lambda: torch.load(previous, weights_only=False)),
+            ("module", pickled, lambda: torch.load(pickled, weights_only=False)),
+            ("artifact", artifact, lambda: load_artifact(artifact, "cuda", mmap=False)),
+            ("artifact (mmap)", artifact, lambda: load_artifact(artifact, "cuda", mmap=True)),
+        ]
+
+        print("%-20s %12s %12s" % ("format", "size (MB)", "load (ms)"))
+        for name, path, load in formats:
+            print(
+                "%-20s %12.2f %12.2f"
+                % (name, os.path.getsize(path) / 1e6, 1e3 * timed(load))
+            )
 
 
 if __name__ == "__main__":
@@ -243,7 +217,7 @@ if __name__ == "__main__":
     model = torch.load(args.model).to("cuda")
     model = model.to(torch.float64)
 
-    opt_model = OptimizedInvariantMACE(deepcopy(model))
+    opt_model = OptimizedInvariantMACE(deepcopy(model), precision=args.precision)
 
     print("--Original model")
     print(model)
@@ -256,7 +230,14 @@ if __name__ == "__main__":
 
     if (args.benchmark):
         print("--Benchmarking")
-        benchmark(model, opt_model, args.size, args.compare)
+        benchmark_model(model, opt_model, [args.size], "cuda", warmup=10, niter=50, compare=args.compare)
 
     print(f"--Saving optimized model to: {args.output}")
-    torch.save(opt_model, args.output)
+    if args.script:
+        torch.jit.save(opt_model.script(), args.output)
+    else:
+        save_artifact(opt_model, args.output)
+
+    if (args.compare_formats):
+        print("--Comparing file formats")
+        compare_formats(model, opt_model)